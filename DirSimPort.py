@@ -1,31 +1,49 @@
+import struct
 import sys
-import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QComboBox, 
-                             QPushButton, QLabel, QTextEdit, QLineEdit)
-from PyQt6.QtCore import QThread, pyqtSignal, Qt
+                             QPushButton, QLabel, QPlainTextEdit, QLineEdit, QFileDialog)
+from PyQt6.QtCore import QThread, QTimer, Qt
 from PyQt6.QtGui import QColor, QPalette
 import rtmidi
-from pythonosc import udp_client
-from pythonosc import osc_message_builder
 
-class MidiThread(QThread):
-    midi_signal = pyqtSignal(list, float)
+from log_buffer import LogBuffer, DEBUG, INFO, WARNING, ERROR, LEVEL_NAMES
+from midi_ingest import MidiIngest, OscSender
+from midi_filter import MidiFilter
+from midi_mapping import DEFAULT_MAPPING
+from midi_playback import MidiFilePlayer, PlaybackControlServer, load_midi_file
+from orchestra_state import OrchestraState, OrchestraStatePublisher
+
+LOG_CAPACITY = 2000  # Lines kept in the log, older ones are dropped
+LOG_REFRESH_MS = 100
+# MIDI -> OSC mapping rules, see midi_mapping.py for the format
+MIDI_OSC_MAPPING = DEFAULT_MAPPING
+# MidiFilter settings: realtime bytes are dropped and CC, pitch bend and pressure are merged per
+# controller over this window, keeping the last value. None sends every message as it comes.
+MIDI_FILTER = {'window': 0.01}
+# File playback listens here for the controller's '/tempo/raw', '/play' and '/stop'
+# (add a route for this port to OSC_ROUTES in the controller's config.py)
+PLAYBACK_CONTROL_PORT = 57122
+# Per-section activity sent to DirSim Visual as one '/orchestra/state' message per frame;
+# None to disable
+ORCHESTRA_STATE = {'host': '127.0.0.1', 'port': 57120, 'rate': 60}
 
-    def __init__(self, midi_in):
+class MidiThread(QThread):
+    def __init__(self, midi_in, osc_sender, on_batch):
         super().__init__()
         self.midi_in = midi_in
-        self.running = True
+        # rtmidi calls the ingest callback as messages arrive; this thread sends them as OSC and
+        # then hands them to on_batch (log buffer, orchestra state), never waiting on the GUI
+        midi_filter = MidiFilter(**MIDI_FILTER) if MIDI_FILTER is not None else None
+        self.ingest = MidiIngest(osc_sender, on_batch=on_batch, mapping=MIDI_OSC_MAPPING,
+                                 midi_filter=midi_filter)
+        self.ingest.attach(midi_in)
 
     def run(self):
-        while self.running:
-            msg = self.midi_in.get_message()
-            if msg:
-                message, timestamp = msg
-                self.midi_signal.emit(message, timestamp)
-            time.sleep(0.001)
+        self.ingest.run()
 
     def stop(self):
-        self.running = False
+        self.midi_in.cancel_callback()
+        self.ingest.stop()
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -34,7 +52,20 @@ class MainWindow(QMainWindow):
         self.setGeometry(100, 100, 400, 300)
 
         self.midi_in = rtmidi.MidiIn()
-        self.osc_client = None
+        self.osc_sender = None
+        self.player = None
+        self.control_server = None
+        self.log_buffer = LogBuffer(LOG_CAPACITY)
+        self.log_seq = 0
+
+        self.orchestra_state = None
+        self.state_publisher = None
+        if ORCHESTRA_STATE is not None:
+            self.orchestra_state = OrchestraState()
+            self.state_publisher = OrchestraStatePublisher(
+                self.orchestra_state, OscSender(ORCHESTRA_STATE['host'], ORCHESTRA_STATE['port']),
+                rate=ORCHESTRA_STATE['rate'])
+            self.state_publisher.start()
 
         self.init_ui()
         self.set_color_scheme()
@@ -70,11 +101,39 @@ class MainWindow(QMainWindow):
         self.start_stop_button.clicked.connect(self.toggle_midi)
         layout.addWidget(self.start_stop_button)
 
-        # Log area
-        self.log_area = QTextEdit()
+        # MIDI file playback, following the controller's tempo
+        file_layout = QHBoxLayout()
+        file_layout.addWidget(QLabel("MIDI File:"))
+        self.midi_file = QLineEdit()
+        file_layout.addWidget(self.midi_file)
+        self.browse_button = QPushButton("Browse")
+        self.browse_button.clicked.connect(self.browse_midi_file)
+        file_layout.addWidget(self.browse_button)
+        self.play_file_button = QPushButton("Play File")
+        self.play_file_button.clicked.connect(self.toggle_playback)
+        file_layout.addWidget(self.play_file_button)
+        layout.addLayout(file_layout)
+
+        # Log area: a bounded view of the log buffer, refreshed in batches on a timer
+        log_layout = QHBoxLayout()
+        log_layout.addWidget(QLabel("Log Level:"))
+        self.log_level_combo = QComboBox()
+        for level, name in LEVEL_NAMES.items():
+            self.log_level_combo.addItem(name, level)
+        self.log_level_combo.setCurrentIndex(1)
+        self.log_level_combo.currentIndexChanged.connect(self.rebuild_log)
+        log_layout.addWidget(self.log_level_combo)
+        layout.addLayout(log_layout)
+
+        self.log_area = QPlainTextEdit()
         self.log_area.setReadOnly(True)
+        self.log_area.setMaximumBlockCount(LOG_CAPACITY)
         layout.addWidget(self.log_area)
 
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.refresh_log)
+        self.log_timer.start(LOG_REFRESH_MS)
+
         self.midi_thread = None
 
     def set_color_scheme(self):
@@ -112,6 +171,8 @@ class MainWindow(QMainWindow):
         """
         self.start_stop_button.setStyleSheet(button_style)
         self.apply_osc_button.setStyleSheet(button_style)
+        self.browse_button.setStyleSheet(button_style)
+        self.play_file_button.setStyleSheet(button_style)
 
         # Set custom style for dropdown menu
         self.midi_combo.setStyleSheet("""
@@ -166,8 +227,19 @@ class MainWindow(QMainWindow):
     def apply_osc_settings(self):
         server = self.osc_server.text()
         port = int(self.osc_port.text())
-        self.osc_client = udp_client.SimpleUDPClient(server, port)
-        self.log_area.append(f"OSC settings applied: {server}:{port}")
+        try:
+            osc_sender = OscSender(server, port)
+        except OSError as e:
+            self.log(f"Cannot send OSC to {server}:{port}: {e}", ERROR)
+            return
+        if self.osc_sender:
+            self.osc_sender.close()
+        self.osc_sender = osc_sender
+        if self.midi_thread:
+            self.midi_thread.ingest.sender = self.osc_sender
+        if self.player:
+            self.player.sender = self.osc_sender
+        self.log(f"OSC settings applied: {server}:{port}")
 
     def toggle_midi(self):
         if self.midi_thread is None:
@@ -176,53 +248,109 @@ class MainWindow(QMainWindow):
             self.stop_midi()
 
     def start_midi(self):
-        if self.osc_client is None:
-            self.log_area.append("Please apply OSC settings before starting.")
+        if self.osc_sender is None:
+            self.log("Please apply OSC settings before starting.", WARNING)
             return
 
         port_index = self.midi_combo.currentIndex()
         if port_index >= 0:
             self.midi_in.open_port(port_index)
-            self.midi_thread = MidiThread(self.midi_in)
-            self.midi_thread.midi_signal.connect(self.handle_midi_message)
+            self.midi_thread = MidiThread(self.midi_in, self.osc_sender, self.midi_batch)
             self.midi_thread.start()
             self.start_stop_button.setText("Stop")
-            self.log_area.append("MIDI processing started.")
+            self.log("MIDI processing started.")
         else:
-            self.log_area.append("Please select a MIDI port.")
+            self.log("Please select a MIDI port.", WARNING)
 
     def stop_midi(self):
         if self.midi_thread:
             self.midi_thread.stop()
             self.midi_thread.wait()
+            midi_filter = self.midi_thread.ingest.filter
+            if midi_filter is not None:
+                for name, counts in midi_filter.stats().items():
+                    self.log(f"MIDI filter {name}: {counts['in']} in, {counts['out']} sent, "
+                             f"{counts['merged']} merged, {counts['dropped']} dropped")
             self.midi_thread = None
             self.midi_in.close_port()
             self.start_stop_button.setText("Start")
-            self.log_area.append("MIDI processing stopped.")
+            self.log("MIDI processing stopped.")
 
-    def handle_midi_message(self, message, timestamp):
-        if not message:
-            return
+    def browse_midi_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open MIDI File", "", "MIDI Files (*.mid *.midi)")
+        if path:
+            self.midi_file.setText(path)
 
-        status_byte = message[0]
-        midi_channel = (status_byte & 0x0F) + 1
-        message_type = status_byte & 0xF0
-
-        log_message = f"MIDI message on channel {midi_channel}: {message}"
-        self.log_area.append(log_message)
-
-        osc_msg = osc_message_builder.OscMessageBuilder(address=f"/midi/{midi_channel}")
-        osc_msg.add_arg(message_type)
-        
-        # Add data bytes if they exist
-        for i in range(1, len(message)):
-            osc_msg.add_arg(message[i])
+    def toggle_playback(self):
+        if self.player is None:
+            self.start_playback()
+        else:
+            self.stop_playback()
 
-        osc_msg = osc_msg.build()
-        self.osc_client.send(osc_msg)
+    def start_playback(self):
+        if self.osc_sender is None:
+            self.log("Please apply OSC settings before starting.", WARNING)
+            return
+        path = self.midi_file.text()
+        try:
+            events, tempo_map = load_midi_file(path)
+        except (OSError, ValueError, IndexError, struct.error) as e:
+            self.log(f"Cannot load MIDI file {path}: {e}", WARNING)
+            return
+        self.player = MidiFilePlayer(events, tempo_map, self.osc_sender, mapping=MIDI_OSC_MAPPING,
+                                     on_batch=self.played_batch)
+        try:
+            self.control_server = PlaybackControlServer(self.player, port=PLAYBACK_CONTROL_PORT)
+        except OSError as e:
+            self.log(f"Cannot listen for tempo on port {PLAYBACK_CONTROL_PORT}: {e}", WARNING)
+        self.player.play()
+        self.play_file_button.setText("Stop File")
+        self.log(f"Playing {path}: {len(events)} events, following /tempo/raw on port {PLAYBACK_CONTROL_PORT}")
+
+    def stop_playback(self):
+        if self.control_server:
+            self.control_server.close()
+            self.control_server = None
+        if self.player:
+            self.player.stop()
+            self.log(f"MIDI file playback stopped: {self.player.stats()}")
+            self.player = None
+        self.play_file_button.setText("Play File")
+
+    def midi_batch(self, messages):
+        # Runs on the MIDI thread after the batch has been sent
+        if self.orchestra_state is not None:
+            self.orchestra_state.feed(messages)
+        self.log_buffer.add_many([f"MIDI message on channel {(message[0] & 0x0F) + 1}: {message}"
+                                  for message in messages], DEBUG)
+
+    def played_batch(self, messages):
+        # Runs on the playback thread after the batch has been sent
+        if self.orchestra_state is not None:
+            self.orchestra_state.feed(messages)
+        self.log_buffer.add_many([f"MIDI file on channel {(message[0] & 0x0F) + 1}: {message}"
+                                  for message in messages], DEBUG)
+
+    def log(self, text, level=INFO):
+        self.log_buffer.add(text, level)
+
+    def refresh_log(self):
+        # Everything logged since the last refresh, at the selected level, in one append
+        records, self.log_seq = self.log_buffer.since(self.log_seq, self.log_level_combo.currentData())
+        if records:
+            self.log_area.appendPlainText('\n'.join(text for _, _, _, text in records))
+
+    def rebuild_log(self):
+        self.log_area.clear()
+        self.log_seq = 0
+        self.refresh_log()
 
     def closeEvent(self, event):
         self.stop_midi()
+        self.stop_playback()
+        if self.state_publisher:
+            self.state_publisher.stop()
+            self.state_publisher.sender.close()
         event.accept()
 
 if __name__ == "__main__":
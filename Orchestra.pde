@@ -35,6 +35,13 @@ color[] familyColors = {
   #8B008B  // Percussion and others (Dark Magenta)
 };
 
+// Per-section state from DirSim Port's '/orchestra/state'
+final int STATE_FIELDS = 6;
+int[] stateActiveNotes = new int[16];
+// While '/orchestra/state' keeps arriving, the raw '/midi/<ch>' messages are ignored so no note fires twice
+final int STATE_TIMEOUT_MS = 500;
+int lastStateMillis = -STATE_TIMEOUT_MS;
+
 // Debug variables
 boolean debugMode = false;
 String lastOscMessage = "No message received yet";
@@ -185,41 +192,15 @@ void oscEvent(OscMessage theOscMessage) {
   lastOscMessage = addrPattern; // Update for debug display
   
   if (addrPattern.startsWith("/midi/")) {
+    if (millis() - lastStateMillis < STATE_TIMEOUT_MS) return;
     try {
       int channel = Integer.parseInt(addrPattern.substring(6)) - 1; // MIDI channels are 1-indexed
       int status = theOscMessage.get(0).intValue();
       int note = theOscMessage.get(1).intValue();
       int velocity = theOscMessage.get(2).intValue();
-      color pColor;
       
       if (status == 144 && velocity > 0 && channel < sections.size()) { // Note On
-        xStar = random(-width/2,width/2);
-        yStar = random(-height*0.9,-height/2);
-        
-        
-        if (channel <= 2  || channel >= 14 || channel == 8 ){
-          pColor = familyColors[0]; // String
-          particles[note].activate(pColor, velocity,note);
-        }else if ( channel == 7 || channel == 13){
-          pColor = familyColors[3]; // Percussion
-          // Add a new star every frame
-          for (int i = 0; i < starsPerNote; i++) {
-            stars.add(new Star(new PVector(xStar,yStar)));  // Spawn stars where clicked
-          }
-        }else if (channel == 3 || channel == 4 || channel == 9  || channel == 10){
-          pColor = familyColors[1]; // Winds
-          particles[note].activate(pColor, velocity,note);
-        }else{
-        pColor = familyColors[2]; // Brass
-        // Spawn a set of waves at the mouse location
-        for (int i = 0; i < wavesPerClick; i++) {
-          waves.add(new Wave(new PVector(xStar, yStar), velocity, note));  // Spawn waves where clicked
-        }
-        //particles[note].activate(pColor,velocity,note);
-      }
-        
-        sections.get(channel).playNote(note, velocity); // Play the note of the corresponding section
-                
+        noteOn(channel, note, velocity);
       } else if (status == 128 || (status == 144 && velocity == 0)) { // Note Off
         if (channel < sections.size()) sections.get(channel).noteOff();
       }
@@ -227,6 +208,28 @@ void oscEvent(OscMessage theOscMessage) {
       println("Error parsing OSC message: " + addrPattern);
       e.printStackTrace();
     }
+  } else if (addrPattern.equals("/orchestra/state")) {
+    lastStateMillis = millis();
+    // One message per frame from DirSim Port with, for each section in turn:
+    // envelope, active notes, note density, note ons since the last frame, loudest new note and its velocity
+    try {
+      for (int i = 0; i < sections.size() && (i + 1) * STATE_FIELDS <= theOscMessage.arguments().length; i++) {
+        int base = i * STATE_FIELDS;
+        int activeNotes = int(theOscMessage.get(base + 1).floatValue());
+        int onsets = int(theOscMessage.get(base + 3).floatValue());
+        int note = int(theOscMessage.get(base + 4).floatValue());
+        int velocity = int(theOscMessage.get(base + 5).floatValue());
+        if (onsets > 0 && note >= 0) {
+          noteOn(i, note, velocity);
+        } else if (activeNotes == 0 && stateActiveNotes[i] > 0) {
+          sections.get(i).noteOff();
+        }
+        stateActiveNotes[i] = activeNotes;
+      }
+    } catch (Exception e) {
+      println("Error parsing orchestra state");
+      e.printStackTrace();
+    }
   } else if (addrPattern.equals("/tempo")) {
     try {
       bpm = theOscMessage.get(0).floatValue();
@@ -237,6 +240,36 @@ void oscEvent(OscMessage theOscMessage) {
   }
 }
 
+// Spawns the effects of a note on in a section
+void noteOn(int channel, int note, int velocity) {
+  color pColor;
+  xStar = random(-width/2,width/2);
+  yStar = random(-height*0.9,-height/2);
+  
+  if (channel <= 2  || channel >= 14 || channel == 8 ){
+    pColor = familyColors[0]; // String
+    particles[note].activate(pColor, velocity,note);
+  }else if ( channel == 7 || channel == 13){
+    pColor = familyColors[3]; // Percussion
+    // Add a new star every frame
+    for (int i = 0; i < starsPerNote; i++) {
+      stars.add(new Star(new PVector(xStar,yStar)));  // Spawn stars where clicked
+    }
+  }else if (channel == 3 || channel == 4 || channel == 9  || channel == 10){
+    pColor = familyColors[1]; // Winds
+    particles[note].activate(pColor, velocity,note);
+  }else{
+    pColor = familyColors[2]; // Brass
+    // Spawn a set of waves at the mouse location
+    for (int i = 0; i < wavesPerClick; i++) {
+      waves.add(new Wave(new PVector(xStar, yStar), velocity, note));  // Spawn waves where clicked
+    }
+    //particles[note].activate(pColor,velocity,note);
+  }
+  
+  sections.get(channel).playNote(note, velocity); // Play the note of the corresponding section
+}
+
 // Debug toggle
 void keyPressed() {
   if (key == 'd' || key == 'D') {
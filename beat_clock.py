@@ -0,0 +1,122 @@
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from latency import LatencyHistogram
+
+class BeatClock:
+    def __init__(self, send, bpm=120, ppqn=24, ramp_time=0.5, spin_time=0.002, switch_interval=0.0005, window=2000):
+        # Sends '/clock/tick' ppqn times per beat (MIDI clock style) and '/clock/beat' on every beat,
+        # from its own thread. Ticks are scheduled on absolute deadlines so late wake-ups never
+        # accumulate, and tempo changes are ramped linearly over ramp_time.
+        self.send = send
+        self.ppqn = ppqn
+        self.ramp_time = ramp_time
+        self.spin_time = spin_time  # The last stretch before a deadline is busy-waited for precision
+        # While running, other Python threads are made to hand over the GIL more often so a busy
+        # frame loop cannot hold a tick back for the default 5 ms
+        self.switch_interval = switch_interval
+        self.saved_switch_interval = None
+        self.lock = threading.Lock()
+        self.bpm = float(bpm)
+        self.target_bpm = float(bpm)
+        self.ramp_rate = 0.0  # BPM per second while ramping
+        self.running = False
+        self.thread = None
+
+        self.ticks = 0
+        self.late_ticks = 0
+        self.resyncs = 0
+        self.lateness = LatencyHistogram(window)
+        self.lateness_trace = deque(maxlen=window)
+
+    def set_tempo(self, bpm):
+        with self.lock:
+            if bpm != self.target_bpm and bpm > 0:
+                self.target_bpm = float(bpm)
+                self.ramp_rate = abs(self.target_bpm - self.bpm) / self.ramp_time if self.ramp_time > 0 else float('inf')
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        if self.switch_interval:
+            self.saved_switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self.switch_interval, self.saved_switch_interval))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+        if self.saved_switch_interval is not None:
+            sys.setswitchinterval(self.saved_switch_interval)
+            self.saved_switch_interval = None
+
+    def _next_interval(self, interval):
+        # Move the tempo one tick's worth towards the target, then return the next tick interval
+        with self.lock:
+            if self.bpm != self.target_bpm:
+                step = self.ramp_rate * interval
+                if abs(self.target_bpm - self.bpm) <= step:
+                    self.bpm = self.target_bpm
+                elif self.target_bpm > self.bpm:
+                    self.bpm += step
+                else:
+                    self.bpm -= step
+            return 60.0 / (self.bpm * self.ppqn)
+
+    def _wait_until(self, deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+        while time.perf_counter() < deadline:
+            pass
+
+    def _run(self):
+        self.send('/clock/start', 1)
+        interval = 60.0 / (self.bpm * self.ppqn)
+        deadline = time.perf_counter()
+        tick = 0
+        while self.running:
+            self._wait_until(deadline)
+            now = time.perf_counter()
+            self.send('/clock/tick', tick)
+            if tick % self.ppqn == 0:
+                self.send('/clock/beat', tick // self.ppqn + 1)
+            late = now - deadline
+            self.lateness.add(late)
+            self.lateness_trace.append((deadline, late))
+            self.ticks += 1
+            tick += 1
+
+            interval = self._next_interval(interval)
+            deadline += interval
+            if now - deadline > interval:
+                # More than a whole tick behind: the following ticks go out back to back to keep the count
+                self.late_ticks += 1
+                if now - deadline > self.ppqn * interval:
+                    # Too far behind to catch up (e.g. the machine stalled), restart the grid from now
+                    deadline = now
+                    self.resyncs += 1
+        self.send('/clock/stop', 1)
+
+    def stats(self):
+        # Jitter is the lateness of each tick against its deadline; drift is how fast it grows over time
+        stats = {key.replace('_ms', '_jitter_ms') if key != 'count' else 'ticks': value
+                 for key, value in self.lateness.summary().items()}
+        stats['late_ticks'] = self.late_ticks
+        stats['resyncs'] = self.resyncs
+        stats['bpm'] = self.bpm
+        trace = list(self.lateness_trace)
+        if len(trace) >= 2:
+            deadlines = np.array([d for d, _ in trace])
+            late = np.array([l for _, l in trace])
+            if deadlines[-1] > deadlines[0]:
+                stats['drift_ms_per_min'] = float(np.polyfit(deadlines - deadlines[0], late, 1)[0] * 60 * 1000)
+        return stats
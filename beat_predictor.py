@@ -0,0 +1,71 @@
+from collections import deque
+
+import numpy as np
+
+class BeatPhasePredictor:
+    def __init__(self, look_ahead=0.15, history=2.0, phase_gain=0.5, max_tempo_slope=20.0):
+        # Extrapolates the beat grid from the tempo trend and announces each beat look_ahead
+        # seconds before it is due, nudging the phase towards the ictus times that are observed
+        self.look_ahead = look_ahead
+        self.history = history
+        self.phase_gain = phase_gain
+        self.max_tempo_slope = max_tempo_slope  # BPM per second
+        self.tempo_history = deque()
+        self.reset()
+
+    def reset(self):
+        self.tempo_history.clear()
+        self.next_beat_time = None
+        self.last_announced_time = None
+        self.beat_number = 0
+
+    def observe_tempo(self, timestamp, bpm):
+        self.tempo_history.append((timestamp, bpm))
+        while self.tempo_history and self.tempo_history[0][0] < timestamp - self.history:
+            self.tempo_history.popleft()
+
+    def predicted_bpm(self, at_time):
+        # Latest tempo carried along its recent linear trend
+        now, bpm = self.tempo_history[-1]
+        if len(self.tempo_history) < 3:
+            return bpm
+        times = np.fromiter((t for t, _ in self.tempo_history), dtype=np.float64, count=len(self.tempo_history))
+        tempos = np.fromiter((b for _, b in self.tempo_history), dtype=np.float64, count=len(self.tempo_history))
+        span = times[-1] - times[0]
+        if span <= 0:
+            return bpm
+        slope = np.polyfit(times - times[-1], tempos, 1)[0]
+        slope = max(-self.max_tempo_slope, min(slope, self.max_tempo_slope))
+        # Never extrapolate further than the history we fitted on
+        horizon = min(max(at_time - now, 0.0), span)
+        return max(bpm + slope * horizon, 1.0)
+
+    def observe_beat(self, beat_time):
+        # An ictus seen by the tempo tracker pulls the grid towards it
+        if self.next_beat_time is None:
+            self.next_beat_time = beat_time
+            return
+        if self.last_announced_time is not None and \
+                abs(beat_time - self.last_announced_time) < abs(beat_time - self.next_beat_time):
+            error = beat_time - self.last_announced_time
+        else:
+            error = beat_time - self.next_beat_time
+        self.next_beat_time += self.phase_gain * error
+
+    def poll(self, now):
+        # Beats that are now within the look-ahead, as (beat number, beat time, predicted BPM)
+        if not self.tempo_history:
+            return []
+        if self.next_beat_time is None:
+            self.next_beat_time = now + 60 / self.predicted_bpm(now)
+        # A beat that slipped into the past (tempo jumped up, or a stall) is skipped, not announced late
+        while self.next_beat_time < now:
+            self.next_beat_time += 60 / self.predicted_bpm(self.next_beat_time)
+        announced = []
+        while self.next_beat_time - self.look_ahead <= now:
+            bpm = self.predicted_bpm(self.next_beat_time)
+            self.beat_number += 1
+            announced.append((self.beat_number, self.next_beat_time, bpm))
+            self.last_announced_time = self.next_beat_time
+            self.next_beat_time += 60 / bpm
+        return announced
@@ -0,0 +1,856 @@
+import argparse
+import collections
+import contextlib
+import json
+import math
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Registered benchmarks: name -> function(iterations) returning a result dict
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def measure(func, iterations, warmup=10):
+    # Call func(i) repeatedly and return per-call latencies in seconds
+    with quiet():
+        for i in range(warmup):
+            func(i)
+        latencies = np.empty(iterations)
+        for i in range(iterations):
+            start = time.perf_counter()
+            func(i)
+            latencies[i] = time.perf_counter() - start
+    return latencies
+
+def measure_allocations(func, iterations, warmup=10):
+    # What each call allocates on top of what was live when it started, as seen by tracemalloc
+    # (NumPy and OpenCV image buffers included): the median and worst peak per call in KiB, and
+    # the number of blocks left allocated after the whole run
+    import tracemalloc
+    per_call = np.empty(iterations)
+    with quiet():
+        for i in range(warmup):
+            func(i)
+        tracemalloc.start()
+        try:
+            start_blocks = len(tracemalloc.take_snapshot().traces)
+            for i in range(iterations):
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                func(i)
+                per_call[i] = tracemalloc.get_traced_memory()[1] - before
+            retained_blocks = len(tracemalloc.take_snapshot().traces) - start_blocks
+        finally:
+            tracemalloc.stop()
+    return {
+        'alloc_kb_p50': float(np.median(per_call)) / 1024,
+        'alloc_kb_max': float(per_call.max()) / 1024,
+        'retained_blocks': retained_blocks
+    }
+
+def summarize(latencies):
+    total = float(np.sum(latencies))
+    return {
+        'iterations': int(len(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'mean_ms': float(np.mean(latencies) * 1000),
+        'throughput_per_s': len(latencies) / total if total > 0 else 0.0
+    }
+
+@contextlib.contextmanager
+def quiet():
+    # The controller prints on its hot path; send that to devnull while timing
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def synthetic_frame(width=1280, height=720, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+def canned_wrist_stream(count, fps=60, bpm=90, width=1280, height=720):
+    # A wrist tracing a simple down-up beat pattern at the given tempo
+    t = np.arange(count) / fps
+    phase = 2 * math.pi * bpm / 60 * t
+    x = width * 0.6 + width * 0.1 * np.sin(phase / 2)
+    y = height * 0.5 + height * 0.2 * np.abs(np.sin(phase / 2))
+    return t, np.stack([x, y], axis=1).astype(int)
+
+def canned_hands(count, fps=60):
+    # cvzone-style hand dicts for both hands, following canned_wrist_stream
+    t, wrist = canned_wrist_stream(count, fps)
+    frames = []
+    for i in range(count):
+        x, y = (int(v) for v in wrist[i])
+        right = [[x + 5 * j, y - 8 * j, 0] for j in range(21)]
+        left = [[300 + 3 * j, 400 - 6 * j + (i % 60), 0] for j in range(21)]
+        frames.append((float(t[i]), [
+            {"lmList": right, "bbox": (x, y - 160, 100, 160), "center": (x + 50, y - 80), "type": "Left"},
+            {"lmList": left, "bbox": (300, 280, 60, 120), "center": (330, 340), "type": "Right"}
+        ]))
+    return frames
+
+class SyntheticCapture:
+    def __init__(self, width=1280, height=720, frames=None):
+        # Stands in for cv2.VideoCapture, cycling over a few synthetic frames
+        self.frames = [synthetic_frame(width, height, seed) for seed in range(4)]
+        self.remaining = frames
+        self.index = 0
+        self.props = {cv2.CAP_PROP_FRAME_WIDTH: width, cv2.CAP_PROP_FRAME_HEIGHT: height, cv2.CAP_PROP_FPS: 60}
+
+    def read(self, image=None):
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                return False, None
+            self.remaining -= 1
+        self.index = (self.index + 1) % len(self.frames)
+        frame = self.frames[self.index]
+        if image is not None and image.shape == frame.shape:
+            # Like cv2.VideoCapture.read, fill the caller's buffer instead of allocating one
+            image[...] = frame
+            return True, image
+        return True, frame.copy()
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def set(self, prop, value):
+        return False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+class UdpSink:
+    def __init__(self):
+        # Local UDP socket that OSC messages can be sent to and counted
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self.received = 0
+
+    def drain(self):
+        while True:
+            try:
+                self.sock.recv(65536)
+            except BlockingIOError:
+                return self.received
+            self.received += 1
+
+    def close(self):
+        self.sock.close()
+
+def write_test_midi_file(path, notes, ppq=480, bpm=120):
+    # Format 0 Standard MIDI File with a 16th note every tick_step on rotating channels, written with
+    # running status like most sequencers do
+    def varlen(value):
+        out = [value & 0x7F]
+        value >>= 7
+        while value:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        return bytes(reversed(out))
+    events = []
+    for i in range(notes):
+        tick = i * ppq // 4
+        channel = i % 16
+        events.append((tick, bytes([0x90 | channel, 48 + i % 36, 64 + i % 64])))
+        events.append((tick + ppq // 8, bytes([0x80 | channel, 48 + i % 36, 0])))
+    events.sort(key=lambda event: event[0])
+    track = bytearray(b'\x00\xff\x51\x03' + int(60000000 / bpm).to_bytes(3, 'big'))
+    last_tick = 0
+    running_status = None
+    for tick, message in events:
+        track += varlen(tick - last_tick)
+        last_tick = tick
+        track += message[1:] if message[0] == running_status else message
+        running_status = message[0]
+    track += b'\x00\xff\x2f\x00'
+    with open(path, 'wb') as f:
+        f.write(b'MThd' + struct.pack('>IHHH', 6, 0, 1, ppq) + b'MTrk' + struct.pack('>I', len(track)) + bytes(track))
+
+class StandInMidiIn:
+    def __init__(self):
+        # Stands in for rtmidi.MidiIn: delivers to the callback if one is set, otherwise
+        # queues for get_message(), like rtmidi does
+        self.callback = None
+        self.pending = collections.deque()
+
+    def set_callback(self, callback, data=None):
+        self.callback = callback
+
+    def cancel_callback(self):
+        self.callback = None
+
+    def get_message(self):
+        try:
+            return self.pending.popleft()
+        except IndexError:
+            return None
+
+    def play(self, messages, burst=32, gap=0.005):
+        # Dense passage: bursts of messages back to back (a chord, a CC sweep), then a short gap.
+        # Returns the arrival time of every message.
+        arrivals = []
+        for start in range(0, len(messages), burst):
+            for message in messages[start:start + burst]:
+                arrivals.append(time.perf_counter())
+                if self.callback:
+                    self.callback((message, 0.0))
+                else:
+                    self.pending.append((message, 0.0))
+            time.sleep(gap)
+        return arrivals
+
+class _TimedOscSender:
+    def __init__(self, port):
+        # OscSender into a UdpSink that also notes when each message went out
+        from midi_ingest import OscSender
+        self.sender = OscSender('127.0.0.1', port)
+        self.sent_times = []
+
+    def send_batch(self, dgrams):
+        self.sender.send_batch(dgrams)
+        now = time.perf_counter()
+        self.sent_times.extend([now] * len(dgrams))
+
+class _NullOscClient:
+    def send_message(self, address, value):
+        pass
+
+def benchmark_config():
+    return {
+        'INITIAL_BPM': 36,
+        'MIN_BPM': 30,
+        'MAX_BPM': 50,
+        'OSC_SERVER': '127.0.0.1',
+        'OSC_PORT': 9,
+        'SENSITIVITY': 1000,
+        'TOUCH_COUNT': 4,
+        'LATEST_FRAME_ONLY': False,
+        'OSC_THREAD': False
+    }
+
+@benchmark('process_hands')
+def bench_process_hands(iterations):
+    from hand_tracker import HandTracker
+    tracker = HandTracker(1280, 720)
+    frames = [synthetic_frame(seed=seed) for seed in range(4)]
+    return summarize(measure(lambda i: tracker.process_hands(frames[i % 4].copy(), 1), iterations))
+
+@benchmark('update_bpm')
+def bench_update_bpm(iterations):
+    from bpm_calculators import HandSpeedBPMCalculator
+    from clock import VirtualClock
+    clock = VirtualClock()
+    calculator = HandSpeedBPMCalculator(clock=clock)
+    t, wrist = canned_wrist_stream(iterations + 10)
+    positions = [tuple(int(v) for v in p) for p in wrist]
+
+    def step(i):
+        clock.set(t[i])
+        calculator.update_bpm(positions[i])
+    return summarize(measure(step, iterations))
+
+@benchmark('update_bpm_batch')
+def bench_update_bpm_batch(iterations):
+    # A whole take at once; throughput is in frames per second
+    from bpm_calculators import HandSpeedBPMCalculator
+    from clock import VirtualClock
+    t, wrist = canned_wrist_stream(iterations)
+    positions = wrist.astype(np.float64)
+    positions[::50] = np.nan
+    batch = lambda i: HandSpeedBPMCalculator(clock=VirtualClock(), verbose=False).update_bpm_batch(positions, t)
+    result = summarize(measure(batch, 20, warmup=2))
+    result['frames_per_s'] = iterations * result['throughput_per_s']
+    return result
+
+@benchmark('update_bpm_beat')
+def bench_update_bpm_beat(iterations):
+    # Mode 3: onset tracking plus the sliding autocorrelation, per frame
+    from bpm_calculators import BeatDetectionBPMCalculator
+    from clock import VirtualClock
+    clock = VirtualClock()
+    calculator = BeatDetectionBPMCalculator(clock=clock, verbose=False)
+    t, wrist = canned_wrist_stream(iterations + 10)
+    positions = [tuple(int(v) for v in p) for p in wrist]
+
+    def step(i):
+        clock.set(t[i])
+        calculator.update_bpm(positions[i])
+    return summarize(measure(step, iterations))
+
+@benchmark('gesture_match')
+def bench_gesture_match(iterations):
+    # Mode 2 gesture matching: one DTW column step per template, per frame
+    from bpm_calculators import GestureBPMCalculator
+    from clock import VirtualClock
+    clock = VirtualClock()
+    calculator = GestureBPMCalculator(clock=clock, verbose=False)
+    t, wrist = canned_wrist_stream(iterations + 10)
+    positions = [tuple(int(v) for v in p) for p in wrist]
+
+    def step(i):
+        clock.set(t[i])
+        calculator.add_position(positions[i])
+    return summarize(measure(step, iterations))
+
+@benchmark('add_touch')
+def bench_add_touch(iterations):
+    from bpm_calculators import PatternBPMCalculator
+    calculator = PatternBPMCalculator()
+    pattern = ['down', 'left', 'right', 'up']
+    return summarize(measure(lambda i: calculator.add_touch(i * 0.4, pattern[i % 4]), iterations))
+
+@benchmark('slider_draw')
+def bench_slider_draw(iterations):
+    from slider_controller import SliderController
+    slider = SliderController()
+    img = synthetic_frame()
+    return summarize(measure(lambda i: slider.draw(img, 50, (0, 255, 0)), iterations))
+
+@benchmark('osc_send')
+def bench_osc_send(iterations):
+    # MainProgram's queue + send path, into a local UDP sink
+    from main import MainProgram
+    from replay import LandmarkLogDetector
+    sink = UdpSink()
+    config = benchmark_config()
+    config['OSC_PORT'] = sink.port
+    with quiet():
+        program = MainProgram(lambda bpm: None, lambda frame: None, config,
+                              capture=SyntheticCapture(frames=0), detector=LandmarkLogDetector([]))
+
+    def step(i):
+        program.queue_osc_message('/track/1/volume', 0.5 + (i % 50) / 100)
+        program.flush_osc_messages()
+        if i % 64 == 0:
+            sink.drain()
+    result = summarize(measure(step, iterations))
+    sink.drain()
+    sink.close()
+    return result
+
+@benchmark('session_record')
+def bench_session_record(iterations):
+    # Per-frame cost the session recorder adds to the tempo stage
+    import tempfile
+    from session_recorder import SessionRecorder
+    frames = canned_hands(iterations + 10)
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = SessionRecorder(os.path.join(tmp, 'bench.dsr'))
+        result = summarize(measure(
+            lambda i: recorder.record(i, frames[i][0], 1, frames[i][1], [('up', 'Left')], 40.0, 0.5, 0.6), iterations))
+        with quiet():
+            recorder.close()
+    return result
+
+@benchmark('gui_update_frame')
+def bench_gui_update_frame(iterations):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    from gui import DisplayConverter, HandTrackingGUI
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = HandTrackingGUI()
+    frames = [synthetic_frame(seed=seed) for seed in range(4)]
+    # p50/p99 are the GUI thread's share per frame; the conversion to a display image runs on the
+    # processing side and is reported separately
+    converter = DisplayConverter(960, 540)
+    convert = summarize(measure(lambda i: converter.convert(frames[i % 4]), iterations))
+    image = converter.convert(frames[0])
+
+    def step(i):
+        window.update_frame(image)
+        app.processEvents()
+    result = summarize(measure(step, iterations))
+    window.close()
+    result['convert_p50_ms'] = convert['p50_ms']
+    result['convert_p99_ms'] = convert['p99_ms']
+    return result
+
+@benchmark('end_to_end')
+def bench_end_to_end(iterations):
+    # One full frame through MainProgram: flip, detection, tempo, overlays, OSC flush
+    from main import MainProgram
+    config = benchmark_config()
+    with quiet():
+        program = MainProgram(lambda bpm: None, lambda frame: None, config,
+                              capture=SyntheticCapture(frames=2 * iterations + 40))
+    program.running = True
+    program.frame_grabber.start()
+
+    def step(i):
+        success, packet = program.read_frame()
+        program.process_frame(packet)
+        program.flush_osc_messages()
+    result = summarize(measure(step, iterations))
+    result.update(measure_allocations(step, iterations))
+    program.running = False
+    program.release_resources()
+    return result
+
+@benchmark('replay_landmarks')
+def bench_replay_landmarks(iterations):
+    # Tempo path end to end without detection, driven by a canned landmark stream
+    from main import MainProgram
+    from replay import LandmarkLogCapture, LandmarkLogDetector
+    from clock import VirtualClock
+    frames = canned_hands(iterations + 20)
+    clock = VirtualClock()
+    with quiet():
+        program = MainProgram(lambda bpm: None, lambda frame: None, benchmark_config(),
+                              capture=LandmarkLogCapture(len(frames)), clock=clock,
+                              detector=LandmarkLogDetector(frames),
+                              osc_client_factory=lambda server, port: _NullOscClient())
+    program.running = True
+    program.frame_grabber.start()
+
+    def step(i):
+        clock.set(frames[i][0])
+        success, packet = program.read_frame()
+        program.process_frame(packet)
+        program.flush_osc_messages()
+    result = summarize(measure(step, iterations))
+    program.running = False
+    program.release_resources()
+    return result
+
+@benchmark('osc_transport')
+def bench_osc_transport(iterations):
+    # Multi-destination transport under load: cost of send_message, then delivery per UDP sink.
+    # Two routes take every message, a third is rate limited to 50 Hz like a lighting desk might be.
+    from osc_transport import OscTransport
+    sinks = [UdpSink() for _ in range(3)]
+    for sink in sinks:
+        sink.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    transport = OscTransport([
+        {'address': '*', 'host': '127.0.0.1', 'port': sinks[0].port},
+        {'address': '/track/*', 'host': '127.0.0.1', 'port': sinks[1].port},
+        {'address': '/track/*', 'host': '127.0.0.1', 'port': sinks[2].port, 'min_interval': 0.02}
+    ])
+
+    def step(i):
+        transport.send_message(f'/track/{i % 8}/volume', (i % 100) / 100)
+        if i % 256 == 0:
+            for sink in sinks:
+                sink.drain()
+    result = summarize(measure(step, iterations, warmup=0))
+    deadline = time.perf_counter() + 1.0
+    while time.perf_counter() < deadline and sinks[0].drain() < iterations:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    received = [sink.drain() for sink in sinks]
+    transport.close()
+    for sink in sinks:
+        sink.close()
+    result['received'] = received
+    result['loss_pct'] = 100.0 * (1 - min(received[0], received[1]) / iterations)
+    result['rate_limited'] = transport.routes[2].rate_limited
+    return result
+
+@benchmark('beat_clock')
+def bench_beat_clock(iterations):
+    # Tick timing at 200 BPM, 24 PPQN (80 ticks/s) into a local UDP sink; p50/p99 are the tick lateness
+    from beat_clock import BeatClock
+    from pythonosc.udp_client import SimpleUDPClient
+    sink = UdpSink()
+    client = SimpleUDPClient('127.0.0.1', sink.port)
+    clock = BeatClock(client.send_message, bpm=200, ppqn=24)
+    ticks = max(min(iterations, 800), 100)
+    clock.start()
+    while clock.ticks < ticks:
+        time.sleep(0.05)
+        sink.drain()
+    clock.stop()
+    stats = clock.stats()
+    sink.drain()
+    sink.close()
+    return {
+        'iterations': stats['ticks'],
+        'p50_ms': stats['p50_jitter_ms'],
+        'p99_ms': stats['p99_jitter_ms'],
+        'mean_ms': float(np.mean([late for _, late in clock.lateness_trace]) * 1000),
+        'throughput_per_s': 200 * 24 / 60,
+        'max_jitter_ms': stats['max_jitter_ms'],
+        'drift_ms_per_min': stats.get('drift_ms_per_min', 0.0),
+        'late_ticks': stats['late_ticks'],
+        'received': sink.received
+    }
+
+def _midi_stream(count):
+    # Note on/off pairs and CC sweeps across all 16 channels
+    messages = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            messages.append([0x90 | (i % 16), 36 + i % 48, 100])
+        elif kind == 1:
+            messages.append([0x80 | (i % 16), 36 + i % 48, 0])
+        else:
+            messages.append([0xB0 | (i % 16), 1, i % 128])
+    return messages
+
+def _bench_midi_ingest(make_ingest, iterations, idle_time=1.0):
+    # Idle CPU of the ingest thread with no MIDI coming in, then latency (arrival to OSC sent)
+    # and throughput over a dense burst from the stand-in MIDI source
+    sink = UdpSink()
+    sink.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sender = _TimedOscSender(sink.port)
+    midi_in = StandInMidiIn()
+    ingest = make_ingest(midi_in, sender)
+    thread = threading.Thread(target=ingest.run, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    cpu_start = time.process_time()
+    time.sleep(idle_time)
+    idle_cpu = (time.process_time() - cpu_start) / idle_time
+
+    arrivals = midi_in.play(_midi_stream(iterations))
+    deadline = time.perf_counter() + 10.0
+    while len(sender.sent_times) < len(arrivals) and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    ingest.stop()
+    thread.join(timeout=1.0)
+    sink.drain()
+    sink.close()
+    sender.sender.close()
+
+    count = min(len(arrivals), len(sender.sent_times))
+    result = summarize(np.array(sender.sent_times[:count]) - np.array(arrivals[:count]))
+    elapsed = sender.sent_times[count - 1] - arrivals[0] if count else 0.0
+    result['throughput_per_s'] = count / elapsed if elapsed > 0 else 0.0
+    result['idle_cpu_pct'] = 100.0 * idle_cpu
+    result['lost'] = iterations - count
+    result['datagrams'] = sender.sender.datagrams
+    return result
+
+@benchmark('midi_ingest_poll')
+def bench_midi_ingest_poll(iterations):
+    # DirSim Port's previous loop: get_message() every 1 ms
+    from midi_ingest import PollingMidiIngest
+    return _bench_midi_ingest(lambda midi_in, sender: PollingMidiIngest(midi_in, sender), iterations)
+
+@benchmark('midi_ingest_callback')
+def bench_midi_ingest_callback(iterations):
+    # rtmidi callback into a deque, drained and sent in batches
+    from midi_ingest import MidiIngest
+
+    def make_ingest(midi_in, sender):
+        ingest = MidiIngest(sender)
+        ingest.attach(midi_in)
+        return ingest
+    return _bench_midi_ingest(make_ingest, iterations)
+
+def _bench_midi_encode(encode, iterations, chunk=256):
+    # MIDI -> OSC datagram conversion, chunk messages per timed call; throughput is in messages/s
+    messages = _midi_stream(chunk)
+
+    def step(i):
+        for message in messages:
+            encode(message)
+    return summarize(measure(step, iterations) / chunk)
+
+@benchmark('midi_osc_builder')
+def bench_midi_osc_builder(iterations):
+    # OscMessageBuilder per message, as DirSim Port used to do
+    from midi_ingest import midi_to_osc
+    return _bench_midi_encode(midi_to_osc, iterations)
+
+@benchmark('midi_osc_mapped')
+def bench_midi_osc_mapped(iterations):
+    # Precompiled templates from the default mapping, only the data bytes packed per message
+    from midi_mapping import MidiOscMapper
+    return _bench_midi_encode(MidiOscMapper().encode, iterations)
+
+@benchmark('midi_filter')
+def bench_midi_filter(iterations):
+    # A dense passage: every 1 ms a CC sweep step and pitch bend on 4 channels plus MIDI clock,
+    # and a note on or off every 10 ms; p50/p99 are per message, sent_pct is what still goes out
+    from midi_filter import MidiFilter
+    midi_filter = MidiFilter(window=0.01)
+    chunk = []
+    for channel in range(4):
+        chunk.append([0xB0 | channel, 1, 0])
+        chunk.append([0xE0 | channel, 0, 64])
+    chunk.append([0xF8])
+    sent = 0
+    notes = 0
+
+    def step(i):
+        nonlocal sent, notes
+        for message in chunk:
+            message[-1] = i % 128
+        batch = chunk
+        if i % 10 == 0:
+            batch = chunk + [[0x90 if i % 20 == 0 else 0x80, 60, 100]]
+            notes += 1
+        sent += len(midi_filter.process(batch, now=i * 0.001))
+    latencies = measure(step, iterations, warmup=0) / len(chunk)
+    sent += len(midi_filter.flush())
+    received = sum(counts['in'] for counts in midi_filter.counts.values())
+    result = summarize(latencies)
+    result['sent_pct'] = 100.0 * sent / received
+    result['notes_sent'] = midi_filter.counts['note']['out']
+    result['notes_in'] = notes
+    return result
+
+@benchmark('midi_playback')
+def bench_midi_playback(iterations):
+    # Parse a 100k-note file (throughput is events parsed per second), then play the start of it
+    # into a local UDP sink at 600 BPM with a change to 900 half way; p50/p99 are how late each batch went out
+    from midi_ingest import OscSender
+    from midi_playback import MidiFilePlayer, load_midi_file
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'score.mid')
+        write_test_midi_file(path, 100000)
+        start = time.perf_counter()
+        events, tempo_map = load_midi_file(path)
+        parse_s = time.perf_counter() - start
+    sink = UdpSink()
+    sink.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sender = OscSender('127.0.0.1', sink.port)
+    count = max(iterations, 200)
+    player = MidiFilePlayer(events[:count], tempo_map, sender)
+    player.set_tempo(600)
+    player.play()
+    while not player.finished() and player.position() < events['beat'][count - 1] / 2:
+        time.sleep(0.01)
+        sink.drain()
+    player.set_tempo(900)
+    while player.running:
+        time.sleep(0.01)
+        sink.drain()
+    time.sleep(0.05)
+    sink.drain()
+    sink.close()
+    sender.close()
+    stats = player.stats()
+    return {
+        'iterations': stats['sent'],
+        'p50_ms': stats['p50_late_ms'],
+        'p99_ms': stats['p99_late_ms'],
+        'mean_ms': float(np.mean(player.lateness.samples) * 1000),
+        'throughput_per_s': len(events) / parse_s,
+        'parse_s': parse_s,
+        'max_late_ms': stats['max_late_ms'],
+        'received': sink.received,
+        'events': len(events)
+    }
+
+@benchmark('orchestra_state')
+def bench_orchestra_state(iterations):
+    # One display frame of the section aggregator in a very dense passage: 300 MIDI messages fed
+    # (18k/s at 60 Hz), then the state snapshot encoded and sent as a single OSC message
+    from midi_ingest import OscSender
+    from orchestra_state import OrchestraState, OrchestraStatePublisher
+    sink = UdpSink()
+    sender = OscSender('127.0.0.1', sink.port)
+    state = OrchestraState()
+    publisher = OrchestraStatePublisher(state, sender)
+    frames = [_midi_stream(300) for _ in range(4)]
+
+    def step(i):
+        state.feed(frames[i % 4])
+        sender.send_batch([publisher.encode(state.snapshot(i / 60))])
+        if i % 64 == 0:
+            sink.drain()
+    result = summarize(measure(step, iterations))
+    sink.drain()
+    sink.close()
+    sender.close()
+    result['midi_in_per_frame'] = 300
+    result['received'] = sink.received
+    result['bytes_per_frame'] = len(publisher.encode(state.snapshot()))
+    return result
+
+@benchmark('capture_path')
+def bench_capture_path(iterations):
+    # Reading and mirroring one 720p frame the way MainProgram does, timed and with what each frame
+    # allocates: into frame slots (p50/p99), without a preview (no mirroring at all), and the
+    # copying path that allocated a new image for every read and every flip
+    from frame_bus import FrameBus
+    from frame_grabber import DirectFrameSource
+    capture = SyntheticCapture()
+    source = DirectFrameSource(capture)
+    source.start()
+    display_bus = FrameBus(slots=4)
+
+    def slots(i):
+        success, ref, dropped = source.read()
+        display = display_bus.acquire_write(ref.frame.shape)
+        cv2.flip(ref.frame, 1, dst=display.frame)
+        ref.release()
+        display_bus.publish(display)
+        display.release()
+
+    def no_preview(i):
+        success, ref, dropped = source.read()
+        ref.release()
+
+    def copying(i):
+        success, img = capture.read()
+        cv2.flip(img, 1)
+
+    result = summarize(measure(slots, iterations))
+    for name, step in (('slots', slots), ('no_preview', no_preview), ('copying', copying)):
+        if name != 'slots':
+            result[f'{name}_p50_ms'] = summarize(measure(step, iterations))['p50_ms']
+        allocations = measure_allocations(step, iterations)
+        result[f'{name}_alloc_kb'] = allocations['alloc_kb_p50']
+        result[f'{name}_retained_blocks'] = allocations['retained_blocks']
+    return result
+
+def _rss_mb():
+    # Resident set size of this process, None where /proc is not available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+@benchmark('frame_bus')
+def bench_frame_bus(iterations):
+    # 720p frames mirrored into display bus slots and published, read in place by three consumers
+    # on their own threads: a preview scaling every frame to 960x540, an encoder-like recorder taking
+    # 30 ms per frame and an overlay reading a region. p50/p99 are the producer's cost per frame; the
+    # producer is not paced, so the skip counts show how far behind each consumer falls.
+    from frame_bus import FrameBus
+    bus = FrameBus(slots=4)
+    frames = [synthetic_frame(seed=seed) for seed in range(4)]
+    running = True
+
+    def consume(work):
+        subscriber = bus.subscribe()
+        while running:
+            ref = subscriber.get(timeout=0.1)
+            if ref is not None:
+                with ref:
+                    work(ref.frame)
+        return subscriber
+
+    preview = np.empty((540, 960, 3), dtype=np.uint8)
+    consumers = {
+        'preview': lambda frame: cv2.resize(frame, (960, 540), dst=preview, interpolation=cv2.INTER_AREA),
+        'recorder': lambda frame: time.sleep(0.03),
+        'overlay': lambda frame: frame[:100, :300].mean()
+    }
+    subscribers = {}
+    threads = [threading.Thread(target=lambda name=name, work=work: subscribers.__setitem__(name, consume(work)), daemon=True)
+               for name, work in consumers.items()]
+    for thread in threads:
+        thread.start()
+
+    def step(i):
+        ref = bus.acquire_write(frames[0].shape)
+        if ref is None:
+            return
+        cv2.flip(frames[i % 4], 1, dst=ref.frame)
+        bus.publish(ref, time.perf_counter())
+        ref.release()
+    # Touch every slot first so RSS growth shows per-frame allocations only
+    for i in range(2 * bus.slot_count):
+        step(i)
+    rss_start = _rss_mb()
+    result = summarize(measure(step, iterations))
+    rss_end = _rss_mb()
+    running = False
+    for thread in threads:
+        thread.join()
+    stats = bus.stats()
+    result['overruns'] = stats['overruns']
+    for name, subscriber in subscribers.items():
+        result[f'{name}_skipped'] = subscriber.skipped
+    if rss_start is not None:
+        result['rss_growth_mb'] = rss_end - rss_start
+    return result
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(names, iterations):
+    results = {}
+    for name in names:
+        try:
+            results[name] = BENCHMARKS[name](iterations)
+        except ImportError as e:
+            # Optional dependencies (MediaPipe, PyQt5, ...) may be missing on CI boxes
+            results[name] = {'skipped': str(e)}
+        except Exception as e:
+            # One broken benchmark must not cost the rest of the run and its JSON
+            results[name] = {'error': f"{type(e).__name__}: {e}"}
+        print(format_result(name, results[name]))
+    return results
+
+def format_result(name, result):
+    if 'skipped' in result:
+        return f"{name:<20} skipped: {result['skipped']}"
+    if 'error' in result:
+        return f"{name:<20} failed: {result['error']}"
+    extra = ''.join(f"  {key}={value:.4g}" if isinstance(value, float) else f"  {key}={value}"
+                    for key, value in result.items()
+                    if key not in ('iterations', 'p50_ms', 'p99_ms', 'mean_ms', 'throughput_per_s'))
+    return (f"{name:<20} p50 {result['p50_ms']:8.3f} ms  p99 {result['p99_ms']:8.3f} ms  "
+            f"{result['throughput_per_s']:10.1f}/s{extra}")
+
+def compare(results, baseline):
+    # Print the p50/p99 change against a saved run
+    print(f"\nCompared to {baseline['meta'].get('commit')}:")
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if not old or any(key in entry for entry in (result, old) for key in ('skipped', 'error')):
+            continue
+        p50 = (result['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0.0
+        p99 = (result['p99_ms'] / old['p99_ms'] - 1) * 100 if old['p99_ms'] else 0.0
+        print(f"{name:<20} p50 {p50:+7.1f}%  p99 {p99:+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency benchmarks for the DirSim Controller hot path")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', help="Save results as JSON")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only or list(BENCHMARKS), args.iterations)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'iterations': args.iterations
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
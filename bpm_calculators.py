@@ -1,9 +1,46 @@
+import math
 import numpy as np
 from collections import deque
-import time
+from clock import SystemClock
+from gesture_matcher import StreamingDTWMatcher
+
+class RingMean:
+    def __init__(self, size):
+        # Fixed-size window of floats; mean() always sums oldest to newest so batch code can reproduce it exactly
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+        self.index = 0
+
+    def append(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def mean(self):
+        i = (self.index - self.count) % self.size
+        total = self.values[i]
+        for _ in range(self.count - 1):
+            i = (i + 1) % self.size
+            total += self.values[i]
+        return total / self.count
+
+    def ordered(self):
+        # Current contents, oldest first
+        start = self.index - self.count
+        return [self.values[(start + k) % self.size] for k in range(self.count)]
+
+    def extend(self, values):
+        for value in values[-self.size:]:
+            self.append(float(value))
+
+    def __len__(self):
+        return self.count
 
 class HandSpeedBPMCalculator:
-    def __init__(self, speed_threshold=1000, still_threshold=100, dead_zone=80, decrease_rate=0.5, initial_bpm=36, min_bpm=30, max_bpm=50):
+    def __init__(self, speed_threshold=1000, still_threshold=100, dead_zone=80, decrease_rate=0.5, initial_bpm=36, min_bpm=30, max_bpm=50, clock=None, verbose=True):
+        self.clock = clock if clock is not None else SystemClock()
         self.speed_threshold = speed_threshold
         self.still_threshold = still_threshold
         self.dead_zone = dead_zone
@@ -13,10 +50,12 @@ class HandSpeedBPMCalculator:
         self.max_bpm = max_bpm
         self.last_position = None
         self.last_time = None
-        self.speeds = deque(maxlen=5)
-        self.bpm_history = deque(maxlen=3)
+        self.speeds = RingMean(5)
+        self.bpm_history = RingMean(3)
         self.no_hand_counter = 0
-        self.last_update_time = time.time()
+        self.last_update_time = self.clock.time()
+        # Per-frame console output, off on the hot path unless debugging
+        self.verbose = verbose
 
     def update_config(self, key, value):
         if key == 'MIN_BPM':
@@ -28,51 +67,382 @@ class HandSpeedBPMCalculator:
         elif key == 'SENSITIVITY':
             self.speed_threshold = value
 
+    def _speed_ratio(self, avg_speed):
+        # x ** 0.75 as sqrt(x) * sqrt(sqrt(x)): correctly rounded, so NumPy gives bit-identical results
+        ratio = (avg_speed - self.dead_zone) / (self.speed_threshold - self.dead_zone)
+        root = math.sqrt(ratio)
+        return max(0, min(root * math.sqrt(root), 1))
+
     def update_bpm(self, hand_position):
-        current_time = time.time()
+        current_time = self.clock.time()
         time_diff = current_time - self.last_update_time
         
         if hand_position is not None:
             self.no_hand_counter = 0
             if self.last_position is not None and self.last_time is not None:
-                distance = np.linalg.norm(np.array(hand_position) - np.array(self.last_position))
-                speed = distance / time_diff if time_diff > 0 else 0
+                dx = hand_position[0] - self.last_position[0]
+                dy = hand_position[1] - self.last_position[1]
+                distance = math.sqrt(dx * dx + dy * dy)
+                speed = distance / time_diff if time_diff > 0 else 0.0
                 self.speeds.append(speed)
 
-                avg_speed = np.mean(self.speeds)
+                avg_speed = self.speeds.mean()
                 
                 if avg_speed < self.still_threshold:
                     bpm_diff = self.current_bpm - self.min_bpm
                     decrease_amount = self.decrease_rate * time_diff
                     if abs(bpm_diff) < decrease_amount:
                         self.current_bpm = self.min_bpm
-                    else:
-                        self.current_bpm -= np.sign(bpm_diff) * decrease_amount
-                    print(f"Hand is still. BPM decreasing to minimum: {self.current_bpm:.2f}")
+                    elif bpm_diff > 0:
+                        self.current_bpm -= decrease_amount
+                    elif bpm_diff < 0:
+                        self.current_bpm += decrease_amount
+                    if self.verbose:
+                        print(f"Hand is still. BPM decreasing to minimum: {self.current_bpm:.2f}")
                 elif avg_speed < self.dead_zone:
-                    print(f"Small movement detected. BPM maintained at {self.current_bpm:.2f}")
+                    if self.verbose:
+                        print(f"Small movement detected. BPM maintained at {self.current_bpm:.2f}")
                 else:
-                    speed_ratio = ((avg_speed - self.dead_zone) / (self.speed_threshold - self.dead_zone)) ** 0.75
-                    speed_ratio = max(0, min(speed_ratio, 1))
+                    speed_ratio = self._speed_ratio(avg_speed)
                     new_bpm = self.min_bpm + speed_ratio * (self.max_bpm - self.min_bpm)
                     
                     self.bpm_history.append(new_bpm)
-                    self.current_bpm = np.mean(self.bpm_history)
+                    self.current_bpm = self.bpm_history.mean()
                     
-                    print(f"Avg Speed: {avg_speed:.2f}, Speed Ratio: {speed_ratio:.2f}, Current BPM: {self.current_bpm:.2f}")
+                    if self.verbose:
+                        print(f"Avg Speed: {avg_speed:.2f}, Speed Ratio: {speed_ratio:.2f}, Current BPM: {self.current_bpm:.2f}")
 
             self.last_position = hand_position
             self.last_time = current_time
         else:
             self.no_hand_counter += 1
-            if self.no_hand_counter > 30:
-                print("No hand detected for 1 second. BPM maintained.")
-            else:
-                print("No hand detected. BPM maintained.")
+            if self.verbose:
+                if self.no_hand_counter > 30:
+                    print("No hand detected for 1 second. BPM maintained.")
+                else:
+                    print("No hand detected. BPM maintained.")
 
         self.last_update_time = current_time
         return self.current_bpm
 
+    def update_bpm_batch(self, positions, timestamps):
+        # Vectorized equivalent of calling update_bpm once per row, with the clock at each timestamp.
+        # positions is (N, 2) with NaN rows where no hand was seen. Returns the BPM after every frame
+        # and leaves the calculator in the same state the streaming calls would have.
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n = len(timestamps)
+        if n == 0:
+            return np.empty(0)
+
+        present = ~np.isnan(positions).any(axis=1)
+        time_diff = np.diff(timestamps, prepend=self.last_update_time)
+
+        # Previous seen position for every frame, falling back to the one from before the batch
+        frame_index = np.arange(n)
+        last_seen = np.maximum.accumulate(np.where(present, frame_index, -1))
+        previous_seen = np.concatenate(([-1], last_seen[:-1]))
+        has_before = self.last_position is not None and self.last_time is not None
+        measured = present & ((previous_seen >= 0) | has_before)
+        previous = positions[np.maximum(previous_seen, 0)]
+        if has_before:
+            previous[previous_seen < 0] = (self.last_position[0], self.last_position[1])
+
+        # Speeds and their rolling mean, summed oldest to newest exactly like RingMean
+        delta = positions[measured] - previous[measured]
+        distance = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+        measured_diff = time_diff[measured]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = np.where(measured_diff > 0, distance / measured_diff, 0.0)
+        avg_speed = _rolling_mean(self.speeds.ordered(), speed, self.speeds.size)
+
+        still = avg_speed < self.still_threshold
+        moving = ~still & ~(avg_speed < self.dead_zone)
+
+        # Moving frames set the BPM to the mean of the recent targets
+        ratio = (avg_speed[moving] - self.dead_zone) / (self.speed_threshold - self.dead_zone)
+        root = np.sqrt(ratio)
+        speed_ratio = np.clip(root * np.sqrt(root), 0, 1)
+        new_bpm = self.min_bpm + speed_ratio * (self.max_bpm - self.min_bpm)
+        history = _rolling_mean(self.bpm_history.ordered(), new_bpm, self.bpm_history.size)
+
+        # Still frames decay towards min_bpm from the value left by the previous moving frame
+        measured_index = frame_index[measured]
+        bpm_events = np.full(len(measured_index), np.nan)
+        bpm_events[moving] = history
+        bpm_events[still] = _decay_chains(
+            still, moving, history, float(self.current_bpm), self.min_bpm,
+            self.decrease_rate * measured_diff
+        )
+
+        # Frames that neither moved nor decayed keep the previous BPM
+        is_event = np.zeros(n, dtype=bool)
+        is_event[measured_index[still | moving]] = True
+        values = np.zeros(n)
+        values[measured_index] = bpm_events
+        source = np.maximum.accumulate(np.where(is_event, frame_index, -1))
+        bpm = np.where(source >= 0, values[np.maximum(source, 0)], float(self.current_bpm))
+
+        # Carry the streaming state forward
+        if is_event.any():
+            self.current_bpm = float(bpm[-1])
+        self.speeds.extend(speed)
+        self.bpm_history.extend(new_bpm)
+        if present.any():
+            last = last_seen[-1]
+            self.last_position = (positions[last, 0], positions[last, 1])
+            self.last_time = timestamps[last]
+            self.no_hand_counter = n - 1 - last
+        else:
+            self.no_hand_counter += n
+        self.last_update_time = timestamps[-1]
+        return bpm
+
+def _rolling_mean(previous, values, size):
+    # Mean over the last `size` values (including `previous` ones), summed oldest to newest
+    full = np.concatenate((np.asarray(previous, dtype=np.float64), values))
+    offset = len(previous)
+    end = np.arange(offset, len(full))
+    start = np.maximum(end - size + 1, 0)
+    count = end - start + 1
+    total = full[start].copy()
+    for k in range(1, size):
+        mask = k < count
+        total[mask] += full[start[mask] + k]
+    return total / count
+
+def _decay_chains(still, moving, history, initial_bpm, min_bpm, amounts, long_chain=32):
+    # Each run of still frames between two moving frames decays sequentially from the BPM the
+    # earlier moving frame left (or initial_bpm). Short runs advance in lockstep across all runs,
+    # long runs use a sequential accumulate, so float rounding matches the streaming loop exactly.
+    chain_id = np.cumsum(moving)
+    still_chain = chain_id[still]
+    still_amounts = amounts[still]
+    if len(still_chain) == 0:
+        return np.empty(0)
+    anchors = np.concatenate(([initial_bpm], history))[still_chain]
+    chain_start = np.concatenate(([True], still_chain[1:] != still_chain[:-1]))
+    starts = np.flatnonzero(chain_start)
+    lengths = np.diff(np.append(starts, len(still_chain)))
+    result = np.empty(len(still_chain))
+
+    short = lengths <= long_chain
+    short_starts = starts[short]
+    short_lengths = lengths[short]
+    value = anchors[short_starts].copy()
+    for step in range(int(short_lengths.max()) if len(short_lengths) else 0):
+        active = step < short_lengths
+        idx = short_starts[active] + step
+        value[active] = _decay_step(value[active], still_amounts[idx], min_bpm)
+        result[idx] = value[active]
+
+    for chain_start_index, length in zip(starts[~short], lengths[~short]):
+        chain = slice(chain_start_index, chain_start_index + length)
+        anchor = anchors[chain_start_index]
+        chain_amounts = still_amounts[chain]
+        direction = np.sign(anchor - min_bpm)
+        raw = np.subtract.accumulate(np.concatenate(([anchor], direction * chain_amounts)))
+        # The first step whose distance to min_bpm is below its amount clamps, and min_bpm sticks
+        clamp = np.abs(raw[:-1] - min_bpm) < chain_amounts
+        values = raw[1:]
+        if clamp.any():
+            values[np.argmax(clamp):] = min_bpm
+        result[chain] = values
+    return result
+
+def _decay_step(value, amount, min_bpm):
+    diff = value - min_bpm
+    return np.where(np.abs(diff) < amount, float(min_bpm), value - np.sign(diff) * amount)
+
+class BeatDetectionBPMCalculator:
+    def __init__(self, initial_bpm=36, min_bpm=30, max_bpm=50, sample_rate=60, window_seconds=6.0,
+                 min_stroke_speed=150, min_stroke_depth=30, max_gap=0.25,
+                 min_confidence=0.3, smoothing=0.05, clock=None, verbose=True):
+        # Finds the ictus of each beat (bottom of the downstroke) from the wrist trajectory and
+        # estimates the tempo from a sliding autocorrelation of the onset envelope
+        self.clock = clock if clock is not None else SystemClock()
+        self.current_bpm = initial_bpm
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.sample_rate = sample_rate
+        self.window_seconds = window_seconds
+        self.min_stroke_speed = min_stroke_speed
+        self.min_stroke_depth = min_stroke_depth
+        self.max_gap = max_gap
+        self.min_confidence = min_confidence
+        self.smoothing = smoothing
+        self.verbose = verbose
+
+        self.last_position = None
+        self.last_time = None
+        self.velocity = 0.0
+        self.stroke_peak = 0.0
+        self.stroke_top = None
+        self.beat_times = deque(maxlen=16)
+        self.beat_intervals = deque(maxlen=4)
+        self.beat_count = 0
+        self.confidence = 0.0
+        self._reset_analysis()
+
+    def _reset_analysis(self):
+        # Onset envelope on a fixed sample grid, kept in a ring long enough for the window plus the longest lag
+        self.min_lag = max(1, int(math.ceil(60 * self.sample_rate / self.max_bpm)))
+        self.max_lag = max(self.min_lag, int(60 * self.sample_rate / self.min_bpm))
+        self.window = max(int(self.window_seconds * self.sample_rate), 2 * self.max_lag)
+        self.envelope = np.zeros(self.window + self.max_lag + 1)
+        self.lags = np.arange(self.max_lag + 1)
+        # acf[lag] = sum of x[n] * x[n - lag] over the last `window` samples
+        self.acf = np.zeros(self.max_lag + 1)
+        self.sample_count = 0
+        self.next_sample_time = None
+        self.pending_onset = 0.0
+
+    def update_config(self, key, value):
+        if key == 'MIN_BPM':
+            self.min_bpm = value
+            self._reset_analysis()
+        elif key == 'MAX_BPM':
+            self.max_bpm = value
+            self._reset_analysis()
+        elif key == 'INITIAL_BPM':
+            self.current_bpm = value
+
+    def update_bpm(self, hand_position):
+        current_time = self.clock.time()
+        if hand_position is not None:
+            if self.last_position is not None and current_time - self.last_time > self.max_gap:
+                # Hands were out of view too long to join the stroke across the gap
+                self.velocity = 0.0
+                self.stroke_top = None
+            elif self.last_position is not None and current_time > self.last_time:
+                self._track_stroke(hand_position, current_time)
+            self.last_position = hand_position
+            self.last_time = current_time
+        # Short dropouts are bridged by the next detection; the envelope keeps running either way
+        self._advance_envelope(current_time)
+        return self.current_bpm
+
+    def _track_stroke(self, hand_position, current_time):
+        dt = current_time - self.last_time
+        # Image y grows downwards, so positive velocity is the downstroke
+        velocity = 0.5 * (hand_position[1] - self.last_position[1]) / dt + 0.5 * self.velocity
+        # Onset strength: how sharply the downward motion is being stopped
+        self.pending_onset += max(0.0, self.velocity - velocity)
+        if velocity > 0:
+            if self.velocity <= 0 or self.stroke_top is None:
+                # A downstroke starts here
+                self.stroke_top = self.last_position[1]
+                self.stroke_peak = 0.0
+            self.stroke_peak = max(self.stroke_peak, velocity)
+        elif self.velocity > 0 and self.stroke_top is not None:
+            # Down -> up turn after a real downstroke: the ictus, placed where the velocity crossed zero.
+            # Jitter around the top of the gesture is too shallow or too slow to count.
+            depth = hand_position[1] - self.stroke_top
+            if self.stroke_peak >= self.min_stroke_speed and depth >= self.min_stroke_depth:
+                beat_time = self.last_time + dt * self.velocity / (self.velocity - velocity)
+                # The velocity smoothing lags the raw trajectory by about one frame
+                beat_time -= dt
+                self._add_beat(beat_time)
+            self.stroke_top = None
+        self.velocity = velocity
+
+    def _add_beat(self, beat_time):
+        if self.beat_times:
+            interval = beat_time - self.beat_times[-1]
+            # Rebounds faster than the maximum tempo are part of the same beat
+            if interval < 30 / self.max_bpm:
+                return
+            if 60 / self.max_bpm <= interval <= 60 / self.min_bpm:
+                self.beat_intervals.append(interval)
+        self.beat_times.append(beat_time)
+        self.beat_count += 1
+        if self.verbose:
+            print(f"Beat at {beat_time:.3f}s, Current BPM: {self.current_bpm:.2f}")
+
+    def _advance_envelope(self, current_time):
+        if self.next_sample_time is None:
+            self.next_sample_time = current_time
+        if current_time - self.next_sample_time > self.window / self.sample_rate:
+            # Too long a gap to carry anything over
+            self._reset_analysis()
+            self.next_sample_time = current_time
+        pushed = False
+        while self.next_sample_time <= current_time:
+            self._push_sample(self.pending_onset)
+            self.pending_onset = 0.0
+            self.next_sample_time += 1 / self.sample_rate
+            pushed = True
+        if pushed:
+            self._estimate_tempo()
+
+    def _push_sample(self, value):
+        # Slide the autocorrelation window by one sample: add the new products, drop the oldest ones
+        size = len(self.envelope)
+        n = self.sample_count
+        self.envelope[n % size] = value
+        delayed = self.envelope[(n - self.lags) % size]
+        outgoing = self.envelope[(n - self.window) % size]
+        outgoing_delayed = self.envelope[(n - self.window - self.lags) % size]
+        self.acf += value * delayed - outgoing * outgoing_delayed
+        self.sample_count += 1
+        if self.sample_count % self.window == 0:
+            # Recompute exactly once per window so rounding errors cannot build up
+            self._recompute_acf()
+
+    def _recompute_acf(self):
+        size = len(self.envelope)
+        n = self.sample_count
+        ordered = self.envelope[np.arange(n - self.window - self.max_lag, n) % size]
+        if n < self.window + self.max_lag:
+            ordered[:self.window + self.max_lag - n] = 0.0
+        recent = ordered[self.max_lag:]
+        for lag in self.lags:
+            self.acf[lag] = np.dot(recent, ordered[self.max_lag - lag:len(ordered) - lag])
+
+    def _estimate_tempo(self):
+        tempo = None
+        self.confidence = 0.0
+        if self.sample_count >= 2 * self.max_lag and self.acf[0] > 0:
+            candidates = self.acf[self.min_lag:self.max_lag + 1]
+            peak = int(np.argmax(candidates))
+            if len(self.beat_intervals) >= 2:
+                peak = self._beat_level_peak(candidates, peak)
+            self.confidence = candidates[peak] / self.acf[0]
+            if self.confidence >= self.min_confidence:
+                lag = float(peak + self.min_lag)
+                if 0 < peak < len(candidates) - 1:
+                    # Parabolic interpolation for a sub-sample period
+                    left, center, right = candidates[peak - 1], candidates[peak], candidates[peak + 1]
+                    denominator = left - 2 * center + right
+                    if denominator < 0:
+                        lag += 0.5 * (left - right) / denominator
+                tempo = 60 * self.sample_rate / lag
+        if tempo is None and len(self.beat_intervals) >= 2:
+            # Not enough periodic evidence yet, fall back to the recent inter-beat intervals
+            tempo = 60 / float(np.median(self.beat_intervals))
+        if tempo is not None:
+            tempo = max(self.min_bpm, min(tempo, self.max_bpm))
+            self.current_bpm += self.smoothing * (tempo - self.current_bpm)
+
+    def _beat_level_peak(self, candidates, peak):
+        # The envelope also repeats every two beats and every bar, and when MIN/MAX_BPM span an
+        # octave those peaks are often the strongest. If the strongest peak sits at a whole multiple
+        # of the detected beat interval, use the strongest peak around one beat instead.
+        beat_lag = float(np.median(self.beat_intervals)) * self.sample_rate
+        ratio = (peak + self.min_lag) / beat_lag
+        multiple = int(round(ratio))
+        if multiple < 2 or abs(ratio - multiple) > 0.15 * multiple:
+            return peak
+        center = (peak + self.min_lag) / multiple
+        start = max(self.min_lag, int(center * 0.85))
+        end = min(self.max_lag, int(math.ceil(center * 1.15)))
+        if start > end:
+            return peak
+        return start - self.min_lag + int(np.argmax(candidates[start - self.min_lag:end - self.min_lag + 1]))
+
+    def get_bpm(self):
+        return self.current_bpm
+
 class PatternBPMCalculator:
     def __init__(self, window_size=4, initial_bpm=36, min_bpm=30, max_bpm=50, touch_count=4):
         self.window_size = window_size
@@ -134,3 +504,53 @@ class PatternBPMCalculator:
     def get_next_expected(self):
         return self.expected_pattern[self.pattern_index]
 
+class GestureBPMCalculator:
+    def __init__(self, window_size=4, initial_bpm=36, min_bpm=30, max_bpm=50, clock=None, verbose=True):
+        # Mode 2 without boxes: the index fingertip trajectory is matched against conducting
+        # templates, and the tempo comes from the ictus times the matcher reports
+        self.clock = clock if clock is not None else SystemClock()
+        self.matcher = StreamingDTWMatcher()
+        self.beat_times = deque(maxlen=window_size)
+        self.current_bpm = initial_bpm
+        self.last_valid_bpm = initial_bpm
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.meter = None
+        self.last_beat = None
+        self.verbose = verbose
+
+    def update_config(self, key, value):
+        if key == 'MIN_BPM':
+            self.min_bpm = value
+        elif key == 'MAX_BPM':
+            self.max_bpm = value
+        elif key == 'INITIAL_BPM':
+            self.current_bpm = value
+            self.last_valid_bpm = value
+
+    def add_position(self, position):
+        # Returns the beats (index in bar, time) recognised on this frame
+        beats = self.matcher.update(position, self.clock.time())
+        self.meter = self.matcher.meter
+        for beat, beat_time in beats:
+            self.beat_times.append(beat_time)
+            self.last_beat = beat
+            if self.verbose:
+                print(f"Beat {beat + 1}/{self.meter} at {beat_time:.3f}s")
+        if beats:
+            self._calculate_bpm()
+        return beats
+
+    def _calculate_bpm(self):
+        if len(self.beat_times) >= 2:
+            avg_interval = (self.beat_times[-1] - self.beat_times[0]) / (len(self.beat_times) - 1)
+            bpm = 60 / avg_interval if avg_interval > 0 else 0
+
+            if self.min_bpm <= bpm <= self.max_bpm:
+                self.current_bpm = bpm
+                self.last_valid_bpm = bpm
+            elif self.last_valid_bpm is not None:
+                self.current_bpm = self.last_valid_bpm
+
+    def get_bpm(self):
+        return self.current_bpm
@@ -0,0 +1,26 @@
+import time
+
+class SystemClock:
+    # Wall-clock time, used for live sessions
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class VirtualClock:
+    def __init__(self, start_time=0.0):
+        # Manually advanced time, so replays can run faster than real time
+        self.now = start_time
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def set(self, timestamp):
+        self.now = timestamp
+
+    def sleep(self, seconds):
+        self.advance(seconds)
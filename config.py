@@ -5,4 +5,14 @@ MAX_BPM = 50
 
 # OSC configuration
 OSC_SERVER = "127.0.0.1"
-OSC_PORT = 57121
\ No newline at end of file
+OSC_PORT = 57121
+
+# Extra OSC destinations, on top of OSC_SERVER:OSC_PORT which receives everything.
+# Each route sends the addresses matching its pattern to one receiver, optionally at most once
+# per min_interval seconds and only when a numeric value moved by change_threshold, e.g.
+# {'address': '/tempo/*', 'host': '127.0.0.1', 'port': 57120, 'min_interval': 0.05, 'change_threshold': 0.5}
+# DirSim Port's MIDI file playback takes '/tempo/raw', '/play' and '/stop' on port 57122:
+# {'address': '/tempo/raw', 'host': '127.0.0.1', 'port': 57122},
+# {'address': '/play', 'host': '127.0.0.1', 'port': 57122},
+# {'address': '/stop', 'host': '127.0.0.1', 'port': 57122}
+OSC_ROUTES = []
@@ -0,0 +1,188 @@
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+class SharedFrameRing:
+    def __init__(self, slot_count, frame_shape, name=None):
+        # A ring of fixed-size uint8 frame slots in one shared memory block
+        self.slot_count = slot_count
+        self.frame_shape = tuple(frame_shape)
+        self.frame_bytes = int(np.prod(self.frame_shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * slot_count)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slot_count,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, slot, img):
+        # Copy a frame into a slot, returning the (height, width) actually used
+        height, width = img.shape[:2]
+        if height > self.frame_shape[0] or width > self.frame_shape[1] or img.shape[2:] != self.frame_shape[2:]:
+            raise ValueError(f"Frame of shape {img.shape} does not fit in slots of shape {self.frame_shape}")
+        self.frames[slot, :height, :width] = img
+        return height, width
+
+    def view(self, slot, height, width):
+        return self.frames[slot, :height, :width]
+
+    def close(self):
+        # Drop our numpy view before closing the mapping
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _detection_worker(shm_name, slot_count, frame_shape, task_queue, result_queue, detector_kwargs):
+    # Runs in a worker process: one HandDetector per process, frames read straight from shared memory.
+    # ROI crops go to a second, static-mode detector so video tracking never mixes crop and full-frame coordinates.
+    from cvzone.HandTrackingModule import HandDetector
+
+    ring = SharedFrameRing(slot_count, frame_shape, name=shm_name)
+    detector = HandDetector(**detector_kwargs)
+    crop_detector = HandDetector(**dict(detector_kwargs, staticMode=True))
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            seq, slot, height, width, crop = task
+            try:
+                hands, _ = (crop_detector if crop else detector).findHands(ring.view(slot, height, width), draw=False)
+            except Exception as e:
+                print(f"Error in detection worker: {e}")
+                hands = []
+            landmarks = np.array([hand["lmList"] for hand in hands], dtype=np.int32).reshape(len(hands), 21, 3)
+            bboxes = np.array([hand["bbox"] for hand in hands], dtype=np.int32).reshape(len(hands), 4)
+            types = [hand["type"] for hand in hands]
+            result_queue.put((seq, slot, landmarks, types, bboxes))
+    finally:
+        ring.close()
+
+def landmarks_to_hands(landmarks, types, bboxes):
+    # Rebuild cvzone-style hand dictionaries from landmark arrays
+    hands = []
+    for lm_list, hand_type, bbox in zip(landmarks, types, bboxes):
+        x, y, w, h = (int(v) for v in bbox)
+        hands.append({
+            "lmList": lm_list.tolist(),
+            "bbox": (x, y, w, h),
+            "center": (x + w // 2, y + h // 2),
+            "type": hand_type
+        })
+    return hands
+
+class PoolCropDetector:
+    def __init__(self, pool):
+        # findHands for ROI crops, run by the workers' static-mode detector
+        self.pool = pool
+
+    def findHands(self, img, draw=False):
+        return self.pool.findHands(img, draw, crop=True)
+
+class ProcessPoolHandDetector:
+    def __init__(self, frame_shape, workers=2, slot_count=None, detector_kwargs=None, result_timeout=10.0):
+        # Detection runs in worker processes; frames are passed through shared memory slots, never pickled.
+        # result_timeout bounds findHands, generous enough for the workers' first MediaPipe load.
+        if detector_kwargs is None:
+            detector_kwargs = dict(staticMode=False, maxHands=2, modelComplexity=1, detectionCon=0.5, minTrackCon=0.5)
+        if slot_count is None:
+            slot_count = workers + 2
+        self.ring = SharedFrameRing(slot_count, frame_shape)
+        context = multiprocessing.get_context('spawn')  # MediaPipe is not fork-safe
+        self.task_queue = context.Queue()
+        self.result_queue = context.Queue()
+        self.free_slots = queue.Queue()
+        for slot in range(slot_count):
+            self.free_slots.put(slot)
+        self.lock = threading.Lock()
+        self.in_flight = deque()
+        self.results = {}
+        # Frames given up on whose results may still arrive
+        self.abandoned = set()
+        self.next_seq = 0
+        self.result_timeout = result_timeout
+        # What HandTracker runs ROI crops through
+        self.crop_detector = PoolCropDetector(self)
+        self.processes = [
+            context.Process(
+                target=_detection_worker,
+                args=(self.ring.name, slot_count, self.ring.frame_shape, self.task_queue, self.result_queue, detector_kwargs),
+                daemon=True
+            )
+            for _ in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def submit(self, img, seq=None, timeout=None, crop=False):
+        # Queue a frame (or, with crop, an ROI crop) for detection, blocking while every slot is in flight
+        slot = self.free_slots.get(timeout=timeout)
+        try:
+            height, width = self.ring.write(slot, img)
+        except Exception:
+            # e.g. a frame larger than the slots after a camera switch; the slot stays usable
+            self.free_slots.put(slot)
+            raise
+        with self.lock:
+            if seq is None:
+                seq = self.next_seq
+            self.next_seq = seq + 1
+        self.task_queue.put((seq, slot, height, width, crop))
+        with self.lock:
+            self.in_flight.append(seq)
+        return seq
+
+    def get_result(self, timeout=None, seq=None):
+        # Return (seq, landmarks, types, bboxes) for the oldest submitted frame, in submission order.
+        # With seq, frames submitted before it that were never collected (e.g. after a timeout)
+        # are given up on and the result for seq itself is returned.
+        with self.lock:
+            if seq is not None:
+                while self.in_flight and self.in_flight[0] < seq:
+                    stale = self.in_flight.popleft()
+                    if self.results.pop(stale, None) is None:
+                        self.abandoned.add(stale)
+            if not self.in_flight or (seq is not None and self.in_flight[0] != seq):
+                raise RuntimeError(f"Frame {seq} was not submitted for detection" if seq is not None
+                                   else "No frames submitted for detection")
+            seq = self.in_flight[0]
+        while seq not in self.results:
+            result_seq, slot, landmarks, types, bboxes = self.result_queue.get(timeout=timeout)
+            self.free_slots.put(slot)
+            if result_seq in self.abandoned:
+                self.abandoned.discard(result_seq)
+                continue
+            self.results[result_seq] = (landmarks, types, bboxes)
+        with self.lock:
+            self.in_flight.popleft()
+        landmarks, types, bboxes = self.results.pop(seq)
+        return seq, landmarks, types, bboxes
+
+    def findHands(self, img, draw=False, crop=False):
+        # Blocking drop-in for HandDetector.findHands (draw is not supported out of process)
+        try:
+            seq = self.submit(img, timeout=self.result_timeout, crop=crop)
+            _, landmarks, types, bboxes = self.get_result(timeout=self.result_timeout, seq=seq)
+        except queue.Empty:
+            exited = sum(1 for process in self.processes if not process.is_alive())
+            reason = f"; {exited} of {len(self.processes)} detection processes have exited" if exited else ""
+            raise RuntimeError(f"No hand detection result within {self.result_timeout} s{reason}") from None
+        return landmarks_to_hands(landmarks, types, bboxes), img
+
+    def close(self):
+        for _ in self.processes:
+            self.task_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
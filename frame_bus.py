@@ -0,0 +1,151 @@
+import threading
+
+import numpy as np
+
+class FrameRef:
+    def __init__(self, bus, index, generation, frame, seq, capture_time):
+        # One hold on a bus slot; the slot is not reused until every hold is released
+        self.bus = bus
+        self.index = index
+        self.generation = generation
+        self.frame = frame
+        self.seq = seq
+        self.capture_time = capture_time
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.bus.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class FrameBus:
+    def __init__(self, slots=4):
+        # A ring of preallocated frame buffers shared by one producer and any number of consumers.
+        # The producer fills a free slot in place and publishes it; consumers hold the newest
+        # published slot for as long as they need it without copying. A slot is only handed out
+        # for writing again once nobody holds it, so memory stays at slots frames whatever the
+        # consumers do, and a consumer that falls behind simply gets the newest frame next time.
+        self.slot_count = slots
+        self.condition = threading.Condition()
+        self.shape = None
+        self.dtype = None
+        self.generation = 0
+        self.frames = []
+        self.readonly = []
+        self.refcounts = []
+        self.seqs = []
+        self.times = []
+        self.latest = -1
+        self.next_seq = 0
+        self.closed = False
+        self.published = 0
+        self.overruns = 0
+
+    def _allocate(self, shape, dtype):
+        # Holders of old slots keep their arrays; their releases are ignored by generation
+        self.generation += 1
+        self.shape = shape
+        self.dtype = dtype
+        self.frames = [np.empty(shape, dtype) for _ in range(self.slot_count)]
+        self.readonly = []
+        for frame in self.frames:
+            view = frame.view()
+            view.flags.writeable = False
+            self.readonly.append(view)
+        self.refcounts = [0] * self.slot_count
+        self.seqs = [-1] * self.slot_count
+        self.times = [None] * self.slot_count
+        self.latest = -1
+
+    def acquire_write(self, shape, dtype=np.uint8):
+        # A slot for the producer to fill, or None when every slot is still held by someone.
+        # The buffers are (re)allocated when the frame shape changes, e.g. after a camera switch.
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self.condition:
+            if shape != self.shape or dtype != self.dtype:
+                self._allocate(shape, dtype)
+            index = -1
+            for i in range(self.slot_count):
+                # Oldest free slot; the latest frame stays readable until a newer one is published
+                if self.refcounts[i] == 0 and i != self.latest and (index < 0 or self.seqs[i] < self.seqs[index]):
+                    index = i
+            if index < 0:
+                self.overruns += 1
+                return None
+            self.refcounts[index] = 1
+            self.seqs[index] = -1
+            return FrameRef(self, index, self.generation, self.frames[index], -1, None)
+
+    def publish(self, ref, capture_time=None):
+        # Makes a written slot the latest frame; the producer still holds it until it releases
+        with self.condition:
+            if ref.generation != self.generation:
+                return
+            ref.seq = self.next_seq
+            ref.capture_time = capture_time
+            self.seqs[ref.index] = self.next_seq
+            self.times[ref.index] = capture_time
+            self.latest = ref.index
+            self.next_seq += 1
+            self.published += 1
+            self.condition.notify_all()
+
+    def acquire_latest(self, after_seq=-1, timeout=None):
+        # A read-only hold on the newest frame published after after_seq, or None on timeout or
+        # once the bus is closed and there is nothing new
+        with self.condition:
+            available = lambda: self.latest >= 0 and self.seqs[self.latest] > after_seq
+            if not self.condition.wait_for(lambda: self.closed or available(), timeout) or not available():
+                return None
+            index = self.latest
+            self.refcounts[index] += 1
+            return FrameRef(self, index, self.generation, self.readonly[index], self.seqs[index], self.times[index])
+
+    def release(self, ref):
+        with self.condition:
+            if ref.generation == self.generation:
+                self.refcounts[ref.index] -= 1
+
+    def subscribe(self):
+        return FrameSubscriber(self)
+
+    def close(self):
+        # Wakes every waiting consumer with None
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def reopen(self):
+        with self.condition:
+            self.closed = False
+
+    def stats(self):
+        with self.condition:
+            return {'slots': self.slot_count, 'held': sum(1 for count in self.refcounts if count),
+                    'published': self.published, 'overruns': self.overruns}
+
+class FrameSubscriber:
+    def __init__(self, bus):
+        # A consumer's position on the bus: each get() returns the newest frame it has not seen,
+        # counting the ones it skipped over
+        self.bus = bus
+        self.last_seq = -1
+        self.received = 0
+        self.skipped = 0
+
+    def get(self, timeout=1.0):
+        ref = self.bus.acquire_latest(self.last_seq, timeout)
+        if ref is None:
+            return None
+        if self.last_seq >= 0:
+            self.skipped += ref.seq - self.last_seq - 1
+        self.last_seq = ref.seq
+        self.received += 1
+        return ref
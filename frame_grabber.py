@@ -0,0 +1,148 @@
+import threading
+import time
+
+from frame_bus import FrameBus
+
+def read_into(cap, bus, shape):
+    # Reads the next frame straight into a free bus slot. A frame that did not land in the slot
+    # (the first one, a new frame size, or a capture that ignores the buffer) is copied in once.
+    ref = bus.acquire_write(shape) if shape is not None else None
+    success, img = cap.read(ref.frame) if ref is not None else cap.read()
+    if not success:
+        if ref is not None:
+            ref.release()
+        return False, None
+    if ref is None or img is not ref.frame:
+        if ref is not None:
+            ref.release()
+        ref = bus.acquire_write(img.shape, img.dtype)
+        if ref is None:
+            # Every slot is still held; this frame is dropped
+            return True, None
+        ref.frame[...] = img
+    return True, ref
+
+class FrameGrabber:
+    def __init__(self, cap, slots=4):
+        # Capture device and the latest-frame buffer: frames are read into a ring of preallocated
+        # slots and the reader always gets the newest one (older ones are dropped). Slots hold
+        # frames still in use downstream, so pipelined runs need one per frame in flight.
+        self.cap = cap
+        self.bus = FrameBus(slots=slots)
+        self.subscriber = self.bus.subscribe()
+        self.frame_shape = None
+        self.condition = threading.Condition()
+        self.running = False
+        self.failed = False
+        self.thread = None
+        # Sequence numbers let the consumer know how many frames it skipped
+        self.last_read_seq = -1
+        # perf_counter time at which the last returned frame came off the camera
+        self.last_read_time = None
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        self.running = True
+        self.failed = False
+        self.bus.reopen()
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+
+    def _capture_loop(self):
+        while self.running:
+            with self.condition:
+                cap = self.cap
+            success, ref = read_into(cap, self.bus, self.frame_shape)
+            capture_time = time.perf_counter()
+            with self.condition:
+                if cap is not self.cap:
+                    # The camera was swapped while we were reading, discard the frame
+                    if ref is not None:
+                        ref.release()
+                    continue
+                if not success:
+                    self.failed = True
+                    self.running = False
+                    self.bus.close()
+                    break
+                if ref is not None:
+                    self.frame_shape = ref.frame.shape
+            if ref is None:
+                continue
+            self.bus.publish(ref, capture_time)
+            ref.release()
+            self.frames_captured += 1
+
+    def read(self, timeout=1.0):
+        # Return a hold on the newest frame (release it when done) and how many frames were
+        # dropped since the last read. False means no frame within timeout; failed tells whether
+        # the camera is gone.
+        ref = self.subscriber.get(timeout)
+        if ref is None:
+            return False, None, 0
+        dropped = ref.seq - self.last_read_seq - 1 if self.last_read_seq >= 0 else 0
+        self.last_read_seq = ref.seq
+        self.last_read_time = ref.capture_time
+        self.frames_dropped += dropped
+        return True, ref, dropped
+
+    def set_capture(self, cap):
+        # Swap the capture device, dropping any frame taken from the old one
+        with self.condition:
+            old_cap = self.cap
+            self.cap = cap
+            self.frame_shape = None
+        return old_cap
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+        self.bus.close()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+class DirectFrameSource:
+    def __init__(self, cap, slots=4):
+        # Synchronous stand-in for FrameGrabber: reads on demand into its own slots and never drops frames
+        self.cap = cap
+        self.bus = FrameBus(slots=slots)
+        self.frame_shape = None
+        self.running = False
+        self.failed = False
+        self.last_read_seq = -1
+        self.last_read_time = None
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        self.running = True
+        self.failed = False
+
+    def read(self, timeout=1.0):
+        if not self.running:
+            return False, None, 0
+        success, ref = read_into(self.cap, self.bus, self.frame_shape)
+        if not success:
+            self.failed = True
+            return False, None, 0
+        if ref is None:
+            print(f"All {self.bus.slot_count} frame slots are still in use")
+            self.failed = True
+            return False, None, 0
+        self.frame_shape = ref.frame.shape
+        self.bus.publish(ref, time.perf_counter())
+        self.last_read_time = ref.capture_time
+        self.last_read_seq = ref.seq
+        self.frames_captured += 1
+        return True, ref, 0
+
+    def set_capture(self, cap):
+        old_cap = self.cap
+        self.cap = cap
+        self.frame_shape = None
+        return old_cap
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+
+# Conducting patterns as seen on the mirrored camera image (x right, y down), one bar each.
+# For every beat: where the ictus lands, then the top of the rebound that leads to the next beat.
+CONDUCTING_PATTERNS = {
+    2: [((0.0, 1.0), (0.3, -0.1)), ((0.3, 0.6), (0.0, -1.0))],
+    3: [((0.0, 1.0), (0.3, 0.2)), ((0.9, 0.7), (0.7, 0.0)), ((0.4, 0.3), (0.0, -1.0))],
+    4: [((0.0, 1.0), (-0.3, 0.3)), ((-0.9, 0.7), (-0.2, 0.2)), ((0.9, 0.7), (0.7, 0.0)), ((0.4, 0.3), (0.0, -1.0))],
+}
+
+def make_template(pattern, samples_per_beat=12):
+    # Resample the ictus -> rebound -> next ictus path of every beat to a fixed number of points,
+    # then center it and scale it to unit RMS radius like the live trajectory.
+    # Index beat * samples_per_beat is the ictus of that beat.
+    points = []
+    half = samples_per_beat // 2
+    for beat, (ictus, top) in enumerate(pattern):
+        next_ictus = pattern[(beat + 1) % len(pattern)][0]
+        for k in range(half):
+            # Rebound decelerates into the top
+            u = math.sin(0.5 * math.pi * k / half)
+            points.append((ictus[0] + (top[0] - ictus[0]) * u, ictus[1] + (top[1] - ictus[1]) * u))
+        for k in range(samples_per_beat - half):
+            # Fall accelerates into the next ictus
+            u = 1 - math.cos(0.5 * math.pi * k / (samples_per_beat - half))
+            points.append((top[0] + (next_ictus[0] - top[0]) * u, top[1] + (next_ictus[1] - top[1]) * u))
+    template = np.array(points)
+    template -= template.mean(axis=0)
+    template /= math.sqrt((template ** 2).sum(axis=1).mean())
+    return template
+
+class StreamingDTWMatcher:
+    def __init__(self, meters=(2, 3, 4), samples_per_beat=12, band=6, decay=0.9, tau=3.0,
+                 lock_cost=0.6, switch_margin=0.15):
+        # One cyclic, open-begin DTW column per template, advanced one frame at a time.
+        # The accumulated cost decays so old frames are forgotten, and once a template is locked
+        # only a band of cells around the current alignment is updated.
+        self.samples_per_beat = samples_per_beat
+        self.band = band
+        self.decay = decay
+        self.tau = tau
+        self.lock_cost = lock_cost
+        self.switch_margin = switch_margin
+        self.templates = {meter: make_template(CONDUCTING_PATTERNS[meter], samples_per_beat) for meter in meters}
+        self.reset()
+
+    def reset(self):
+        # Open begin: any cell may start a fresh alignment as if the past matched at twice the lock cost
+        self.restart_cost = 2 * self.lock_cost / (1 - self.decay)
+        self.costs = {meter: np.full(len(template), self.restart_cost) for meter, template in self.templates.items()}
+        self.positions = {meter: None for meter in self.templates}
+        self.scores = {meter: math.inf for meter in self.templates}
+        self.previous = {meter: None for meter in self.templates}
+        self.meter = None
+        self.center = None
+        self.scale = None
+        self.last_time = None
+
+    def _normalize(self, position, timestamp):
+        # Running center and RMS radius of the gesture, so the templates are position and size free
+        point = np.array(position[:2], dtype=np.float64)
+        if self.center is None:
+            self.center = point.copy()
+            self.scale = 0.0
+            return None
+        alpha = 1 - math.exp(-max(timestamp - self.last_time, 0.0) / self.tau)
+        self.center += alpha * (point - self.center)
+        offset = point - self.center
+        self.scale += alpha * (offset @ offset - self.scale)
+        if self.scale <= 1.0:
+            return None
+        return offset / math.sqrt(self.scale)
+
+    def update(self, position, timestamp):
+        # Feed one fingertip position; returns the beats (index in bar, ictus time) passed on this frame
+        if position is None or (self.last_time is not None and timestamp <= self.last_time):
+            return []
+        feature = self._normalize(position, timestamp)
+        self.last_time = timestamp
+        if feature is None:
+            return []
+
+        for meter, template in self.templates.items():
+            self._advance(meter, template, feature)
+
+        # Keep the current meter unless another template is clearly better
+        best = min(self.scores, key=self.scores.get)
+        if self.meter is None or self.scores[best] < self.scores[self.meter] - self.switch_margin:
+            if self.scores[best] < self.lock_cost:
+                self.meter = best
+
+        beats = []
+        if self.meter is not None and self.scores[self.meter] < self.lock_cost:
+            beats = self._passed_beats(self.meter, timestamp)
+        for meter in self.templates:
+            if not self._slipped_back(meter):
+                self.previous[meter] = self.positions[meter]
+        return beats
+
+    def _slipped_back(self, meter):
+        # A small backwards jitter of the alignment is held at the furthest point reached,
+        # so going forward again does not pass the same ictus twice
+        old = self.previous[meter]
+        if old is None:
+            return False
+        size = len(self.templates[meter])
+        return (self.positions[meter] - old) % size > size // 2
+
+    def _advance(self, meter, template, feature):
+        size = len(template)
+        cost = self.costs[meter]
+        position = self.positions[meter]
+        if position is not None and self.scores[meter] < self.lock_cost:
+            # Locked: only cells within the band ahead of and behind the alignment can change
+            cells = (position + np.arange(-self.band, self.band + 1)) % size
+        else:
+            cells = np.arange(size)
+        local = ((template[cells] - feature) ** 2).sum(axis=1)
+        # Steps: stay, advance one, or skip one template point (cyclic, so bars repeat)
+        previous = np.minimum(np.minimum(cost[cells], cost[(cells - 1) % size]), cost[(cells - 2) % size])
+        previous = np.minimum(previous, self.restart_cost)
+        updated = np.full(size, self.restart_cost)
+        updated[cells] = local + self.decay * previous
+        self.costs[meter] = updated
+        best = int(cells[np.argmin(updated[cells])])
+        self.positions[meter] = best
+        # Average local cost the decayed sum corresponds to
+        self.scores[meter] = updated[best] * (1 - self.decay)
+
+    def _passed_beats(self, meter, timestamp):
+        old = self.previous[meter]
+        new = self.positions[meter]
+        if old is None:
+            return []
+        size = len(self.templates[meter])
+        step = (new - old) % size
+        if step == 0 or step > size // 2:
+            # Standing still or slipping backwards
+            return []
+        beats = []
+        for k in range(1, step + 1):
+            index = (old + k) % size
+            if index % self.samples_per_beat == 0:
+                beats.append((index // self.samples_per_beat, timestamp))
+        return beats
@@ -1,14 +1,36 @@
 import sys
 import cv2
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
-                             QSlider, QPushButton, QLineEdit, QComboBox, QGroupBox, QFormLayout, QSizePolicy, QCheckBox)
+                             QSlider, QPushButton, QLineEdit, QComboBox, QGroupBox, QFormLayout, QSizePolicy, QCheckBox,
+                             QSpinBox, QPlainTextEdit)
 from PyQt5.QtGui import QColor, QPainter, QImage, QPixmap, QFont, QPalette
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QRect
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QRect, QTimer
 
 import numpy as np
 
 from main import MainProgram
-from config import INITIAL_BPM, MIN_BPM, MAX_BPM, OSC_SERVER, OSC_PORT
+from config import INITIAL_BPM, MIN_BPM, MAX_BPM, OSC_SERVER, OSC_PORT, OSC_ROUTES
+from log_buffer import LogBuffer, LogStream, DEBUG, INFO, WARNING, ERROR, LEVEL_NAMES
+
+LOG_CAPACITY = 2000  # Lines kept in the log panel, older ones are dropped
+LOG_REFRESH_MS = 200
+# Level of each printed line by prefix, first match wins. Per-frame and per-message lines are
+# Debug: they are kept in the log but no longer echoed to the terminal.
+LOG_LEVELS = (
+    ('Error', ERROR),
+    ('Failed', ERROR),
+    ('Cannot', WARNING),
+    ('Sent OSC message', DEBUG),
+    ('OSC queued', DEBUG),
+    ('BPM: ', DEBUG),
+    ('Beat clock', INFO),
+    ('Beat ', DEBUG),
+    ('Avg Speed', DEBUG),
+    ('Hand is still', DEBUG),
+    ('Small movement', DEBUG),
+    ('No hand detected', DEBUG),
+    ('Dropped ', DEBUG)
+)
 
 class ColorPalette:
     PRIMARY = "#2980b9"  # Darker blue
@@ -173,21 +195,59 @@ class DynamicRangeBar(QWidget):
         painter.setFont(QFont("Arial", 16, QFont.Bold))  # Increased font size
         painter.drawText(self.rect(), Qt.AlignCenter, f"{dynamic_range} BPM")
 
+class DisplayConverter:
+    def __init__(self, width=960, height=540):
+        # Turns a BGR camera frame into an RGB QImage of the display size, reusing its buffers
+        self.width = width
+        self.height = height
+        self.resized = None
+        self.rgb = None
+
+    def convert(self, frame):
+        # The QImage shares self.rgb, so the next convert() must wait until it has been shown
+        h, w = frame.shape[:2]
+        scale = min(self.width / w, self.height / h)
+        size = (max(int(w * scale), 1), max(int(h * scale), 1))
+        if self.rgb is None or (self.rgb.shape[1], self.rgb.shape[0]) != size:
+            self.resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self.rgb = np.empty_like(self.resized)
+        cv2.resize(frame, size, dst=self.resized, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        return QImage(self.rgb.data, size[0], size[1], 3 * size[0], QImage.Format_RGB888)
+
 class MainThread(QThread):
     update_bpm = pyqtSignal(float)
-    update_frame = pyqtSignal(np.ndarray)
+    # The QImage does not own its pixels; the array travels with it so they outlive this thread
+    update_frame = pyqtSignal(QImage, object)
 
     def __init__(self, config):
         super().__init__()
         self.config = config
         self.main_program = None
         self.running = False
+        self.converter = DisplayConverter(960, 540)
+        # Set while a frame is waiting for the GUI; frames arriving meanwhile are skipped, so the
+        # GUI thread never has more than one frame queued
+        self.frame_in_flight = False
+        self.frames_skipped = 0
 
     def run(self):
         self.running = True
-        self.main_program = MainProgram(self.update_bpm.emit, self.update_frame.emit, self.config)
+        self.main_program = MainProgram(self.update_bpm.emit, self.emit_frame, self.config)
         self.main_program.run()
 
+    def emit_frame(self, frame):
+        # Called on the processing side: converts to a display-sized RGB image here, not on the GUI thread
+        if self.frame_in_flight:
+            self.frames_skipped += 1
+            return
+        self.frame_in_flight = True
+        image = self.converter.convert(frame)
+        self.update_frame.emit(image, self.converter.rgb)
+
+    def frame_shown(self):
+        self.frame_in_flight = False
+
     def stop(self):
         self.running = False
         if self.main_program:
@@ -270,6 +330,12 @@ class HandTrackingGUI(QMainWindow):
         self.touch_count_combo.currentIndexChanged.connect(self.update_touch_count)
         self.touch_count_combo.setStyleSheet(StyleSheet.COMBOBOX)
         mode2_layout.addWidget(self.touch_count_combo)
+        mode2_layout.addWidget(QLabel("Mode 2 Tracking:"))
+        self.pattern_matcher_combo = QComboBox()
+        self.pattern_matcher_combo.addItems(['Box Touches', 'Gesture Matching'])
+        self.pattern_matcher_combo.currentIndexChanged.connect(self.update_pattern_matcher)
+        self.pattern_matcher_combo.setStyleSheet(StyleSheet.COMBOBOX)
+        mode2_layout.addWidget(self.pattern_matcher_combo)
         
         mode_layout.addLayout(mode1_layout)
         mode_layout.addSpacing(10)
@@ -305,6 +371,71 @@ class HandTrackingGUI(QMainWindow):
         self.debug_checkbox.stateChanged.connect(self.toggle_debug_mode)
         advanced_layout.addRow(self.debug_checkbox)
 
+        # Preview toggle; without it frames are not mirrored or drawn on at all
+        self.preview_checkbox = QCheckBox("Show Preview")
+        self.preview_checkbox.setStyleSheet(StyleSheet.CHECKBOX)
+        self.preview_checkbox.setChecked(True)
+        self.preview_checkbox.stateChanged.connect(self.toggle_preview)
+        advanced_layout.addRow(self.preview_checkbox)
+
+        # ROI hand tracking toggle
+        self.roi_checkbox = QCheckBox("ROI Hand Tracking")
+        self.roi_checkbox.setStyleSheet(StyleSheet.CHECKBOX)
+        self.roi_checkbox.stateChanged.connect(self.toggle_roi_tracking)
+        advanced_layout.addRow(self.roi_checkbox)
+
+        # Run the hand detector every k-th frame, predicting landmarks in between
+        self.detection_interval_spinbox = QSpinBox()
+        self.detection_interval_spinbox.setRange(1, 10)
+        self.detection_interval_spinbox.setValue(1)
+        self.detection_interval_spinbox.valueChanged.connect(self.update_detection_interval)
+        advanced_layout.addRow("Detect Every k Frames:", self.detection_interval_spinbox)
+
+        self.adaptive_detection_checkbox = QCheckBox("Adaptive Detection")
+        self.adaptive_detection_checkbox.setStyleSheet(StyleSheet.CHECKBOX)
+        self.adaptive_detection_checkbox.stateChanged.connect(self.toggle_adaptive_detection)
+        advanced_layout.addRow(self.adaptive_detection_checkbox)
+
+        # How early '/beat/next' announces each predicted beat
+        self.look_ahead_spinbox = QSpinBox()
+        self.look_ahead_spinbox.setRange(0, 1000)
+        self.look_ahead_spinbox.setSingleStep(10)
+        self.look_ahead_spinbox.setSuffix(" ms")
+        self.look_ahead_spinbox.setValue(150)
+        self.look_ahead_spinbox.valueChanged.connect(self.update_look_ahead)
+        advanced_layout.addRow("Beat Look-ahead:", self.look_ahead_spinbox)
+
+        # 24 PPQN '/clock/tick' stream that follows the tempo
+        self.beat_clock_checkbox = QCheckBox("Beat Clock (24 PPQN)")
+        self.beat_clock_checkbox.setStyleSheet(StyleSheet.CHECKBOX)
+        advanced_layout.addRow(self.beat_clock_checkbox)
+
+        # Optional JSON-lines file for latency metrics (applied on Start)
+        self.metrics_file_input = QLineEdit()
+        self.metrics_file_input.setPlaceholderText("Leave empty to disable")
+        advanced_layout.addRow("Metrics File:", self.metrics_file_input)
+
+        # Optional binary session recording of landmarks and tempo (applied on Start)
+        self.record_file_input = QLineEdit()
+        self.record_file_input.setPlaceholderText("Leave empty to disable")
+        advanced_layout.addRow("Record Session:", self.record_file_input)
+
+        # Optional video of the preview with its overlays (applied on Start)
+        self.record_video_input = QLineEdit()
+        self.record_video_input.setPlaceholderText("Leave empty to disable")
+        advanced_layout.addRow("Record Video:", self.record_video_input)
+
+        # Pipelined processing toggle (applied on Start)
+        self.pipeline_checkbox = QCheckBox("Pipelined Processing")
+        self.pipeline_checkbox.setStyleSheet(StyleSheet.CHECKBOX)
+        advanced_layout.addRow(self.pipeline_checkbox)
+
+        # Hand detection worker processes, 0 runs detection in-process (applied on Start)
+        self.detection_workers_spinbox = QSpinBox()
+        self.detection_workers_spinbox.setRange(0, 8)
+        self.detection_workers_spinbox.setValue(0)
+        advanced_layout.addRow("Detection Processes:", self.detection_workers_spinbox)
+
         advanced_group.setLayout(advanced_layout)
         right_layout.addWidget(advanced_group)
         # OSC Configuration
@@ -326,6 +457,25 @@ class HandTrackingGUI(QMainWindow):
         osc_group.setLayout(osc_layout)
         right_layout.addWidget(osc_group)
 
+        # Log: everything the controller prints goes into a bounded buffer, shown here in batches
+        log_group = QGroupBox("Log")
+        log_group.setStyleSheet(StyleSheet.GROUP_BOX)
+        log_layout = QVBoxLayout()
+        self.log_level_combo = QComboBox()
+        for level, name in LEVEL_NAMES.items():
+            self.log_level_combo.addItem(name, level)
+        self.log_level_combo.setCurrentIndex(1)
+        self.log_level_combo.setStyleSheet(StyleSheet.COMBOBOX)
+        self.log_level_combo.currentIndexChanged.connect(self.rebuild_log)
+        log_layout.addWidget(self.log_level_combo)
+        self.log_area = QPlainTextEdit()
+        self.log_area.setReadOnly(True)
+        self.log_area.setMaximumBlockCount(LOG_CAPACITY)
+        self.log_area.setMaximumHeight(120)
+        log_layout.addWidget(self.log_area)
+        log_group.setLayout(log_layout)
+        right_layout.addWidget(log_group)
+
         # Control Buttons
         button_layout = QHBoxLayout()
         self.start_button = QPushButton("Start")
@@ -354,6 +504,13 @@ class HandTrackingGUI(QMainWindow):
         main_layout.addLayout(right_layout, 1)
 
         self.main_thread = None
+
+        self.log_buffer = LogBuffer(LOG_CAPACITY)
+        self.log_seq = 0
+        sys.stdout = LogStream(self.log_buffer, LOG_LEVELS, echo=sys.__stdout__)
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.refresh_log)
+        self.log_timer.start(LOG_REFRESH_MS)
     
     def populate_camera_list(self):
         self.camera_combo.clear()
@@ -371,6 +528,28 @@ class HandTrackingGUI(QMainWindow):
         if self.main_thread and self.main_thread.main_program:
             self.main_thread.main_program.set_debug_mode(state == Qt.Checked)
 
+    def toggle_preview(self, state):
+        if self.main_thread and self.main_thread.main_program:
+            self.main_thread.main_program.set_show_preview(state == Qt.Checked)
+        if state != Qt.Checked:
+            self.camera_label.clear()
+
+    def toggle_roi_tracking(self, state):
+        if self.main_thread:
+            self.main_thread.update_config('ROI_TRACKING', state == Qt.Checked)
+
+    def update_look_ahead(self, value):
+        if self.main_thread:
+            self.main_thread.update_config('BEAT_LOOK_AHEAD', value / 1000)
+
+    def update_detection_interval(self, value):
+        if self.main_thread:
+            self.main_thread.update_config('DETECTION_INTERVAL', value)
+
+    def toggle_adaptive_detection(self, state):
+        if self.main_thread:
+            self.main_thread.update_config('ADAPTIVE_DETECTION', state == Qt.Checked)
+
     def create_slider(self, name, initial_value, min_value, max_value):
         slider = QSlider(Qt.Horizontal)
         slider.setMinimum(min_value)
@@ -426,6 +605,10 @@ class HandTrackingGUI(QMainWindow):
         if self.main_thread:
             self.main_thread.update_config('TOUCH_COUNT', touch_count)
 
+    def update_pattern_matcher(self, index):
+        if self.main_thread:
+            self.main_thread.update_config('PATTERN_MATCHER', 'gesture' if index == 1 else 'boxes')
+
     def check_initial_bpm(self):
         current_value = self.initial_bpm_slider.value()
         min_bpm = self.min_bpm_slider.value()
@@ -445,13 +628,14 @@ class HandTrackingGUI(QMainWindow):
         max_bpm = self.max_bpm_slider.value()
         self.dynamic_range_bar.setRange(min_bpm, max_bpm)
 
-    def update_frame(self, frame):
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        scaled_pixmap = QPixmap.fromImage(qt_image).scaled(960, 540, Qt.KeepAspectRatio)
-        self.camera_label.setPixmap(scaled_pixmap)
+    def update_frame(self, image, pixels=None):
+        # image is already display-sized RGB and points into pixels, which the queued signal keeps alive
+        # even if its thread is gone; the pixmap takes its own copy, so the worker may reuse the buffer
+        if self.preview_checkbox.isChecked():
+            # A frame already on its way when the preview was switched off is not shown
+            self.camera_label.setPixmap(QPixmap.fromImage(image))
+        if self.main_thread:
+            self.main_thread.frame_shown()
 
     def apply_osc_settings(self):
         if self.main_thread and self.main_thread.main_program:
@@ -472,10 +656,23 @@ class HandTrackingGUI(QMainWindow):
                 'MAX_BPM': self.max_bpm_slider.value(),
                 'OSC_SERVER': self.osc_server_input.text(),
                 'OSC_PORT': int(self.osc_port_input.text()),
+                'OSC_ROUTES': OSC_ROUTES,
                 'SENSITIVITY': 2100 - (self.sensitivity_slider.value() * 200),
                 'TOUCH_COUNT': 4 if self.touch_count_combo.currentIndex() == 1 else 2,
+                'PATTERN_MATCHER': 'gesture' if self.pattern_matcher_combo.currentIndex() == 1 else 'boxes',
                 'CAMERA_INDEX': self.camera_combo.currentIndex(),
-                'DEBUG_MODE': self.debug_checkbox.isChecked()
+                'DEBUG_MODE': self.debug_checkbox.isChecked(),
+                'SHOW_PREVIEW': self.preview_checkbox.isChecked(),
+                'ROI_TRACKING': self.roi_checkbox.isChecked(),
+                'DETECTION_INTERVAL': self.detection_interval_spinbox.value(),
+                'ADAPTIVE_DETECTION': self.adaptive_detection_checkbox.isChecked(),
+                'BEAT_LOOK_AHEAD': self.look_ahead_spinbox.value() / 1000,
+                'BEAT_CLOCK': self.beat_clock_checkbox.isChecked(),
+                'PIPELINED': self.pipeline_checkbox.isChecked(),
+                'METRICS_FILE': self.metrics_file_input.text() or None,
+                'RECORD_SESSION': self.record_file_input.text() or None,
+                'RECORD_VIDEO': self.record_video_input.text() or None,
+                'DETECTION_WORKERS': self.detection_workers_spinbox.value()
             }
             self.main_thread = MainThread(config)
             self.main_thread.update_bpm.connect(self.update_bpm_display)
@@ -491,6 +688,7 @@ class HandTrackingGUI(QMainWindow):
         if self.main_thread:
             self.main_thread.stop()
             self.main_thread.wait()  # Wait for the thread to finish
+            print(f"Preview skipped {self.main_thread.frames_skipped} frame(s) while the display was busy")
             self.main_thread.deleteLater()  # Schedule the thread object for deletion
             self.main_thread = None
         self.start_button.setEnabled(True)
@@ -501,8 +699,21 @@ class HandTrackingGUI(QMainWindow):
         self.camera_label.clear()  # Clear the camera feed
         self.bpm_label.setText(f"{INITIAL_BPM} BPM")  # Reset BPM display
 
+    def refresh_log(self):
+        # Everything logged since the last refresh, at the selected level, in one append
+        records, self.log_seq = self.log_buffer.since(self.log_seq, self.log_level_combo.currentData())
+        if records:
+            self.log_area.appendPlainText('\n'.join(text for _, _, _, text in records))
+
+    def rebuild_log(self):
+        self.log_area.clear()
+        self.log_seq = 0
+        self.refresh_log()
+
     def closeEvent(self, event):
         self.stop_main_program()
+        self.log_timer.stop()
+        sys.stdout = sys.__stdout__
         super().closeEvent(event)
 
     def update_bpm_display(self, bpm):
@@ -518,6 +729,8 @@ class HandTrackingGUI(QMainWindow):
                 self.send_key('m')
             elif event.key() == Qt.Key_S:
                 self.send_key('s')
+            elif event.key() in (Qt.Key_1, Qt.Key_2, Qt.Key_3):
+                self.send_key(event.text())
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
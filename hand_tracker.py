@@ -1,14 +1,47 @@
+import time
+from collections import deque
 import cv2
+from landmark_predictor import LandmarkPredictor
 from cvzone.HandTrackingModule import HandDetector
 
 class HandTracker:
-    def __init__(self, cap_width, cap_height):
-        # Initialize the hand detector
-        self.detector = HandDetector(staticMode=False, maxHands=2, modelComplexity=1, detectionCon=0.5, minTrackCon=0.5)
+    def __init__(self, cap_width, cap_height, detector=None, roi_tracking=False, roi_max_size=480, roi_margin=0.5, redetect_interval=30,
+                 detection_interval=1, adaptive_detection=False, motion_threshold=1500):
+        # Initialize the hand detector (any object with a cvzone-style findHands can be passed in)
+        if detector is None:
+            detector = HandDetector(staticMode=False, maxHands=2, modelComplexity=1, detectionCon=0.5, minTrackCon=0.5)
+            # Crops get their own detector so MediaPipe's video tracking never mixes crop and full-frame coordinates
+            self.roi_detector = HandDetector(staticMode=False, maxHands=2, modelComplexity=1, detectionCon=0.5, minTrackCon=0.5)
+        else:
+            # An injected detector may offer its own for crops (the detection pool does). Without one,
+            # crops would share its video tracking with full frames, so ROI tracking stays off.
+            self.roi_detector = getattr(detector, 'crop_detector', None)
+        self.detector = detector
+        self.cap_width = cap_width
+        self.cap_height = cap_height
         # Define interaction boxes on the screen
         self.boxes = self._define_boxes(cap_width, cap_height)
         # Initialize debug information string
         self.debug_info = ""
+        # Hands seen on the latest processed frame, in frame coordinates
+        self.last_hands = []
+
+        # ROI tracking: detect on a downscaled crop around the previous hands, full frame when lost
+        self.roi_tracking = roi_tracking and self.roi_detector is not None
+        self.roi_max_size = roi_max_size
+        self.roi_margin = roi_margin
+        self.redetect_interval = redetect_interval
+        self.tracked_bbox = None
+        self.tracked_hand_count = 0
+        self.frames_since_full_detection = 0
+
+        # Frame skipping: run the detector every detection_interval frames and predict in between
+        self.detection_interval = detection_interval
+        self.adaptive_detection = adaptive_detection
+        self.motion_threshold = motion_threshold
+        self.predictor = LandmarkPredictor()
+        self.frames_since_detection = 0
+        self.detection_times = deque(maxlen=60)
 
     def _define_boxes(self, cap_width, cap_height):
         # Define the dimensions and positions of interaction boxes
@@ -37,9 +70,155 @@ class HandTracker:
             cv2.putText(img, box_name, (box_coords[0], box_coords[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
         return img
 
-    def process_hands(self, img, mode):
+    def set_roi_tracking(self, enabled):
+        if enabled and self.roi_detector is None:
+            print("ROI tracking needs a separate crop detector, which this detector does not provide")
+            enabled = False
+        self.roi_tracking = enabled
+        self.reset_tracking()
+
+    def reset_tracking(self):
+        self.tracked_bbox = None
+        self.tracked_hand_count = 0
+        self.frames_since_full_detection = 0
+
+    def prepare_detection(self, img, mirror=False):
+        # Return the image to run the detector on and the transform back to frame coordinates.
+        # With mirror, img is the camera frame before mirroring; hands are tracked in mirrored coordinates.
+        if (not self.roi_tracking or self.tracked_bbox is None
+                or self.frames_since_full_detection >= self.redetect_interval):
+            return img, None
+
+        x1, y1, x2, y2 = self.tracked_bbox
+        if mirror:
+            x1, x2 = img.shape[1] - x2, img.shape[1] - x1
+        margin = int(max(x2 - x1, y2 - y1) * self.roi_margin)
+        x1, y1 = max(0, x1 - margin), max(0, y1 - margin)
+        x2, y2 = min(img.shape[1], x2 + margin), min(img.shape[0], y2 + margin)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return img, None
+
+        crop = img[y1:y2, x1:x2]
+        scale = min(1.0, self.roi_max_size / max(x2 - x1, y2 - y1))
+        if scale < 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return crop, (x1, y1, scale)
+
+    def finish_detection(self, hands, transform, mirror=False, frame_width=None):
+        # Map crop detections back to frame coordinates and update the tracked region.
+        # Returns False when a tracked hand was lost inside the crop. Mirroring uses the width of the
+        # frame actually detected on, which can differ from the size the camera reported.
+        if transform is not None:
+            x_offset, y_offset, scale = transform
+            hands = [self._map_hand(hand, x_offset, y_offset, scale) for hand in hands]
+        if mirror:
+            width = frame_width if frame_width is not None else self.cap_width
+            hands = [self._mirror_hand(hand, width) for hand in hands]
+        if transform is not None:
+            if len(hands) < self.tracked_hand_count:
+                self.tracked_bbox = None
+                return hands, False
+            self.frames_since_full_detection += 1
+        else:
+            self.frames_since_full_detection = 0
+
+        if hands:
+            self.tracked_bbox = (
+                min(hand["bbox"][0] for hand in hands),
+                min(hand["bbox"][1] for hand in hands),
+                max(hand["bbox"][0] + hand["bbox"][2] for hand in hands),
+                max(hand["bbox"][1] + hand["bbox"][3] for hand in hands),
+            )
+        else:
+            self.tracked_bbox = None
+        self.tracked_hand_count = len(hands)
+        return hands, True
+
+    @staticmethod
+    def _map_hand(hand, x_offset, y_offset, scale):
+        lm_list = [[int(round(x_offset + x / scale)), int(round(y_offset + y / scale)), int(round(z / scale))]
+                   for x, y, z in hand["lmList"]]
+        x, y, w, h = hand["bbox"]
+        bbox = (int(round(x_offset + x / scale)), int(round(y_offset + y / scale)), int(round(w / scale)), int(round(h / scale)))
+        return {
+            "lmList": lm_list,
+            "bbox": bbox,
+            "center": (bbox[0] + bbox[2] // 2, bbox[1] + bbox[3] // 2),
+            "type": hand["type"]
+        }
+
+    @staticmethod
+    def _mirror_hand(hand, width):
+        # The hand as it appears on the mirrored image: x flipped and, like the picture, left and right swapped
+        lm_list = [[width - 1 - x, y, z] for x, y, z in hand["lmList"]]
+        x, y, w, h = hand["bbox"]
+        bbox = (width - 1 - (x + w), y, w, h)
+        return {
+            "lmList": lm_list,
+            "bbox": bbox,
+            "center": (bbox[0] + bbox[2] // 2, bbox[1] + bbox[3] // 2),
+            "type": {"Left": "Right", "Right": "Left"}.get(hand["type"], hand["type"])
+        }
+
+    def set_detection_interval(self, interval):
+        self.detection_interval = max(1, int(interval))
+
+    def set_adaptive_detection(self, enabled):
+        self.adaptive_detection = enabled
+
+    def should_detect(self):
+        # Decide whether this frame runs the detector or uses predicted landmarks
+        self.frames_since_detection += 1
+        if not self.detection_times or self.frames_since_detection >= self.detection_interval:
+            return True
+        if self.adaptive_detection and self.predictor.get_motion() > self.motion_threshold:
+            return True
+        return False
+
+    def observe_hands(self, hands, timestamp):
+        # Record a real detection for prediction and rate reporting
+        self.frames_since_detection = 0
+        self.detection_times.append(timestamp)
+        self.predictor.update(hands, timestamp)
+
+    def predict_hands(self, timestamp):
+        return self.predictor.predict(timestamp)
+
+    def get_detection_rate(self):
+        # Effective detector runs per second over the recent window
+        if len(self.detection_times) < 2 or self.detection_times[-1] <= self.detection_times[0]:
+            return 0.0
+        return (len(self.detection_times) - 1) / (self.detection_times[-1] - self.detection_times[0])
+
+    def detect_hands(self, img, timestamp=None, mirror=False):
+        # With mirror, img has not been mirrored and the hands are mirrored instead
+        if timestamp is None:
+            timestamp = time.time()
+        if not self.should_detect():
+            return self.predict_hands(timestamp)
+
+        detect_img, transform = self.prepare_detection(img, mirror)
+        if transform is None:
+            hands, _ = self.detector.findHands(img, draw=False)
+        else:
+            hands, _ = self.roi_detector.findHands(detect_img, draw=False)
+        hands, tracked = self.finish_detection(hands, transform, mirror, img.shape[1])
+        if not tracked:
+            # Tracking lost inside the crop, re-detect on the full frame right away
+            hands, _ = self.detector.findHands(img, draw=False)
+            hands, _ = self.finish_detection(hands, None, mirror, img.shape[1])
+        self.observe_hands(hands, timestamp)
+        return hands
+
+    def process_hands(self, img, mode, timestamp=None, mirror=False):
         # Process hand detections in the image
-        hands, img = self.detector.findHands(img, draw=False)
+        hands = self.detect_hands(img, timestamp, mirror)
+        right_hand_position, left_hand_fingers, touched_boxes = self.interpret_hands(hands, mode)
+        return img, right_hand_position, left_hand_fingers, touched_boxes
+
+    def interpret_hands(self, hands, mode):
+        # Turn detected hands into the wrist position, slider fingers and touched boxes for the mode
+        self.last_hands = hands
         right_hand_position = None
         left_hand_fingers = None
         touched_boxes = []
@@ -47,19 +226,21 @@ class HandTracker:
 
         if hands:
             for hand in hands:
-                if mode == 1:  # Original mode
+                if mode in (1, 3):  # Original mode, also tracks the wrist for beat detection
                     if hand["type"] == "Left":
                         right_hand_position = hand["lmList"][0][:2]
-                        self.debug_info += f"Mode 1 - Right hand at {right_hand_position}\n"
+                        self.debug_info += f"Mode {mode} - Right hand at {right_hand_position}\n"
                     elif hand["type"] == "Right":
                         left_hand_fingers = {
                             'index': hand["lmList"][8][:2],
                             'pinky': hand["lmList"][20][:2]
                         }
-                        self.debug_info += f"Mode 1 - Left hand fingers at {left_hand_fingers}\n"
+                        self.debug_info += f"Mode {mode} - Left hand fingers at {left_hand_fingers}\n"
                 else:  # Mode 2
                     if hand["type"] == "Left":
                         index_tip = hand["lmList"][8][:2]
+                        # The fingertip also drives the gesture matcher
+                        right_hand_position = index_tip
                         self.debug_info += f"Mode 2 - Right hand at {index_tip}\n"
                         for box_name, box_coords in self.boxes.items():
                             if self._is_inside_box(index_tip, box_coords):
@@ -72,7 +253,7 @@ class HandTracker:
                         }
                         self.debug_info += f"Mode 2 - Left hand fingers at {left_hand_fingers}\n"
 
-        return img, right_hand_position, left_hand_fingers, touched_boxes
+        return right_hand_position, left_hand_fingers, touched_boxes
 
     @staticmethod
     def _is_inside_box(point, box):
@@ -0,0 +1,52 @@
+import numpy as np
+
+class LandmarkPredictor:
+    def __init__(self, velocity_smoothing=0.5, max_prediction_time=0.25):
+        # Constant-velocity model over all 21 landmarks, kept separately for each hand type
+        self.velocity_smoothing = velocity_smoothing
+        self.max_prediction_time = max_prediction_time
+        self.tracks = {}
+
+    def reset(self):
+        self.tracks = {}
+
+    def update(self, hands, timestamp):
+        # Feed a real detection; hands that disappeared are forgotten
+        tracks = {}
+        for hand in hands:
+            positions = np.asarray(hand["lmList"], dtype=np.float64)
+            track = self.tracks.get(hand["type"])
+            velocity = np.zeros_like(positions)
+            if track is not None and timestamp > track["time"] and track["positions"].shape == positions.shape:
+                measured = (positions - track["positions"]) / (timestamp - track["time"])
+                velocity = self.velocity_smoothing * track["velocity"] + (1 - self.velocity_smoothing) * measured
+            tracks[hand["type"]] = {
+                "positions": positions,
+                "velocity": velocity,
+                "time": timestamp,
+                "bbox": hand["bbox"]
+            }
+        self.tracks = tracks
+
+    def predict(self, timestamp):
+        # Extrapolate every tracked hand to the given time
+        hands = []
+        for hand_type, track in self.tracks.items():
+            dt = min(max(timestamp - track["time"], 0.0), self.max_prediction_time)
+            positions = track["positions"] + track["velocity"] * dt
+            offset = positions[0, :2] - track["positions"][0, :2]
+            x, y, w, h = track["bbox"]
+            bbox = (int(round(x + offset[0])), int(round(y + offset[1])), w, h)
+            hands.append({
+                "lmList": np.rint(positions).astype(int).tolist(),
+                "bbox": bbox,
+                "center": (bbox[0] + w // 2, bbox[1] + h // 2),
+                "type": hand_type
+            })
+        return hands
+
+    def get_motion(self):
+        # Fastest wrist speed among tracked hands, in pixels per second
+        if not self.tracks:
+            return 0.0
+        return max(float(np.hypot(*track["velocity"][0, :2])) for track in self.tracks.values())
@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+class LatencyHistogram:
+    def __init__(self, window=1000):
+        # Rolling window of the most recent samples, in seconds
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {'count': self.count}
+        values = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)) * 1000
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {
+            'count': self.count,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'max_ms': float(values.max())
+        }
+
+    def histogram(self, bin_ms=5, max_ms=100):
+        # Counts per bin_ms bucket over the window, the last bucket also holds everything above max_ms
+        edges = np.arange(0, max_ms + bin_ms, bin_ms, dtype=np.float64)
+        values = np.minimum(np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)) * 1000, max_ms)
+        counts, _ = np.histogram(values, bins=edges)
+        return edges[:-1].tolist(), counts.tolist()
+
+class LatencyMonitor:
+    STAGES = ('capture_to_detect', 'detect_to_queue', 'queue_to_wire', 'capture_to_wire')
+
+    def __init__(self, window=1000, metrics_file=None, write_interval=1.0):
+        # Motion-to-OSC latency per stage, optionally appended to a JSON-lines metrics file
+        self.lock = threading.Lock()
+        self.histograms = {stage: LatencyHistogram(window) for stage in self.STAGES}
+        self.metrics_file = metrics_file
+        self.write_interval = write_interval
+        self.last_write_time = time.perf_counter()
+        # Sequence number of the newest frame that has reached the wire
+        self.last_sent_seq = None
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.histograms[stage].add(seconds)
+
+    def record_frame(self, capture_time, detect_time):
+        self.record('capture_to_detect', detect_time - capture_time)
+
+    def record_send(self, timing, wire_time):
+        # timing is the (seq, capture_time, detect_time, queue_time) carried by a queued OSC message
+        seq, capture_time, detect_time, queue_time = timing
+        with self.lock:
+            if seq is not None:
+                self.last_sent_seq = seq
+            if detect_time is not None:
+                self.histograms['detect_to_queue'].add(queue_time - detect_time)
+            self.histograms['queue_to_wire'].add(wire_time - queue_time)
+            if capture_time is not None:
+                self.histograms['capture_to_wire'].add(wire_time - capture_time)
+
+    def summary(self):
+        with self.lock:
+            return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def debug_lines(self):
+        lines = []
+        for stage, stats in self.summary().items():
+            if 'p50_ms' in stats:
+                lines.append(f"{stage}: p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms")
+        return lines
+
+    def maybe_write(self, extra=None):
+        # Append a summary line (plus any extra fields) to the metrics file at most once per write_interval
+        if not self.metrics_file:
+            return
+        now = time.perf_counter()
+        if now - self.last_write_time < self.write_interval:
+            return
+        self.last_write_time = now
+        record = {'time': time.time(), 'last_sent_seq': self.last_sent_seq, 'latency': self.summary()}
+        if extra:
+            record.update(extra)
+        try:
+            with open(self.metrics_file, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing metrics file: {e}")
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: 'Debug', INFO: 'Info', WARNING: 'Warning', ERROR: 'Error'}
+
+class LogBuffer:
+    def __init__(self, capacity=2000):
+        # Fixed-size ring of (sequence, time, level, text) records. Writers from any thread only
+        # append; views poll with since() on a timer and render what is new in one go.
+        self.capacity = capacity
+        self.records = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.next_seq = 0
+        self.counts = {level: 0 for level in LEVEL_NAMES}
+
+    def add(self, text, level=INFO):
+        with self.lock:
+            self.records.append((self.next_seq, time.time(), level, text))
+            self.next_seq += 1
+            self.counts[level] += 1
+
+    def add_many(self, texts, level=INFO):
+        now = time.time()
+        with self.lock:
+            for text in texts:
+                self.records.append((self.next_seq, now, level, text))
+                self.next_seq += 1
+            self.counts[level] += len(texts)
+
+    def since(self, seq, min_level=DEBUG):
+        # Records after sequence number seq at min_level or above, and the number to pass next
+        # time. Records that were overwritten before the view caught up are simply skipped.
+        with self.lock:
+            new = min(self.next_seq - seq, len(self.records))
+            records = list(islice(reversed(self.records), new)) if new > 0 else []
+            next_seq = self.next_seq
+        records.reverse()
+        if min_level > DEBUG:
+            records = [record for record in records if record[2] >= min_level]
+        return records, next_seq
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+class LogStream:
+    def __init__(self, buffer, levels=(), default_level=INFO, echo=None, echo_level=INFO):
+        # File-like object for sys.stdout: every printed line becomes a record, with its level taken
+        # from the first matching (prefix, level) in levels. Lines at echo_level and above are also
+        # written to echo (e.g. the terminal).
+        self.buffer = buffer
+        self.levels = levels
+        self.default_level = default_level
+        self.echo = echo
+        self.echo_level = echo_level
+        self.partial = {}  # thread id -> unterminated text; print() writes the text and newline separately
+        self.lock = threading.Lock()
+
+    def level_of(self, line):
+        for prefix, level in self.levels:
+            if line.startswith(prefix):
+                return level
+        return self.default_level
+
+    def write(self, text):
+        written = len(text)
+        thread_id = threading.get_ident()
+        with self.lock:
+            text = self.partial.pop(thread_id, '') + text
+            lines = text.split('\n')
+            if lines[-1]:
+                self.partial[thread_id] = lines[-1]
+        for line in lines[:-1]:
+            if not line:
+                continue
+            level = self.level_of(line)
+            self.buffer.add(line, level)
+            if self.echo is not None and level >= self.echo_level:
+                self.echo.write(line + '\n')
+        return written
+
+    def flush(self):
+        if self.echo is not None:
+            self.echo.flush()
@@ -2,34 +2,84 @@ import cv2
 import time
 from cvzone.FaceDetectionModule import FaceDetector
 from pythonosc.udp_client import SimpleUDPClient
-from bpm_calculators import HandSpeedBPMCalculator, PatternBPMCalculator
+from bpm_calculators import HandSpeedBPMCalculator, PatternBPMCalculator, BeatDetectionBPMCalculator, GestureBPMCalculator
 from hand_tracker import HandTracker
 from slider_controller import SliderController
+from frame_grabber import FrameGrabber, DirectFrameSource
+from pipeline import FramePacket, FramePipeline
+from detection_pool import ProcessPoolHandDetector, landmarks_to_hands
+from clock import SystemClock
+from latency import LatencyMonitor
+from session_recorder import SessionRecorder, VideoRecorder
+from frame_bus import FrameBus
+from beat_predictor import BeatPhasePredictor
+from beat_clock import BeatClock
+from osc_queue import OscMessageQueue, build_bundle
+from osc_transport import OscTransport
 import threading
 
 class MainProgram:
-    def __init__(self, update_bpm_callback, update_frame_callback, config):
+    def __init__(self, update_bpm_callback, update_frame_callback, config,
+                 capture=None, clock=None, osc_client_factory=None, detector=None):
+        # capture, clock, osc_client_factory and detector can be injected for headless replays
         self.update_bpm_callback = update_bpm_callback
         self.update_frame_callback = update_frame_callback
         self.config = config
         self.running = False
+        self.clock = clock if clock is not None else SystemClock()
+        if osc_client_factory is None:
+            # Extra OSC_ROUTES need the multi-destination transport, a single receiver a plain client
+            osc_client_factory = self.create_osc_transport if config.get('OSC_ROUTES') else SimpleUDPClient
+        self.osc_client_factory = osc_client_factory
 
         self.osc_lock = threading.Lock()
         self.osc_client = None
-        self.osc_message_queue = []
+        # Wakes the sender as soon as a message is queued; volumes and tempo only keep their latest value
+        self.osc_queue = OscMessageQueue(max_size=config.get('OSC_QUEUE_SIZE', 256))
+        # Capture -> detect -> queue -> wire latency, shown in debug mode
+        self.latency_monitor = LatencyMonitor(metrics_file=config.get('METRICS_FILE'))
 
         self.create_osc_client()
-        self.osc_thread = threading.Thread(target=self.send_osc_messages, daemon=True)
-        self.osc_thread.start()
-
-        self.cap = cv2.VideoCapture(config.get('CAMERA_INDEX', 0))
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        self.cap.set(cv2.CAP_PROP_FPS, 60)
+        self.osc_thread = None
+        if config.get('OSC_THREAD', True):
+            self.osc_thread = threading.Thread(target=self.send_osc_messages, daemon=True)
+            self.osc_thread.start()
+
+        if capture is None:
+            capture = cv2.VideoCapture(config.get('CAMERA_INDEX', 0))
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            capture.set(cv2.CAP_PROP_FPS, 60)
+        self.cap = capture
         cap_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         cap_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        self.hand_tracker = HandTracker(cap_width, cap_height)
+        # Camera frames are read into preallocated slots and rendered frames are drawn straight into
+        # shared slots that the preview and any other consumer read in place. Pipelined runs hold a
+        # slot per frame in flight.
+        queue_size = config.get('PIPELINE_QUEUE_SIZE', 2)
+        bus_slots = config.get('FRAME_SLOTS', 6 + 4 * queue_size if config.get('PIPELINED', False) else 4)
+        if config.get('LATEST_FRAME_ONLY', True):
+            # Capture runs on its own thread so processing always sees the newest frame
+            self.frame_grabber = FrameGrabber(self.cap, slots=bus_slots)
+        else:
+            # Every frame is processed in order, as replays need
+            self.frame_grabber = DirectFrameSource(self.cap, slots=bus_slots)
+        self.frames_dropped = 0
+        self.pipeline = None
+        self.display_bus = FrameBus(slots=bus_slots)
+
+        # Optionally run hand detection in worker processes fed through shared memory
+        self.detection_pool = None
+        if detector is None and config.get('DETECTION_WORKERS', 0) > 0:
+            self.detection_pool = ProcessPoolHandDetector((cap_height, cap_width, 3), workers=config['DETECTION_WORKERS'])
+            detector = self.detection_pool
+        self.hand_tracker = HandTracker(
+            cap_width, cap_height,
+            detector=detector,
+            roi_tracking=config.get('ROI_TRACKING', False),
+            detection_interval=config.get('DETECTION_INTERVAL', 1),
+            adaptive_detection=config.get('ADAPTIVE_DETECTION', False)
+        )
         self.hand_speed_bpm_calculator = HandSpeedBPMCalculator(
             speed_threshold=config.get('SENSITIVITY', 1000),
             still_threshold=100,
@@ -37,7 +87,8 @@ class MainProgram:
             decrease_rate=0.5,
             initial_bpm=config['INITIAL_BPM'],
             min_bpm=config['MIN_BPM'],
-            max_bpm=config['MAX_BPM']
+            max_bpm=config['MAX_BPM'],
+            clock=self.clock
         )
         self.pattern_bpm_calculator = PatternBPMCalculator(
             window_size=4,
@@ -46,6 +97,29 @@ class MainProgram:
             max_bpm=config['MAX_BPM'],
             touch_count=config.get('TOUCH_COUNT', 4)
         )
+        self.beat_bpm_calculator = BeatDetectionBPMCalculator(
+            initial_bpm=config['INITIAL_BPM'],
+            min_bpm=config['MIN_BPM'],
+            max_bpm=config['MAX_BPM'],
+            clock=self.clock
+        )
+        # Mode 2 can follow box touches or match the fingertip trajectory against conducting patterns
+        self.gesture_bpm_calculator = GestureBPMCalculator(
+            window_size=4,
+            initial_bpm=config['INITIAL_BPM'],
+            min_bpm=config['MIN_BPM'],
+            max_bpm=config['MAX_BPM'],
+            clock=self.clock
+        )
+        self.last_meter_sent = None
+        # Upcoming beats are announced ahead of time so receivers can hide our latency
+        self.beat_predictor = BeatPhasePredictor(look_ahead=config.get('BEAT_LOOK_AHEAD', 0.15))
+        self.last_beat_count = 0
+        # Optional 24 PPQN clock for receivers that need ticks rather than a tempo number
+        self.beat_clock = None
+        if config.get('BEAT_CLOCK', False):
+            self.beat_clock = BeatClock(self.send_clock_message, bpm=config['INITIAL_BPM'],
+                                        ppqn=config.get('CLOCK_PPQN', 24))
         self.face_detector = FaceDetector(minDetectionCon=0.6)
 
         self.slider1 = SliderController()
@@ -56,7 +130,7 @@ class MainProgram:
         self.bpm_send_interval = 1
         self.slider_send_interval = 0.1
 
-        self.mode = 1
+        self.mode = config.get('MODE', 1)
         self.current_bpm = config['INITIAL_BPM']
         self.start_message_sent = False
         self.hand_detected = False
@@ -65,38 +139,95 @@ class MainProgram:
         self.program_started = False
 
         self.debug_mode = config.get('DEBUG_MODE', False)
+        # Without a preview the frame is never mirrored or drawn on
+        self.show_preview = config.get('SHOW_PREVIEW', True)
+
+        # Optional per-frame landmark/tempo recording for offline tuning
+        self.session_recorder = None
+        if config.get('RECORD_SESSION'):
+            self.session_recorder = SessionRecorder(config['RECORD_SESSION'])
+        # Optional recording of the preview, overlays included, read from the display bus
+        self.video_recorder = None
+        if config.get('RECORD_VIDEO'):
+            self.video_recorder = VideoRecorder(self.display_bus, config['RECORD_VIDEO'],
+                                                fps=self.cap.get(cv2.CAP_PROP_FPS) or 30.0)
 
     def change_camera(self, index):
-        if self.cap.isOpened():
-            self.cap.release()
-        self.cap = cv2.VideoCapture(index)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        self.cap.set(cv2.CAP_PROP_FPS, 60)
+        cap = cv2.VideoCapture(index)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        cap.set(cv2.CAP_PROP_FPS, 60)
+        old_cap = self.frame_grabber.set_capture(cap)
+        self.cap = cap
+        if old_cap.isOpened():
+            old_cap.release()
 
     def set_debug_mode(self, debug_mode):
         self.debug_mode = debug_mode
 
+    def set_show_preview(self, show_preview):
+        self.show_preview = show_preview
+
     def create_osc_client(self):
         with self.osc_lock:
-            self.osc_client = SimpleUDPClient(self.config['OSC_SERVER'], self.config['OSC_PORT'])
+            old_client = self.osc_client
+            self.osc_client = self.osc_client_factory(self.config['OSC_SERVER'], self.config['OSC_PORT'])
+        if isinstance(old_client, OscTransport):
+            old_client.close()
         print(f"Created OSC client: {self.config['OSC_SERVER']}:{self.config['OSC_PORT']}")
 
-    def queue_osc_message(self, address, value):
-        with self.osc_lock:
-            self.osc_message_queue.append((address, value))
+    def create_osc_transport(self, server, port):
+        # Everything goes to the main receiver, plus whatever the routing table adds
+        routes = [{'address': '*', 'host': server, 'port': port}] + list(self.config['OSC_ROUTES'])
+        return OscTransport(routes)
+
+    def queue_osc_message(self, address, value, packet=None):
+        # Messages derived from a frame carry its timestamps so the send can be traced back to capture
+        if packet is not None:
+            timing = (packet.seq, packet.capture_time, packet.detect_time, time.perf_counter())
+        else:
+            timing = (None, None, None, time.perf_counter())
+        self.osc_queue.put(address, value, timing)
 
     def send_osc_messages(self):
-        while True:
-            with self.osc_lock:
-                if self.osc_message_queue and self.osc_client:
-                    address, value = self.osc_message_queue.pop(0)
-                    try:
-                        self.osc_client.send_message(address, value)
+        while not self.osc_queue.closed:
+            self._send_osc_batch(self.osc_queue.get_batch(timeout=1.0))
+            self.latency_monitor.maybe_write({'osc_queue': self.osc_queue.stats()})
+        # Whatever was queued right before the stop still goes out
+        self._send_osc_batch(self.osc_queue.get_batch(timeout=0))
+
+    def flush_osc_messages(self):
+        # Send everything queued right away, used when no sender thread runs
+        self._send_osc_batch(self.osc_queue.get_batch(timeout=0))
+        self.latency_monitor.maybe_write({'osc_queue': self.osc_queue.stats()})
+
+    def _send_osc_batch(self, batch, bundle_size=64):
+        # Whatever accumulated since the last send goes out as OSC bundles when the client supports it
+        if not batch:
+            return
+        with self.osc_lock:
+            if len(batch) == 1 or not self.config.get('OSC_BUNDLES', True) or not hasattr(self.osc_client, 'send'):
+                for address, value, timing in batch:
+                    self._send_osc_message(address, value, timing)
+                return
+            for start in range(0, len(batch), bundle_size):
+                chunk = batch[start:start + bundle_size]
+                try:
+                    self.osc_client.send(build_bundle(chunk))
+                    wire_time = time.perf_counter()
+                    for address, value, timing in chunk:
+                        self.latency_monitor.record_send(timing, wire_time)
                         print(f"Sent OSC message: {address} {value}")
-                    except Exception as e:
-                        print(f"Error sending OSC message: {e}")
-            time.sleep(0.01)
+                except Exception as e:
+                    print(f"Error sending OSC bundle: {e}")
+
+    def _send_osc_message(self, address, value, timing):
+        try:
+            self.osc_client.send_message(address, value)
+            self.latency_monitor.record_send(timing, time.perf_counter())
+            print(f"Sent OSC message: {address} {value}")
+        except Exception as e:
+            print(f"Error sending OSC message: {e}")
 
     def send_start_messages(self):
         self.queue_osc_message('/stop', 1)
@@ -104,11 +235,28 @@ class MainProgram:
         self.queue_osc_message('/play', 1)
         print("OSC messages queued - Play message")
         self.start_message_sent = True
+        if self.beat_clock:
+            self.beat_clock.set_tempo(self.current_bpm)
+            self.beat_clock.start()
+
+    def send_clock_message(self, address, value):
+        # Called from the beat clock thread; skips the queue so ticks leave on their deadline
+        try:
+            self.osc_client.send_message(address, value)
+        except Exception as e:
+            print(f"Error sending OSC message: {e}")
+
+    def stop_beat_clock(self):
+        if self.beat_clock and self.beat_clock.running:
+            self.beat_clock.stop()
+            print(f"Beat clock stopped: {self.beat_clock.stats()}")
 
     def reset_bpm(self):
         self.current_bpm = self.config['INITIAL_BPM']
         self.hand_speed_bpm_calculator.update_config('INITIAL_BPM', self.config['INITIAL_BPM'])
         self.pattern_bpm_calculator.update_config('INITIAL_BPM', self.config['INITIAL_BPM'])
+        self.beat_bpm_calculator.update_config('INITIAL_BPM', self.config['INITIAL_BPM'])
+        self.gesture_bpm_calculator.update_config('INITIAL_BPM', self.config['INITIAL_BPM'])
         self.queue_osc_message('/tempo/raw', int(self.config['INITIAL_BPM']))
         print(f"BPM reset to initial value: {self.config['INITIAL_BPM']}")
 
@@ -118,11 +266,28 @@ class MainProgram:
             if key in ['MIN_BPM', 'MAX_BPM', 'INITIAL_BPM']:
                 self.hand_speed_bpm_calculator.update_config(key, value)
                 self.pattern_bpm_calculator.update_config(key, value)
+                self.beat_bpm_calculator.update_config(key, value)
+                self.gesture_bpm_calculator.update_config(key, value)
             elif key == 'SENSITIVITY':
                 self.config[key] = value
                 self.hand_speed_bpm_calculator.update_config(key, value)
             elif key == 'TOUCH_COUNT':
                 self.pattern_bpm_calculator.update_config(key, value)
+        elif key == 'BEAT_LOOK_AHEAD':
+            self.config[key] = value
+            self.beat_predictor.look_ahead = value
+        elif key == 'PATTERN_MATCHER':
+            self.config[key] = value
+            print(f"Mode 2 now follows {'conducting gestures' if value == 'gesture' else 'box touches'}")
+        elif key == 'ROI_TRACKING':
+            self.config[key] = value
+            self.hand_tracker.set_roi_tracking(value)
+        elif key == 'DETECTION_INTERVAL':
+            self.config[key] = value
+            self.hand_tracker.set_detection_interval(value)
+        elif key == 'ADAPTIVE_DETECTION':
+            self.config[key] = value
+            self.hand_tracker.set_adaptive_detection(value)
         elif key in ['OSC_SERVER', 'OSC_PORT']:
             self.config[key] = value
             self.create_osc_client()  # Recreate OSC client with new settings
@@ -132,21 +297,15 @@ class MainProgram:
 
     def handle_key(self, key):
         if key == 'm':
-            self.mode = 3 - self.mode  # Switch between mode 1 and 2
-            if self.mode == 2:
-                self.pattern_bpm_calculator = PatternBPMCalculator(
-                    window_size=4,
-                    initial_bpm=self.current_bpm,
-                    min_bpm=self.config['MIN_BPM'],
-                    max_bpm=self.config['MAX_BPM'],
-                    touch_count=self.config.get('TOUCH_COUNT', 4)
-                )
-            # We don't reset start_message_sent, hand_detected, or mode2_touch_sequence here anymore
-            print(f"Switched to Mode {self.mode}")
+            self.set_mode(self.mode % 3 + 1)  # Cycle through modes 1, 2 and 3
+        elif key in ('1', '2', '3'):
+            self.set_mode(int(key))
         elif key == 's':
             self.queue_osc_message('/stop', 1)
             self.queue_osc_message('/time', '0:00.000')
             self.reset_bpm()
+            self.beat_predictor.reset()
+            self.stop_beat_clock()
             self.start_message_sent = False
             self.hand_detected = False
             self.mode2_touch_sequence = []
@@ -154,100 +313,376 @@ class MainProgram:
             print("OSC messages queued - Stop and Time messages, BPM reset")
 
 
-    def run(self):
-        self.running = True
-        while self.running:
-            success, img = self.cap.read()
-            if not success:
-                print("Failed to grab frame")
+    def set_mode(self, mode):
+        self.mode = mode
+        if self.mode == 2:
+            self.pattern_bpm_calculator = PatternBPMCalculator(
+                window_size=4,
+                initial_bpm=self.current_bpm,
+                min_bpm=self.config['MIN_BPM'],
+                max_bpm=self.config['MAX_BPM'],
+                touch_count=self.config.get('TOUCH_COUNT', 4)
+            )
+            self.gesture_bpm_calculator = GestureBPMCalculator(
+                window_size=4,
+                initial_bpm=self.current_bpm,
+                min_bpm=self.config['MIN_BPM'],
+                max_bpm=self.config['MAX_BPM'],
+                clock=self.clock
+            )
+            self.last_meter_sent = None
+        elif self.mode == 3:
+            self.beat_bpm_calculator = BeatDetectionBPMCalculator(
+                initial_bpm=self.current_bpm,
+                min_bpm=self.config['MIN_BPM'],
+                max_bpm=self.config['MAX_BPM'],
+                clock=self.clock
+            )
+            self.last_beat_count = 0
+        # We don't reset start_message_sent, hand_detected, or mode2_touch_sequence here anymore
+        print(f"Switched to Mode {self.mode}")
+
+    def read_frame(self):
+        while True:
+            success, ref, dropped = self.frame_grabber.read()
+            if success:
                 break
-
-            img = cv2.flip(img, 1)
-
-            if self.mode == 2:
-                next_expected = self.pattern_bpm_calculator.get_next_expected()
-                img = self.hand_tracker.draw_boxes(img, next_expected)
-
-            img, right_hand_position, left_hand_fingers, touched_boxes = self.hand_tracker.process_hands(img, self.mode)
-
-            if not self.program_started:
-                if self.mode == 1:
-                    if right_hand_position is not None or left_hand_fingers is not None:
-                        self.hand_detected = True
+            if self.frame_grabber.failed or not self.frame_grabber.running or not self.running:
+                return False, None
+            # No frame within the read timeout: the camera is slow or stalled, not gone, so keep waiting
+        if dropped:
+            self.frames_dropped += dropped
+            if self.debug_mode:
+                print(f"Dropped {dropped} stale frame(s), {self.frames_dropped} total")
+        packet = FramePacket(self.frame_grabber.last_read_seq, ref.frame, dropped)
+        packet.capture_ref = ref
+        packet.timestamp = self.clock.time()
+        packet.capture_time = self.frame_grabber.last_read_time
+        return True, packet
+
+    def prepare_frame(self, packet):
+        packet.mode = self.mode
+        # Someone has to see the frame for mirroring and overlays to be worth doing; otherwise
+        # detection runs on the camera frame as is and only the landmarks are mirrored
+        packet.mirrored = self.show_preview or self.video_recorder is not None
+        if not packet.mirrored:
+            return packet
+        # Mirror into a free display bus slot; if every slot is still held, fall back to a new image
+        packet.display_ref = self.display_bus.acquire_write(packet.img.shape, packet.img.dtype)
+        if packet.display_ref is not None:
+            packet.img = cv2.flip(packet.img, 1, dst=packet.display_ref.frame)
+        else:
+            packet.img = cv2.flip(packet.img, 1)
+        self.release_capture(packet)
+
+        if packet.mode == 2 and not self.uses_gesture_matcher():
+            next_expected = self.pattern_bpm_calculator.get_next_expected()
+            packet.img = self.hand_tracker.draw_boxes(packet.img, next_expected)
+        return packet
+
+    def release_capture(self, packet):
+        if packet.capture_ref is not None:
+            packet.capture_ref.release()
+            packet.capture_ref = None
+
+    def release_packet(self, packet):
+        # Lets go of every frame slot a packet still holds, e.g. when a stage failed on it
+        self.release_capture(packet)
+        if packet.display_ref is not None:
+            packet.display_ref.release()
+            packet.display_ref = None
+
+    def uses_gesture_matcher(self):
+        return self.config.get('PATTERN_MATCHER', 'boxes') == 'gesture'
+
+    def detect_frame(self, packet):
+        self.prepare_frame(packet)
+        packet.img, packet.right_hand_position, packet.left_hand_fingers, packet.touched_boxes = \
+            self.hand_tracker.process_hands(packet.img, packet.mode, packet.timestamp, mirror=not packet.mirrored)
+        packet.debug_info = self.hand_tracker.debug_info
+        self.mark_detected(packet)
+        return packet
+
+    def mark_detected(self, packet):
+        packet.detect_time = time.perf_counter()
+        if packet.capture_time is not None:
+            self.latency_monitor.record_frame(packet.capture_time, packet.detect_time)
+
+    def submit_frame(self, packet):
+        # Hand the frame to the detection pool without waiting for the result
+        self.prepare_frame(packet)
+        packet.detect_skipped = not self.hand_tracker.should_detect()
+        if not packet.detect_skipped:
+            detect_img, packet.detect_transform = self.hand_tracker.prepare_detection(packet.img, not packet.mirrored)
+            self.detection_pool.submit(detect_img, packet.seq, timeout=1.0, crop=packet.detect_transform is not None)
+        return packet
+
+    def collect_detections(self, packet):
+        # Asking for this packet's seq skips results of frames that were never collected (e.g. after
+        # a timeout), so the hands always belong to this frame
+        if packet.detect_skipped:
+            hands = self.hand_tracker.predict_hands(packet.timestamp)
+        else:
+            seq, landmarks, types, bboxes = self.detection_pool.get_result(timeout=1.0, seq=packet.seq)
+            hands = landmarks_to_hands(landmarks, types, bboxes)
+            # A lost track is picked up by a full-frame detection on the next submitted frame
+            hands, _ = self.hand_tracker.finish_detection(hands, packet.detect_transform, not packet.mirrored,
+                                                          packet.img.shape[1])
+            self.hand_tracker.observe_hands(hands, packet.timestamp)
+        packet.right_hand_position, packet.left_hand_fingers, packet.touched_boxes = \
+            self.hand_tracker.interpret_hands(hands, packet.mode)
+        packet.debug_info = self.hand_tracker.debug_info
+        self.mark_detected(packet)
+        return packet
+
+    def update_tempo(self, packet):
+        right_hand_position = packet.right_hand_position
+        left_hand_fingers = packet.left_hand_fingers
+        touched_boxes = packet.touched_boxes
+
+        if not self.program_started:
+            if packet.mode in (1, 3):
+                if right_hand_position is not None or left_hand_fingers is not None:
+                    self.hand_detected = True
+                    self.send_start_messages()
+                    self.program_started = True
+            elif self.uses_gesture_matcher():
+                # Start once the first beat of a recognised pattern has been given
+                if self.track_gesture(packet):
+                    self.send_start_messages()
+                    self.program_started = True
+            else:  # Mode 2
+                if touched_boxes:
+                    for box_name, _ in touched_boxes:
+                        if box_name not in self.mode2_touch_sequence:
+                            self.mode2_touch_sequence.append(box_name)
+                    
+                    if len(self.mode2_touch_sequence) == 4 and self.mode2_touch_sequence == self.expected_sequence:
                         self.send_start_messages()
                         self.program_started = True
-                else:  # Mode 2
-                    if touched_boxes:
-                        for box_name, _ in touched_boxes:
-                            if box_name not in self.mode2_touch_sequence:
-                                self.mode2_touch_sequence.append(box_name)
-                        
-                        if len(self.mode2_touch_sequence) == 4 and self.mode2_touch_sequence == self.expected_sequence:
-                            self.send_start_messages()
-                            self.program_started = True
-                            self.mode2_touch_sequence = []
-            else:
-                # Program has started, handle mode-specific logic
-                if self.mode == 1:
-                    self.current_bpm = self.hand_speed_bpm_calculator.update_bpm(right_hand_position)
-                else:  # Mode 2
-                    current_time = time.time()
-                    for box_name, hand_type in touched_boxes:
-                        if self.pattern_bpm_calculator.add_touch(current_time, box_name):
-                            print(f"{hand_type} hand's index finger reached {box_name} box")
-                    self.current_bpm = self.pattern_bpm_calculator.get_bpm()
-
-            current_time = time.time()
-
-            if self.mode == 1:
+                        self.mode2_touch_sequence = []
+        else:
+            # Program has started, handle mode-specific logic
+            if packet.mode == 1:
                 self.current_bpm = self.hand_speed_bpm_calculator.update_bpm(right_hand_position)
-            else:
+            elif packet.mode == 3:
+                # The beat detector is fed once per frame below, before and after the start
+                pass
+            elif self.uses_gesture_matcher():
+                # The matcher keeps time from its own clock, so it sees each fingertip only once
+                self.track_gesture(packet)
+            else:  # Mode 2
+                current_time = self.clock.time()
                 for box_name, hand_type in touched_boxes:
                     if self.pattern_bpm_calculator.add_touch(current_time, box_name):
                         print(f"{hand_type} hand's index finger reached {box_name} box")
                 self.current_bpm = self.pattern_bpm_calculator.get_bpm()
 
-            if left_hand_fingers:
-                self.slider1.update(left_hand_fingers['index'][1] if 'index' in left_hand_fingers else None, img.shape[0])
-                self.slider2.update(left_hand_fingers['pinky'][1] if 'pinky' in left_hand_fingers else None, img.shape[0])
-
-            self.slider1.draw(img, 50, (0, 255, 0))  # Green for slider1
-            self.slider2.draw(img, img.shape[1] - 80, (255, 0, 0))  # Blue for slider2
-
-            if current_time - self.last_bpm_send_time >= self.bpm_send_interval:
-                rounded_bpm = round(self.current_bpm, 0)
-                self.queue_osc_message('/tempo/raw', int(rounded_bpm))
-                self.last_bpm_send_time = current_time
-                print(f"OSC queued - BPM: {rounded_bpm}")
-
-            if current_time - self.last_slider_send_time >= self.slider_send_interval:
-                self.queue_osc_message('/track/1/volume', self.slider1.value)
-                self.queue_osc_message('/track/2/volume', self.slider2.value)
-                self.last_slider_send_time = current_time
-                print(f"OSC queued - Track 1 Volume: {self.slider1.value:.2f}, Track 2 Volume: {self.slider2.value:.2f}")
-
-            if self.debug_mode:
-                cv2.putText(img, f"BPM: {self.current_bpm:.1f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                cv2.putText(img, f"Mode: {self.mode}", (10, 110), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
-
-                debug_lines = self.hand_tracker.debug_info.split('\n')
-                for i, line in enumerate(debug_lines):
-                    cv2.putText(img, line, (10, 150 + 30*i), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        current_time = self.clock.time()
 
-            #if self.debug_mode:
-            #    img, _ = self.face_detector.findFaces(img, draw=True)
-            #else:
-            #    img, _ = self.face_detector.findFaces(img, draw=False)
+        if packet.mode == 1:
+            self.current_bpm = self.hand_speed_bpm_calculator.update_bpm(right_hand_position)
+        elif packet.mode == 3:
+            self.current_bpm = self.beat_bpm_calculator.update_bpm(right_hand_position)
+        elif self.uses_gesture_matcher():
+            self.current_bpm = self.gesture_bpm_calculator.get_bpm()
+        else:
+            for box_name, hand_type in touched_boxes:
+                if self.pattern_bpm_calculator.add_touch(current_time, box_name):
+                    print(f"{hand_type} hand's index finger reached {box_name} box")
+            self.current_bpm = self.pattern_bpm_calculator.get_bpm()
+
+        if self.program_started:
+            self.predict_beats(packet, current_time)
+            if self.beat_clock:
+                self.beat_clock.set_tempo(self.current_bpm)
+
+        if left_hand_fingers:
+            self.slider1.update(left_hand_fingers['index'][1] if 'index' in left_hand_fingers else None, packet.img.shape[0])
+            self.slider2.update(left_hand_fingers['pinky'][1] if 'pinky' in left_hand_fingers else None, packet.img.shape[0])
+
+        if current_time - self.last_bpm_send_time >= self.bpm_send_interval:
+            rounded_bpm = round(self.current_bpm, 0)
+            self.queue_osc_message('/tempo/raw', int(rounded_bpm), packet)
+            self.last_bpm_send_time = current_time
+            print(f"OSC queued - BPM: {rounded_bpm}")
+
+        if current_time - self.last_slider_send_time >= self.slider_send_interval:
+            self.queue_osc_message('/track/1/volume', self.slider1.value, packet)
+            self.queue_osc_message('/track/2/volume', self.slider2.value, packet)
+            self.last_slider_send_time = current_time
+            print(f"OSC queued - Track 1 Volume: {self.slider1.value:.2f}, Track 2 Volume: {self.slider2.value:.2f}")
+
+        packet.bpm = self.current_bpm
+        if self.session_recorder:
+            self.session_recorder.record(packet.seq, packet.timestamp, packet.mode, self.hand_tracker.last_hands,
+                                         touched_boxes, self.current_bpm, self.slider1.value, self.slider2.value)
+        return packet
+
+    def track_gesture(self, packet):
+        # Feed the fingertip to the gesture matcher and announce the beats and meter it recognises
+        beats = self.gesture_bpm_calculator.add_position(packet.right_hand_position)
+        meter = self.gesture_bpm_calculator.meter
+        if meter is not None and meter != self.last_meter_sent:
+            self.queue_osc_message('/meter', meter, packet)
+            self.last_meter_sent = meter
+        for beat, beat_time in beats:
+            self.queue_osc_message('/beat', beat + 1, packet)
+            self.beat_predictor.observe_beat(beat_time)
+        return beats
+
+    def predict_beats(self, packet, current_time):
+        # Send '/beat/next' [beat number, seconds until the beat, predicted BPM] look_ahead before each beat
+        if packet.mode == 3 and self.beat_bpm_calculator.beat_count != self.last_beat_count:
+            self.last_beat_count = self.beat_bpm_calculator.beat_count
+            self.beat_predictor.observe_beat(self.beat_bpm_calculator.beat_times[-1])
+        self.beat_predictor.observe_tempo(current_time, self.current_bpm)
+        for beat_number, beat_time, bpm in self.beat_predictor.poll(current_time):
+            self.queue_osc_message('/beat/next', [beat_number, beat_time - current_time, round(bpm, 2)], packet)
+
+    def render_frame(self, packet):
+        if not packet.mirrored:
+            # Preview off: nothing to draw or show
+            self.release_capture(packet)
+            self.update_bpm_callback(packet.bpm)
+            return packet
+        img = packet.img
+        self.slider1.draw(img, 50, (0, 255, 0))  # Green for slider1
+        self.slider2.draw(img, img.shape[1] - 80, (255, 0, 0))  # Blue for slider2
+
+        if self.debug_mode:
+            cv2.putText(img, f"BPM: {packet.bpm:.1f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            cv2.putText(img, f"Mode: {packet.mode}  Dropped: {self.frames_dropped}  Detect: {self.hand_tracker.get_detection_rate():.0f}/s",
+                        (10, 110), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+
+            debug_lines = self.latency_monitor.debug_lines() + packet.debug_info.split('\n')
+            osc_stats = self.osc_queue.stats()
+            debug_lines.insert(0, f"osc: backlog {osc_stats['backlog']}, coalesced {osc_stats['coalesced']}, dropped {osc_stats['dropped']}")
+            if self.beat_clock and self.beat_clock.running:
+                clock_stats = self.beat_clock.stats()
+                if 'p99_jitter_ms' in clock_stats:
+                    debug_lines.insert(0, f"clock: {clock_stats['bpm']:.1f} BPM, jitter p99 {clock_stats['p99_jitter_ms']:.2f} ms")
+            if self.pipeline:
+                depths = self.pipeline.get_queue_depths()
+                times = self.pipeline.get_stage_times()
+                debug_lines = [f"{name}: queue {depths[name]}, {times[name] * 1000:.1f} ms" for name in depths] + debug_lines
+            for i, line in enumerate(debug_lines):
+                cv2.putText(img, line, (10, 150 + 30*i), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+        #if self.debug_mode:
+        #    img, _ = self.face_detector.findFaces(img, draw=True)
+        #else:
+        #    img, _ = self.face_detector.findFaces(img, draw=False)
+
+        ref = packet.display_ref
+        if ref is not None:
+            if img is not ref.frame:
+                ref.frame[...] = img
+            self.display_bus.publish(ref, packet.capture_time)
+        self.update_frame_callback(img)
+        self.update_bpm_callback(packet.bpm)
+        if ref is not None:
+            ref.release()
+            packet.display_ref = None
+        return packet
+
+    def get_queue_depths(self):
+        # Per-stage input queue depths, empty when running sequentially
+        if self.pipeline:
+            return self.pipeline.get_queue_depths()
+        return {}
 
-            self.update_frame_callback(img)
-            self.update_bpm_callback(self.current_bpm)
+    def run(self):
+        self.running = True
+        self.frame_grabber.start()
+        try:
+            if self.config.get('PIPELINED', False):
+                self.run_pipelined()
+                return
+
+            while self.running:
+                success, packet = self.read_frame()
+                if not success:
+                    if self.running:
+                        print("Failed to grab frame")
+                    break
+                self.process_frame(packet)
+        finally:
+            # The run is over: let the sender thread finish its last batch, send what the last frames
+            # queued after it and shut the transport down, since the GUI never calls release_resources
+            self.osc_queue.close()
+            if self.osc_thread:
+                self.osc_thread.join(timeout=1.0)
+            self.flush_osc_messages()
+            self.close_osc_client()
+            self.close_detection_pool()
+            self.close_session_recorder()
+
+    def close_session_recorder(self):
+        if self.session_recorder:
+            self.session_recorder.close()
+            self.session_recorder = None
+        if self.video_recorder:
+            self.video_recorder.close()
+            self.video_recorder = None
+
+    def process_frame(self, packet):
+        try:
+            self.detect_frame(packet)
+            self.update_tempo(packet)
+            self.render_frame(packet)
+        finally:
+            # A frame that failed before it was rendered must not keep its slots
+            self.release_packet(packet)
+        return packet
+
+    def close_osc_client(self):
+        # A plain UDP client has nothing to close; a transport stops its loop thread and sockets
+        if isinstance(self.osc_client, OscTransport):
+            self.osc_client.close()
+
+    def close_detection_pool(self):
+        if self.detection_pool:
+            self.detection_pool.close()
+            self.detection_pool = None
+
+    def run_pipelined(self):
+        # Each stage runs on its own worker, so frame N+1 is detected while frame N is rendered
+        if self.detection_pool:
+            # Several frames can be in detection at once, one per worker process
+            detect_stages = [('detect', self.submit_frame), ('collect', self.collect_detections)]
+        else:
+            detect_stages = [('detect', self.detect_frame)]
+        self.pipeline = FramePipeline(
+            self.read_frame,
+            detect_stages + [('tempo', self.update_tempo), ('render', self.render_frame)],
+            queue_size=self.config.get('PIPELINE_QUEUE_SIZE', 2),
+            on_drop=self.release_packet
+        )
+        self.pipeline.start()
+        self.pipeline.wait(lambda: self.running)
+        if self.pipeline.failed:
+            print("Failed to grab frame")
+        self.pipeline.stop()
 
     def stop(self):
         self.running = False
+        self.frame_grabber.stop()
+        self.stop_beat_clock()
+        self.osc_queue.close()
         if self.cap.isOpened():
             self.cap.release()
     
     def release_resources(self):
+        self.frame_grabber.stop()
+        self.stop_beat_clock()
+        self.osc_queue.close()
+        if self.osc_thread:
+            self.osc_thread.join(timeout=1.0)
+        self.flush_osc_messages()
+        self.close_osc_client()
+        self.close_detection_pool()
+        self.close_session_recorder()
         if self.cap.isOpened():
             self.cap.release()  # Release the camera
 
@@ -0,0 +1,94 @@
+import time
+
+# Controllers that are never merged: bank select, data entry and (N)RPN selection only make sense
+# in sequence, and the pedals and channel mode messages are switches
+PASSTHROUGH_CONTROLLERS = (0, 6, 32, 38, 64, 65, 66, 67, 68, 69, 96, 97, 98, 99, 100, 101) + tuple(range(120, 128))
+
+MESSAGE_CLASSES = ('note', 'cc', 'bend', 'pressure', 'realtime', 'other')
+
+class MidiFilter:
+    def __init__(self, window=0.01, drop_realtime=True, coalesce=('cc', 'bend', 'pressure'),
+                 passthrough_controllers=PASSTHROUGH_CONTROLLERS):
+        # Sits between MIDI ingest and OSC sending. Realtime bytes (clock, active sensing, ...) are
+        # dropped; CC, pitch bend and pressure are held for up to window seconds per controller and
+        # only the last value is sent. Notes and everything else pass straight through, after any
+        # value still held for their channel so the order within a channel is kept.
+        self.window = window
+        self.drop_realtime = drop_realtime
+        self.coalesce = coalesce
+        self.passthrough_controllers = set(passthrough_controllers)
+        self.pending = {}  # key -> [deadline, message], in the order keys were first held
+        self.counts = {name: {'in': 0, 'out': 0, 'merged': 0, 'dropped': 0} for name in MESSAGE_CLASSES}
+
+    def classify(self, message):
+        status = message[0]
+        if status >= 0xF8:
+            return 'realtime', None
+        kind = status & 0xF0
+        if kind in (0x80, 0x90):
+            return 'note', None
+        if kind == 0xB0 and len(message) > 1:
+            if message[1] in self.passthrough_controllers:
+                return 'cc', None
+            return 'cc', (status, message[1])
+        if kind == 0xE0:
+            return 'bend', (status,)
+        if kind == 0xD0:
+            return 'pressure', (status,)
+        if kind == 0xA0 and len(message) > 1:
+            return 'pressure', (status, message[1])
+        return 'other', None
+
+    def process(self, messages, now=None):
+        # The messages to send now, in order: the batch after filtering, then held values that are due
+        if now is None:
+            now = time.perf_counter()
+        out = []
+        for message in messages:
+            name, key = self.classify(message)
+            counts = self.counts[name]
+            counts['in'] += 1
+            if name == 'realtime' and self.drop_realtime:
+                counts['dropped'] += 1
+                continue
+            if key is not None and name in self.coalesce:
+                held = self.pending.get(key)
+                if held is not None:
+                    held[1] = message
+                    counts['merged'] += 1
+                else:
+                    self.pending[key] = [now + self.window, message]
+                continue
+            if self.pending and message[0] < 0xF0:
+                self._release_channel(message[0] & 0x0F, out)
+            counts['out'] += 1
+            out.append(message)
+        self._release_due(now, out)
+        return out
+
+    def flush(self):
+        # Everything still held, e.g. when stopping
+        out = []
+        self._release_due(float('inf'), out)
+        return out
+
+    def next_deadline(self):
+        if not self.pending:
+            return None
+        return min(deadline for deadline, _ in self.pending.values())
+
+    def _release_channel(self, channel, out):
+        for key in [key for key in self.pending if key[0] & 0x0F == channel]:
+            self._release(key, out)
+
+    def _release_due(self, now, out):
+        for key in [key for key, (deadline, _) in self.pending.items() if deadline <= now]:
+            self._release(key, out)
+
+    def _release(self, key, out):
+        message = self.pending.pop(key)[1]
+        self.counts[self.classify(message)[0]]['out'] += 1
+        out.append(message)
+
+    def stats(self):
+        return {name: dict(counts) for name, counts in self.counts.items() if counts['in']}
@@ -0,0 +1,154 @@
+import socket
+import threading
+import time
+from collections import deque
+
+from pythonosc.osc_message_builder import OscMessageBuilder
+
+from midi_mapping import MidiOscMapper, DEFAULT_MAPPING
+
+# OSC bundle header with the "immediately" time tag
+BUNDLE_HEADER = b'#bundle\x00' + (1).to_bytes(8, 'big')
+
+def midi_to_osc(message):
+    # '/midi/<channel>' with the status type and the data bytes, built with OscMessageBuilder.
+    # MidiOscMapper produces the same bytes from precompiled templates; this is kept as the reference.
+    status_byte = message[0]
+    builder = OscMessageBuilder(address=f"/midi/{(status_byte & 0x0F) + 1}")
+    builder.add_arg(status_byte & 0xF0)
+    for data_byte in message[1:]:
+        builder.add_arg(data_byte)
+    return builder.build().dgram
+
+class OscSender:
+    def __init__(self, server, port, bundles=True, max_bundle_bytes=8192, send_timeout=0.05):
+        # Sends encoded OSC messages; a batch goes out as bundles that stay well under the UDP limit.
+        # The server name is resolved once here (socket.gaierror if it cannot be). Sends block for up
+        # to send_timeout while the socket buffer is full rather than dropping note offs in a dense passage.
+        self.destination = socket.getaddrinfo(server, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+        self.bundles = bundles
+        self.max_bundle_bytes = max_bundle_bytes
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(send_timeout)
+        self.datagrams = 0
+        self.errors = 0
+
+    def send_batch(self, dgrams):
+        if not self.bundles or len(dgrams) == 1:
+            for dgram in dgrams:
+                self._send(dgram)
+            return
+        parts = [BUNDLE_HEADER]
+        size = len(BUNDLE_HEADER)
+        for dgram in dgrams:
+            if size + len(dgram) + 4 > self.max_bundle_bytes and len(parts) > 1:
+                self._send(b''.join(parts))
+                parts = [BUNDLE_HEADER]
+                size = len(BUNDLE_HEADER)
+            parts.append(len(dgram).to_bytes(4, 'big'))
+            parts.append(dgram)
+            size += len(dgram) + 4
+        self._send(b''.join(parts))
+
+    def _send(self, dgram):
+        try:
+            self.sock.sendto(dgram, self.destination)
+            self.datagrams += 1
+        except OSError:
+            # Receiver gone, or the buffer stayed full for the whole timeout; MIDI keeps flowing
+            self.errors += 1
+
+    def close(self):
+        self.sock.close()
+
+class MidiIngest:
+    def __init__(self, sender, on_batch=None, idle_timeout=0.5, mapping=DEFAULT_MAPPING, midi_filter=None):
+        # Receives MIDI through rtmidi's callback and forwards it as OSC from a drain loop.
+        # The callback (rtmidi's own thread) only appends to a deque and sets an event: deque
+        # appends and pops are atomic, so neither side ever takes a lock.
+        self.sender = sender
+        self.on_batch = on_batch  # Called with the MIDI messages of each forwarded batch, e.g. for logging
+        self.idle_timeout = idle_timeout
+        self.mapper = MidiOscMapper(mapping)
+        self.filter = midi_filter  # Optional MidiFilter applied before sending
+        self.events = deque()
+        self.wakeup = threading.Event()
+        self.running = True
+        self.received = 0
+        self.batches = 0
+        self.max_batch = 0
+
+    def attach(self, midi_in):
+        midi_in.set_callback(self.callback)
+
+    def callback(self, event, data=None):
+        self.events.append(event)
+        self.wakeup.set()
+
+    def run(self):
+        while self.running:
+            timeout = self.idle_timeout
+            if self.filter is not None:
+                # Wake up in time to send values the filter is holding back
+                deadline = self.filter.next_deadline()
+                if deadline is not None:
+                    timeout = min(timeout, max(deadline - time.perf_counter(), 0.0))
+            self.wakeup.wait(timeout)
+            # Cleared before draining: anything arriving from here on sets it again
+            self.wakeup.clear()
+            self.drain()
+        self.drain(flush=True)
+
+    def drain(self, flush=False):
+        messages = []
+        while True:
+            try:
+                message = self.events.popleft()[0]
+            except IndexError:
+                break
+            if message:
+                messages.append(message)
+        self.received += len(messages)
+        self.max_batch = max(self.max_batch, len(messages))
+        if self.filter is not None:
+            messages = self.filter.process(messages)
+            if flush:
+                messages.extend(self.filter.flush())
+        if not messages:
+            return
+        encode = self.mapper.encode
+        dgrams = [dgram for dgram in (encode(message) for message in messages) if dgram is not None]
+        if dgrams:
+            self.sender.send_batch(dgrams)
+        self.batches += 1
+        if self.on_batch:
+            self.on_batch(messages)
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+class PollingMidiIngest:
+    def __init__(self, midi_in, sender, on_batch=None, poll_interval=0.001):
+        # The previous ingest loop: polls get_message() and sleeps in between. Kept for comparison
+        # in benchmark.py.
+        self.midi_in = midi_in
+        self.sender = sender
+        self.on_batch = on_batch
+        self.poll_interval = poll_interval
+        self.running = True
+        self.received = 0
+
+    def run(self):
+        while self.running:
+            msg = self.midi_in.get_message()
+            if msg and msg[0]:
+                message, delta = msg
+                self.sender.send_batch([midi_to_osc(message)])
+                self.received += 1
+                if self.on_batch:
+                    self.on_batch([message])
+            time.sleep(self.poll_interval)
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,128 @@
+import struct
+
+# Mapping rules, first match wins. Each rule may restrict 'status' (0x80-0xE0 channel message type,
+# or a full 0xF0-0xFF system status), 'channel' (1-16) and 'controller' (first data byte: CC number
+# or note), and gives the OSC 'address' ({channel} and {controller} are filled in) and 'args', taken from:
+#   'type'     status byte without the channel (0x90 for any Note On)
+#   'status'   the full status byte
+#   'channel'  1-16 (for system messages, the low nibble + 1)
+#   'data1', 'data2'  one data byte
+#   'data'     all data bytes
+#   'value'    the last data byte (CC value, velocity, pressure)
+#   'bend'     14-bit pitch bend value, 0-16383
+# Messages no rule matches are not sent. For example, to send the mod wheel of every channel to a
+# dedicated address ahead of the generic rule:
+#   {'status': 0xB0, 'controller': 1, 'address': '/midi/{channel}/mod', 'args': ['value']},
+DEFAULT_MAPPING = [
+    # '/midi/<channel>' with the status type and the data bytes, as DirSim Port has always sent it
+    {'address': '/midi/{channel}', 'args': ['type', 'data']}
+]
+
+def osc_string(text):
+    # OSC strings are null terminated and padded to a multiple of 4 bytes
+    data = text.encode('utf-8')
+    return data + b'\x00' * (4 - len(data) % 4)
+
+class OscTemplate:
+    def __init__(self, address, args):
+        # One compiled message layout: address, type tags and every constant argument are encoded
+        # up front; only the arguments taken from the MIDI bytes are packed per message.
+        # args is a list of ('const', value), ('index', i) or ('bend',).
+        self.address = address
+        self.args = args
+        head = []
+        while len(head) < len(args) and args[len(head)][0] == 'const':
+            head.append(args[len(head)][1])
+        self.prefix = osc_string(address) + osc_string(',' + 'i' * len(args)) + \
+            b''.join(struct.pack('>i', value) for value in head)
+        rest = args[len(head):]
+        indices = [arg[1] if arg[0] == 'index' else None for arg in rest]
+        # Common case: the rest are the trailing MIDI bytes in order, packed straight from a slice
+        self.tail = indices[0] if indices and None not in indices and \
+            indices == list(range(indices[0], indices[0] + len(indices))) else None
+        self.tail_struct = struct.Struct('>' + 'i' * len(rest))
+        self.rest = rest
+
+    def encode(self, message):
+        if self.tail is not None:
+            return self.prefix + self.tail_struct.pack(*message[self.tail:self.tail + len(self.rest)])
+        if not self.rest:
+            return self.prefix
+        values = []
+        for arg in self.rest:
+            if arg[0] == 'const':
+                values.append(arg[1])
+            elif arg[0] == 'index':
+                values.append(message[arg[1]])
+            else:
+                values.append(message[1] | (message[2] << 7))
+        return self.prefix + self.tail_struct.pack(*values)
+
+class MidiOscMapper:
+    def __init__(self, mapping=DEFAULT_MAPPING):
+        # Compiles the mapping into a table keyed by (status byte, message length). An entry is an
+        # OscTemplate, None (not sent) or, where the rule depends on the first data byte, a list
+        # of 128 of them indexed by it.
+        self.rules = mapping
+        self.templates = {}
+        self.table = {}
+        for status in range(0x80, 0x100):
+            for length in (1, 2, 3):
+                self.table[(status, length)] = self._compile(status, length)
+
+    def encode(self, message):
+        # The OSC datagram for a MIDI message, or None if no rule maps it
+        entry = self.table.get((message[0], len(message)), False)
+        if entry is False:
+            # Longer messages (SysEx) are compiled the first time they are seen
+            entry = self.table[(message[0], len(message))] = self._compile(message[0], len(message))
+        if entry.__class__ is list:
+            entry = entry[message[1] & 0x7F]
+        if entry is None:
+            return None
+        return entry.encode(message)
+
+    def _compile(self, status, length):
+        if length < 2:
+            return self._template(status, length, None)
+        entries = [self._template(status, length, controller) for controller in range(128)]
+        if all(entry is entries[0] for entry in entries):
+            return entries[0]
+        return entries
+
+    def _template(self, status, length, controller):
+        # Like the original conversion, type and channel are the two nibbles of any status byte
+        message_type = status & 0xF0
+        channel = (status & 0x0F) + 1
+        for rule in self.rules:
+            if rule.get('status') is not None and rule['status'] != (message_type if status < 0xF0 else status):
+                continue
+            if rule.get('channel') is not None and rule['channel'] != channel:
+                continue
+            if rule.get('controller') is not None and rule['controller'] != controller:
+                continue
+            args = []
+            for name in rule.get('args', []):
+                if name == 'type':
+                    args.append(('const', message_type))
+                elif name == 'status':
+                    args.append(('const', status))
+                elif name == 'channel':
+                    args.append(('const', channel))
+                elif name == 'data':
+                    args.extend(('index', i) for i in range(1, length))
+                elif name == 'data1' and length > 1:
+                    args.append(('index', 1))
+                elif name == 'data2' and length > 2:
+                    args.append(('index', 2))
+                elif name == 'value' and length > 1:
+                    args.append(('index', length - 1))
+                elif name == 'bend' and length > 2:
+                    args.append(('bend',))
+            address = rule['address'].format(channel=channel, controller=controller)
+            key = (address, tuple(args))
+            template = self.templates.get(key)
+            if template is None:
+                template = self.templates[key] = OscTemplate(address, args)
+            return template
+        return None
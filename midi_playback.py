@@ -0,0 +1,317 @@
+import argparse
+import struct
+import threading
+import time
+
+import numpy as np
+
+from latency import LatencyHistogram
+from midi_ingest import OscSender
+from midi_mapping import MidiOscMapper, DEFAULT_MAPPING
+
+# One row per channel or system message (meta events and SysEx are not played), sorted by time
+EVENT_DTYPE = np.dtype([('beat', np.float64), ('status', np.uint8), ('data1', np.uint8),
+                        ('data2', np.uint8), ('size', np.uint8)])
+
+def _read_varlen(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+def load_midi_file(path):
+    # Parses a Standard MIDI File (format 0 or 1) into an EVENT_DTYPE array, with time in quarter
+    # notes, and its tempo map as (beats, bpm) arrays
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != b'MThd':
+        raise ValueError(f"{path} is not a Standard MIDI File")
+    header_length, file_format, track_count, division = struct.unpack('>IHHH', data[4:14])
+    if division & 0x8000:
+        raise ValueError(f"{path} uses SMPTE time division, which is not supported")
+    ticks, statuses, data1, data2, sizes = [], [], [], [], []
+    tempo_ticks, tempo_bpm = [0], [120.0]
+    pos = 8 + header_length
+    for _ in range(track_count):
+        while data[pos:pos + 4] != b'MTrk':
+            # Skip unknown chunks
+            pos += 8 + struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        end = pos + 8 + struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        pos += 8
+        tick = 0
+        running_status = None
+        while pos < end:
+            delta, pos = _read_varlen(data, pos)
+            tick += delta
+            status = data[pos]
+            if status == 0xFF:
+                meta_type = data[pos + 1]
+                length, pos = _read_varlen(data, pos + 2)
+                if meta_type == 0x51 and length == 3:
+                    tempo_ticks.append(tick)
+                    tempo_bpm.append(60000000 / int.from_bytes(data[pos:pos + 3], 'big'))
+                elif meta_type == 0x2F:
+                    pos = end
+                    break
+                pos += length
+                continue
+            if status in (0xF0, 0xF7):
+                length, pos = _read_varlen(data, pos + 1)
+                pos += length
+                continue
+            if status & 0x80:
+                pos += 1
+                if status < 0xF0:
+                    running_status = status
+            else:
+                # Running status: the status byte is left out and this is already the first data byte
+                status = running_status
+            size = 2 if status & 0xF0 in (0xC0, 0xD0) or status in (0xF1, 0xF3) else \
+                1 if status >= 0xF4 else 3
+            ticks.append(tick)
+            statuses.append(status)
+            data1.append(data[pos] if size > 1 else 0)
+            data2.append(data[pos + 1] if size > 2 else 0)
+            sizes.append(size)
+            pos += size - 1
+        pos = end
+
+    events = np.empty(len(ticks), dtype=EVENT_DTYPE)
+    tick_array = np.array(ticks, dtype=np.int64)
+    # Stable sort keeps same-tick events in track order, and in file order within a track
+    order = np.argsort(tick_array, kind='stable')
+    events['beat'] = tick_array[order] / division
+    events['status'] = np.array(statuses, dtype=np.uint8)[order]
+    events['data1'] = np.array(data1, dtype=np.uint8)[order]
+    events['data2'] = np.array(data2, dtype=np.uint8)[order]
+    events['size'] = np.array(sizes, dtype=np.uint8)[order]
+
+    tempo_order = np.argsort(np.array(tempo_ticks), kind='stable')
+    tempo_beats = np.array(tempo_ticks, dtype=np.float64)[tempo_order] / division
+    tempo_values = np.array(tempo_bpm, dtype=np.float64)[tempo_order]
+    return events, (tempo_beats, tempo_values)
+
+class MidiFilePlayer:
+    def __init__(self, events, tempo_map, sender, mapping=DEFAULT_MAPPING, on_batch=None,
+                 spin_time=0.001, window=2000):
+        # Plays a parsed file as the same OSC messages DirSim Port forwards from a live MIDI input.
+        # The position is kept in beats and advances at the live tempo once one has been set with
+        # set_tempo (e.g. from the controller's '/tempo/raw'), at the file's own tempo before that.
+        # A single thread sleeps until the next event is due, then sends everything up to the
+        # current position as one batch, so the cost per wake-up does not grow with the score.
+        self.events = events
+        self.beats = events['beat']
+        self.tempo_beats, self.tempo_values = tempo_map
+        self.sender = sender
+        self.mapper = MidiOscMapper(mapping)
+        self.on_batch = on_batch
+        self.spin_time = spin_time
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.thread = None
+        self.running = False
+        self.live_bpm = None
+        self.index = 0
+        self.anchor_beat = 0.0
+        self.anchor_time = None
+        self.bpm = float(self.tempo_values[0])
+        self.channels = set()
+        self.sent = 0
+        self.lateness = LatencyHistogram(window)
+
+    def _file_bpm(self, beat):
+        return float(self.tempo_values[np.searchsorted(self.tempo_beats, beat, side='right') - 1])
+
+    def _position(self, now):
+        if self.anchor_time is None:
+            return self.anchor_beat
+        return self.anchor_beat + (now - self.anchor_time) * self.bpm / 60
+
+    def _reanchor(self, now, bpm):
+        self.anchor_beat = self._position(now)
+        self.anchor_time = now if self.running else None
+        self.bpm = bpm
+
+    def position(self):
+        with self.lock:
+            return self._position(time.perf_counter())
+
+    def set_tempo(self, bpm):
+        if bpm <= 0:
+            return
+        with self.lock:
+            self.live_bpm = float(bpm)
+            self._reanchor(time.perf_counter(), self.live_bpm)
+        self.changed.set()
+
+    def play(self):
+        if self.running:
+            return
+        with self.lock:
+            self.running = True
+            now = time.perf_counter()
+            self.anchor_time = now
+            if self.live_bpm is None:
+                self.bpm = self._file_bpm(self.anchor_beat)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, rewind=False):
+        if self.running:
+            with self.lock:
+                self._reanchor(time.perf_counter(), self.bpm)
+                self.running = False
+                self.anchor_time = None
+            self.changed.set()
+            if self.thread is not threading.current_thread():
+                self.thread.join(timeout=1.0)
+            self.thread = None
+            # Whatever was sounding is cut: All Notes Off on every channel used so far
+            self._send([[0xB0 | channel, 123, 0] for channel in sorted(self.channels)])
+        if rewind:
+            self.seek(0.0)
+
+    def seek(self, beat):
+        with self.lock:
+            self.anchor_beat = beat
+            self.anchor_time = time.perf_counter() if self.running else None
+            self.index = int(np.searchsorted(self.beats, beat, side='left'))
+        self.changed.set()
+
+    def finished(self):
+        return self.index >= len(self.events)
+
+    def _run(self):
+        while self.running and self.index < len(self.events):
+            now = time.perf_counter()
+            with self.lock:
+                if not self.running:
+                    break
+                position = self._position(now)
+                if self.live_bpm is None:
+                    file_bpm = self._file_bpm(position)
+                    if file_bpm != self.bpm:
+                        self._reanchor(now, file_bpm)
+                start = self.index
+                end = int(np.searchsorted(self.beats, position, side='right'))
+                self.index = max(end, start)
+                target = self.beats[self.index] if self.index < len(self.events) else None
+                if target is not None and self.live_bpm is None:
+                    # Wake up at the next tempo change too, the grid changes speed there
+                    next_change = np.searchsorted(self.tempo_beats, position, side='right')
+                    if next_change < len(self.tempo_beats):
+                        target = min(target, self.tempo_beats[next_change])
+                deadline = now + (target - position) * 60 / self.bpm if target is not None else None
+                late_beats = position - self.beats[start] if end > start else None
+                bpm = self.bpm
+            if end > start:
+                self.lateness.add(late_beats * 60 / bpm)
+                self._send(self._messages(start, end))
+            if deadline is not None:
+                self._wait_until(deadline)
+        self.running = False
+
+    def _wait_until(self, deadline):
+        # Sleeps until shortly before the deadline and spins the rest; returns early on a tempo change
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin_time:
+            self.changed.wait(remaining - self.spin_time)
+            if self.changed.is_set():
+                self.changed.clear()
+                return
+        while time.perf_counter() < deadline and not self.changed.is_set():
+            pass
+        self.changed.clear()
+
+    def _messages(self, start, end):
+        rows = self.events[start:end]
+        messages = []
+        for status, data1, data2, size in zip(rows['status'].tolist(), rows['data1'].tolist(),
+                                              rows['data2'].tolist(), rows['size'].tolist()):
+            if size == 3:
+                messages.append([status, data1, data2])
+            elif size == 2:
+                messages.append([status, data1])
+            else:
+                messages.append([status])
+            if status < 0xF0:
+                self.channels.add(status & 0x0F)
+        return messages
+
+    def _send(self, messages):
+        if not messages:
+            return
+        encode = self.mapper.encode
+        dgrams = [dgram for dgram in (encode(message) for message in messages) if dgram is not None]
+        if dgrams:
+            self.sender.send_batch(dgrams)
+        self.sent += len(messages)
+        if self.on_batch:
+            self.on_batch(messages)
+
+    def stats(self):
+        stats = {key.replace('_ms', '_late_ms') if key != 'count' else 'batches': value
+                 for key, value in self.lateness.summary().items()}
+        stats['sent'] = self.sent
+        stats['events'] = len(self.events)
+        stats['bpm'] = self.bpm
+        return stats
+
+class PlaybackControlServer:
+    def __init__(self, player, host='0.0.0.0', port=57122):
+        # Listens for the controller's transport and tempo messages: '/tempo/raw' sets the playback
+        # tempo, '/play' starts and '/stop' stops and rewinds
+        from pythonosc.dispatcher import Dispatcher
+        from pythonosc.osc_server import BlockingOSCUDPServer
+        dispatcher = Dispatcher()
+        dispatcher.map('/tempo/raw', lambda address, bpm: player.set_tempo(float(bpm)))
+        dispatcher.map('/play', lambda address, *args: player.play())
+        dispatcher.map('/stop', lambda address, *args: player.stop(rewind=True))
+        self.server = BlockingOSCUDPServer((host, port), dispatcher)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join(timeout=1.0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a MIDI file as DirSim Port OSC messages, following the controller's tempo")
+    parser.add_argument('file', help="Standard MIDI File to play")
+    parser.add_argument('--server', default='127.0.0.1', help="OSC destination")
+    parser.add_argument('--port', type=int, default=57121)
+    parser.add_argument('--control-port', type=int, default=57122,
+                        help="Port to receive '/tempo/raw', '/play' and '/stop' on")
+    parser.add_argument('--bpm', type=float, help="Fixed tempo instead of the file's own until '/tempo/raw' arrives")
+    parser.add_argument('--wait', action='store_true', help="Wait for '/play' instead of starting right away")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    events, tempo_map = load_midi_file(args.file)
+    print(f"Loaded {len(events)} events in {time.perf_counter() - start:.2f} s")
+    sender = OscSender(args.server, args.port)
+    player = MidiFilePlayer(events, tempo_map, sender)
+    if args.bpm:
+        player.set_tempo(args.bpm)
+    server = PlaybackControlServer(player, port=args.control_port)
+    if not args.wait:
+        player.play()
+    try:
+        while True:
+            time.sleep(1.0)
+            if player.running or args.wait:
+                print(f"Beat {player.position():.1f} at {player.bpm:.1f} BPM, {player.stats()}")
+            elif player.finished():
+                break
+    except KeyboardInterrupt:
+        pass
+    player.stop()
+    server.close()
+    sender.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import numpy as np
+
+from midi_mapping import osc_string
+
+SECTIONS = 16  # One section per MIDI channel, as in the DirSim Visual sketches
+# Per section in every '/orchestra/state' message, in this order
+STATE_FIELDS = ('envelope', 'active_notes', 'density', 'onsets', 'note', 'velocity')
+
+class OrchestraState:
+    def __init__(self, release=0.4, density_time=1.0):
+        # Per-section activity kept in NumPy arrays: which notes are sounding, a velocity envelope
+        # that jumps on each note on and decays with the release time constant, and note density
+        # (note ons per second, smoothed over density_time). feed() takes MIDI messages from any
+        # thread; snapshot() returns the state once per display frame.
+        self.release = release
+        self.density_time = density_time
+        self.lock = threading.Lock()
+        self.sounding = np.zeros((SECTIONS, 128), dtype=bool)
+        self.envelope = np.zeros(SECTIONS, dtype=np.float32)
+        self.density = np.zeros(SECTIONS, dtype=np.float32)
+        self.onsets = np.zeros(SECTIONS, dtype=np.int32)
+        # Loudest note on since the last snapshot, as velocity * 128 + note (-1 for none)
+        self.peak = np.full(SECTIONS, -1, dtype=np.int32)
+        self.last_snapshot = None
+        self.state = np.zeros((SECTIONS, len(STATE_FIELDS)), dtype=np.float32)
+
+    def feed(self, messages):
+        notes = [message for message in messages if len(message) == 3 and 0x80 <= message[0] < 0xA0]
+        all_off = [message[0] & 0x0F for message in messages
+                   if len(message) == 3 and message[0] & 0xF0 == 0xB0 and message[1] in (120, 123)]
+        if not notes and not all_off:
+            return
+        with self.lock:
+            if all_off:
+                self.sounding[all_off] = False
+            if not notes:
+                return
+            events = np.array(notes, dtype=np.int32)
+            channels = events[:, 0] & 0x0F
+            note_on = (events[:, 0] & 0xF0 == 0x90) & (events[:, 2] > 0)
+            # In order, so the last on/off for a key in the batch wins
+            self.sounding[channels, events[:, 1]] = note_on
+            if note_on.any():
+                on_channels = channels[note_on]
+                velocities = events[note_on, 2]
+                np.maximum.at(self.envelope, on_channels, velocities.astype(np.float32) / 127)
+                np.add.at(self.onsets, on_channels, 1)
+                np.maximum.at(self.peak, on_channels, velocities * 128 + events[note_on, 1])
+
+    def snapshot(self, now=None):
+        # The (SECTIONS, STATE_FIELDS) state for this frame; onsets and the peak note restart from here
+        if now is None:
+            now = time.perf_counter()
+        with self.lock:
+            dt = now - self.last_snapshot if self.last_snapshot is not None else 0.0
+            self.last_snapshot = now
+            if dt > 0:
+                self.envelope *= np.float32(np.exp(-dt / self.release))
+                alpha = np.float32(min(dt / self.density_time, 1.0))
+                self.density += alpha * (self.onsets / np.float32(dt) - self.density)
+            state = self.state
+            state[:, 0] = self.envelope
+            state[:, 1] = self.sounding.sum(axis=1)
+            state[:, 2] = self.density
+            state[:, 3] = self.onsets
+            has_peak = self.peak >= 0
+            state[:, 4] = np.where(has_peak, self.peak % 128, -1)
+            state[:, 5] = np.where(has_peak, self.peak // 128, 0)
+            self.onsets[:] = 0
+            self.peak[:] = -1
+            return state.copy()
+
+class OrchestraStatePublisher:
+    def __init__(self, state, sender, rate=60, address='/orchestra/state'):
+        # Sends one '/orchestra/state' message per display frame with STATE_FIELDS for every
+        # section, flattened section by section, however dense the score is
+        self.state = state
+        self.sender = sender
+        self.interval = 1.0 / rate
+        # Address and type tags never change; the floats are packed straight from the array
+        self.prefix = osc_string(address) + osc_string(',' + 'f' * (SECTIONS * len(STATE_FIELDS)))
+        self.running = False
+        self.thread = None
+        self.published = 0
+
+    def encode(self, snapshot):
+        return self.prefix + snapshot.astype('>f4').tobytes()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def _run(self):
+        deadline = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            self.sender.send_batch([self.encode(self.state.snapshot(now))])
+            self.published += 1
+            deadline += self.interval
+            if now - deadline > self.interval:
+                # Stalled for more than a frame: continue from now instead of catching up
+                deadline = now + self.interval
+            time.sleep(max(deadline - time.perf_counter(), 0.0))
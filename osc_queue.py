@@ -0,0 +1,94 @@
+import threading
+from collections import deque
+from fnmatch import fnmatchcase
+
+from pythonosc.osc_bundle_builder import OscBundleBuilder, IMMEDIATELY
+from pythonosc.osc_message_builder import OscMessageBuilder
+
+# Addresses where only the newest value matters; a pending message is updated in place instead of queued again
+LAST_VALUE_WINS = ('/tempo/raw', '/track/*/volume')
+
+class OscMessageQueue:
+    def __init__(self, max_size=256, last_value_wins=LAST_VALUE_WINS):
+        # Bounded queue of (address, value, timing) entries that wakes the sender as soon as something is put
+        self.max_size = max_size
+        self.last_value_wins = last_value_wins
+        self.condition = threading.Condition()
+        self.entries = deque()
+        self.pending = {}  # address -> queued entry, for last-value-wins addresses
+        self.coalesce_cache = {}
+        self.closed = False
+        self.queued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def _coalesces(self, address):
+        coalesces = self.coalesce_cache.get(address)
+        if coalesces is None:
+            coalesces = any(fnmatchcase(address, pattern) for pattern in self.last_value_wins)
+            self.coalesce_cache[address] = coalesces
+        return coalesces
+
+    def put(self, address, value, timing):
+        with self.condition:
+            self.queued += 1
+            if self._coalesces(address):
+                entry = self.pending.get(address)
+                if entry is not None:
+                    # Keep the queue position, take the newest value and its timing
+                    entry[1] = value
+                    entry[2] = timing
+                    self.coalesced += 1
+                    return
+                entry = [address, value, timing]
+                self.pending[address] = entry
+            else:
+                entry = [address, value, timing]
+            if len(self.entries) >= self.max_size:
+                # Full: the oldest message goes so the newest state always gets out
+                oldest = self.entries.popleft()
+                if self.pending.get(oldest[0]) is oldest:
+                    del self.pending[oldest[0]]
+                self.dropped += 1
+            self.entries.append(entry)
+            self.high_water = max(self.high_water, len(self.entries))
+            self.condition.notify()
+
+    def get_batch(self, timeout=None):
+        # Everything queued so far, oldest first; waits up to timeout for the first message
+        with self.condition:
+            if not self.entries and not self.closed and timeout != 0:
+                self.condition.wait(timeout)
+            batch = list(self.entries)
+            self.entries.clear()
+            self.pending.clear()
+        return batch
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'backlog': len(self.entries),
+                'high_water': self.high_water,
+                'queued': self.queued,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped
+            }
+
+def build_message(address, value):
+    builder = OscMessageBuilder(address=address)
+    # Lists become one argument per item, like SimpleUDPClient.send_message
+    for arg in value if isinstance(value, (list, tuple)) else [value]:
+        builder.add_arg(arg)
+    return builder.build()
+
+def build_bundle(batch):
+    builder = OscBundleBuilder(IMMEDIATELY)
+    for address, value, _ in batch:
+        builder.add_content(build_message(address, value))
+    return builder.build()
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+from fnmatch import fnmatchcase
+
+from osc_queue import build_message
+
+class OscRoute:
+    def __init__(self, address, host, port, min_interval=0.0, change_threshold=0.0):
+        # Messages whose address matches the pattern go to (host, port), at most once per
+        # min_interval per address, and numeric values only when they moved by change_threshold
+        self.address = address
+        self.destination = (host, port)
+        self.min_interval = min_interval
+        self.change_threshold = change_threshold
+        self.last_sent = {}  # address -> (time, value)
+        self.held = {}  # address -> newest value waiting for the rate limit
+        self.sent = 0
+        self.rate_limited = 0
+        self.unchanged = 0
+
+    def matches(self, address):
+        return fnmatchcase(address, self.address)
+
+    def is_unchanged(self, address, value):
+        last = self.last_sent.get(address)
+        if last is None or not self.change_threshold:
+            return False
+        last_value = last[1]
+        if isinstance(value, (int, float)) and isinstance(last_value, (int, float)):
+            return abs(value - last_value) < self.change_threshold
+        return False
+
+class _DestinationProtocol(asyncio.DatagramProtocol):
+    def __init__(self, transport_stats):
+        self.stats = transport_stats
+
+    def error_received(self, exc):
+        self.stats['errors'] += 1
+
+class OscTransport:
+    def __init__(self, routes):
+        # Sends every message to all matching routes from an asyncio loop on its own thread.
+        # send_message only hands the message to the loop, so callers never block on the network.
+        self.routes = [route if isinstance(route, OscRoute) else OscRoute(**route) for route in routes]
+        self.route_cache = {}
+        self.stats = {'messages': 0, 'datagrams': 0, 'errors': 0}
+        self.endpoints = {}
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run_loop, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        # One connected UDP socket per destination, opened up front and reused for every message
+        destinations = {route.destination for route in self.routes}
+        asyncio.run_coroutine_threadsafe(self._open_endpoints(destinations), self.loop).result(timeout=2.0)
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+        # Shut down: close the sockets and let their callbacks run
+        for endpoint in self.endpoints.values():
+            endpoint.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+    def send_message(self, address, value):
+        try:
+            self.loop.call_soon_threadsafe(self._dispatch, address, value)
+        except RuntimeError:
+            # Closed; late messages from other threads are dropped
+            pass
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def _routes_for(self, address):
+        routes = self.route_cache.get(address)
+        if routes is None:
+            routes = [route for route in self.routes if route.matches(address)]
+            self.route_cache[address] = routes
+        return routes
+
+    def _dispatch(self, address, value):
+        self.stats['messages'] += 1
+        now = time.monotonic()
+        dgram = None
+        for route in self._routes_for(address):
+            if route.is_unchanged(address, value):
+                route.unchanged += 1
+                continue
+            last = route.last_sent.get(address)
+            if last is not None and now - last[0] < route.min_interval:
+                # Too soon: keep the newest value and send it when the interval is up
+                if address not in route.held:
+                    self.loop.call_later(last[0] + route.min_interval - now, self._send_held, route, address)
+                route.held[address] = value
+                route.rate_limited += 1
+                continue
+            if dgram is None:
+                # Encoded once, whatever the number of destinations
+                dgram = build_message(address, value).dgram
+            self._send(route, address, value, dgram, now)
+
+    def _send_held(self, route, address):
+        value = route.held.pop(address, None)
+        if value is not None and not route.is_unchanged(address, value):
+            self._send(route, address, value, build_message(address, value).dgram, time.monotonic())
+
+    def _send(self, route, address, value, dgram, now):
+        endpoint = self.endpoints.get(route.destination)
+        if endpoint is None:
+            return
+        endpoint.sendto(dgram)
+        route.last_sent[address] = (now, value)
+        route.sent += 1
+        self.stats['datagrams'] += 1
+
+    async def _open_endpoints(self, destinations):
+        for destination in destinations:
+            try:
+                transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: _DestinationProtocol(self.stats), remote_addr=destination)
+                self.endpoints[destination] = transport
+            except OSError as e:
+                print(f"Cannot open OSC destination {destination[0]}:{destination[1]}: {e}")
+                self.stats['errors'] += 1
+
+    def route_stats(self):
+        return [{
+            'address': route.address,
+            'destination': f"{route.destination[0]}:{route.destination[1]}",
+            'sent': route.sent,
+            'rate_limited': route.rate_limited,
+            'unchanged': route.unchanged
+        } for route in self.routes]
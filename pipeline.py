@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+
+class FramePacket:
+    def __init__(self, seq, img, dropped=0):
+        # A single camera frame and everything the stages compute for it
+        self.seq = seq
+        self.img = img
+        self.dropped = dropped
+        self.timestamp = None
+        # perf_counter times used for latency tracing
+        self.capture_time = None
+        self.detect_time = None
+        self.mode = 1
+        self.right_hand_position = None
+        self.left_hand_fingers = None
+        self.touched_boxes = []
+        self.detect_transform = None
+        self.detect_skipped = False
+        self.debug_info = ""
+        self.bpm = None
+        # Hold on the camera frame's slot, released once nothing reads the camera frame any more
+        self.capture_ref = None
+        # False when the preview is off: the frame is left as captured and the hands are mirrored instead
+        self.mirrored = True
+        # Display bus slot the mirrored frame and its overlays are drawn into, held until rendered
+        self.display_ref = None
+
+class PipelineStage:
+    def __init__(self, name, process, input_queue, output_queue=None, on_drop=None):
+        # process(packet) returns the packet to forward, or None to drop it. on_drop(packet) is
+        # called for every packet that goes no further: dropped, failed or not forwarded on stop.
+        self.name = name
+        self.process = process
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.on_drop = on_drop
+        self.running = False
+        self.thread = None
+        self.frames_processed = 0
+        self.avg_process_time = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._worker_loop, name=f"pipeline-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _worker_loop(self):
+        while self.running:
+            try:
+                packet = self.input_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start_time = time.perf_counter()
+            try:
+                result = self.process(packet)
+            except Exception as e:
+                print(f"Error in pipeline stage {self.name}: {e}")
+                self.drop(packet)
+                continue
+            # Exponential moving average of the stage cost, in seconds
+            elapsed = time.perf_counter() - start_time
+            self.avg_process_time += 0.1 * (elapsed - self.avg_process_time)
+            self.frames_processed += 1
+            if result is None:
+                self.drop(packet)
+            elif self.output_queue is not None and not put_blocking(self.output_queue, result, lambda: self.running):
+                self.drop(result)
+
+    def drop(self, packet):
+        if self.on_drop is not None:
+            self.on_drop(packet)
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+class FramePipeline:
+    def __init__(self, read_frame, stages, queue_size=2, on_drop=None):
+        # read_frame() returns (success, packet); stages is a list of (name, process) pairs.
+        # on_drop(packet) gets every packet that never makes it through the last stage.
+        self.read_frame = read_frame
+        self.on_drop = on_drop
+        self.running = False
+        self.failed = False
+        self.capture_thread = None
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.stages = []
+        for i, (name, process) in enumerate(stages):
+            output_queue = self.queues[i + 1] if i + 1 < len(stages) else None
+            self.stages.append(PipelineStage(name, process, self.queues[i], output_queue, on_drop))
+
+    def start(self):
+        self.running = True
+        self.failed = False
+        for stage in self.stages:
+            stage.start()
+        self.capture_thread = threading.Thread(target=self._capture_loop, name="pipeline-capture", daemon=True)
+        self.capture_thread.start()
+
+    def _capture_loop(self):
+        while self.running:
+            success, packet = self.read_frame()
+            if not success:
+                if self.running:
+                    self.failed = True
+                    self.running = False
+                break
+            # Blocks while the first stage is busy; the frame source keeps only the newest frame
+            if not put_blocking(self.queues[0], packet, lambda: self.running) and self.on_drop is not None:
+                self.on_drop(packet)
+
+    def wait(self, is_running):
+        # Block the caller until the pipeline fails or is_running() turns False
+        while self.running and is_running():
+            time.sleep(0.05)
+
+    def get_queue_depths(self):
+        return {stage.name: stage.input_queue.qsize() for stage in self.stages}
+
+    def get_stage_times(self):
+        return {stage.name: stage.avg_process_time for stage in self.stages}
+
+    def stop(self):
+        self.running = False
+        if self.capture_thread and self.capture_thread is not threading.current_thread():
+            self.capture_thread.join(timeout=1.0)
+        self.capture_thread = None
+        for stage in self.stages:
+            stage.stop()
+        # Whatever is still queued will not be processed
+        for stage_queue in self.queues:
+            while True:
+                try:
+                    packet = stage_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if self.on_drop is not None:
+                    self.on_drop(packet)
+
+def put_blocking(target_queue, item, is_running):
+    # Queue.put that gives up once is_running() turns False
+    while is_running():
+        try:
+            target_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
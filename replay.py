@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from clock import VirtualClock
+from config import INITIAL_BPM, MIN_BPM, MAX_BPM, OSC_SERVER, OSC_PORT
+from main import MainProgram
+from session_recorder import SESSION_MAGIC, load_session, session_to_hands
+
+class OscRecorder:
+    def __init__(self, clock):
+        # Stands in for SimpleUDPClient and keeps every message with its virtual send time
+        self.clock = clock
+        self.messages = []
+
+    def send_message(self, address, value):
+        self.messages.append((self.clock.time(), address, value))
+
+def load_landmark_log(path):
+    # A landmark log is either a binary session recording or JSON lines:
+    # {"t": seconds, "hands": [cvzone-style hand dicts]}
+    with open(path, 'rb') as f:
+        is_session = f.read(len(SESSION_MAGIC)) == SESSION_MAGIC
+    if is_session:
+        return [(float(record['t']), session_to_hands(record)) for record in load_session(path)]
+    frames = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                frames.append((record["t"], record["hands"]))
+    return frames
+
+class LandmarkLogWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def write(self, timestamp, hands):
+        hands = [{"type": hand["type"], "lmList": hand["lmList"], "bbox": list(hand["bbox"])} for hand in hands]
+        self.file.write(json.dumps({"t": timestamp, "hands": hands}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class LandmarkLogCapture:
+    def __init__(self, frame_count, width=1280, height=720, fps=60):
+        # Stands in for cv2.VideoCapture when the hands come from a log instead of pixels
+        self.frame_count = frame_count
+        self.frames_read = 0
+        self.props = {cv2.CAP_PROP_FRAME_WIDTH: width, cv2.CAP_PROP_FRAME_HEIGHT: height, cv2.CAP_PROP_FPS: fps}
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def read(self, image=None):
+        # The hands come from the log and the pixels are never looked at, so a caller's buffer is returned as is
+        if self.frames_read >= self.frame_count:
+            return False, None
+        self.frames_read += 1
+        if image is not None and image.shape == self.frame.shape:
+            return True, image
+        return True, self.frame
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def set(self, prop, value):
+        return False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+class LandmarkLogDetector:
+    def __init__(self, frames):
+        # Returns the logged hands in order, one frame per findHands call
+        self.frames = frames
+        self.index = 0
+
+    def findHands(self, img, draw=False):
+        _, hands = self.frames[self.index]
+        self.index += 1
+        for hand in hands:
+            x, y, w, h = hand["bbox"]
+            hand.setdefault("center", (x + w // 2, y + h // 2))
+        return hands, img
+
+class ReplaySession:
+    def __init__(self, config, video_path=None, landmark_log=None, fps=None, landmark_output=None):
+        if (video_path is None) == (landmark_log is None):
+            raise ValueError("Replay needs exactly one of video_path or landmark_log")
+        self.clock = VirtualClock()
+        self.osc_recorder = OscRecorder(self.clock)
+        self.bpm_trace = []
+        self.landmark_writer = LandmarkLogWriter(landmark_output) if landmark_output else None
+
+        config = dict(config)
+        # Every frame must be processed in order and OSC flushed synchronously
+        config['LATEST_FRAME_ONLY'] = False
+        config['OSC_THREAD'] = False
+        config['PIPELINED'] = False
+        detector = None
+        if landmark_log is not None:
+            self.log_frames = load_landmark_log(landmark_log)
+            capture = LandmarkLogCapture(len(self.log_frames))
+            detector = LandmarkLogDetector(self.log_frames)
+            # Logged hands are already in full-frame coordinates, one per frame
+            config['ROI_TRACKING'] = False
+            config['DETECTION_INTERVAL'] = 1
+            # ... and already mirrored, so the frame path must mirror the image rather than the hands
+            config['SHOW_PREVIEW'] = True
+            self.frame_times = [t for t, _ in self.log_frames]
+        else:
+            self.log_frames = None
+            capture = cv2.VideoCapture(video_path)
+            if not capture.isOpened():
+                raise IOError(f"Cannot open video {video_path}")
+            fps = fps or capture.get(cv2.CAP_PROP_FPS) or 30
+            self.frame_times = None
+        self.fps = fps
+
+        self.program = MainProgram(
+            self._record_bpm, lambda frame: None, config,
+            capture=capture, clock=self.clock,
+            osc_client_factory=lambda server, port: self.osc_recorder,
+            detector=detector
+        )
+
+    def _record_bpm(self, bpm):
+        self.bpm_trace.append((self.clock.time(), bpm))
+
+    def run(self):
+        # Drive MainProgram frame by frame under the virtual clock, as fast as possible
+        program = self.program
+        program.running = True
+        program.frame_grabber.start()
+        frames = 0
+        wall_start = time.perf_counter()
+        try:
+            while True:
+                if self.frame_times is not None:
+                    if frames >= len(self.frame_times):
+                        break
+                    self.clock.set(self.frame_times[frames])
+                else:
+                    self.clock.set(frames / self.fps)
+                success, packet = program.read_frame()
+                if not success:
+                    break
+                program.process_frame(packet)
+                program.flush_osc_messages()
+                if self.landmark_writer:
+                    self.landmark_writer.write(packet.timestamp, program.hand_tracker.last_hands)
+                frames += 1
+        finally:
+            program.running = False
+            program.release_resources()
+            if self.landmark_writer:
+                self.landmark_writer.close()
+        wall_time = time.perf_counter() - wall_start
+        replay_duration = self.clock.time()
+        return {
+            'frames': frames,
+            'wall_time': wall_time,
+            'fps': frames / wall_time if wall_time > 0 else 0.0,
+            'realtime_factor': replay_duration / wall_time if wall_time > 0 else 0.0,
+            'osc': [[t, address, value] for t, address, value in self.osc_recorder.messages],
+            'bpm': [[t, bpm] for t, bpm in self.bpm_trace]
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded video or landmark log through the DirSim Controller without a camera")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', help="Video file to run hand detection on")
+    source.add_argument('--landmarks', help="Landmark log (JSON lines or session recording) to replay without detection")
+    parser.add_argument('--fps', type=float, help="Frame rate of the video, defaults to the file's own")
+    parser.add_argument('--mode', type=int, default=1, help="Tempo mode to replay in")
+    parser.add_argument('--gesture-matching', action='store_true', help="In mode 2, match conducting patterns instead of box touches")
+    parser.add_argument('--initial-bpm', type=int, default=INITIAL_BPM)
+    parser.add_argument('--min-bpm', type=int, default=MIN_BPM)
+    parser.add_argument('--max-bpm', type=int, default=MAX_BPM)
+    parser.add_argument('--sensitivity', type=int, default=1000)
+    parser.add_argument('--write-landmarks', help="Also write the detected hands to a landmark log")
+    parser.add_argument('--out', help="Write the OSC stream and BPM trace to this JSON file")
+    parser.add_argument('--verbose', action='store_true', help="Keep the controller's console output")
+    args = parser.parse_args()
+
+    config = {
+        'INITIAL_BPM': args.initial_bpm,
+        'MIN_BPM': args.min_bpm,
+        'MAX_BPM': args.max_bpm,
+        'OSC_SERVER': OSC_SERVER,
+        'OSC_PORT': OSC_PORT,
+        'SENSITIVITY': args.sensitivity,
+        'TOUCH_COUNT': 4,
+        'MODE': args.mode,
+        'PATTERN_MATCHER': 'gesture' if args.gesture_matching else 'boxes'
+    }
+    session = ReplaySession(config, video_path=args.video, landmark_log=args.landmarks,
+                            fps=args.fps, landmark_output=args.write_landmarks)
+    if args.verbose:
+        result = session.run()
+    else:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = session.run()
+
+    print(f"Replayed {result['frames']} frames in {result['wall_time']:.2f} s "
+          f"({result['fps']:.1f} FPS, {result['realtime_factor']:.1f}x real time), "
+          f"{len(result['osc'])} OSC messages")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=1)
+        print(f"Trace written to {args.out}")
+
+if __name__ == "__main__":
+    main()
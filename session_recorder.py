@@ -0,0 +1,212 @@
+import queue
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# File layout: 16-byte header (magic, version, record size) followed by fixed-size records
+SESSION_MAGIC = b'DIRSIMSS'
+SESSION_VERSION = 1
+HEADER = struct.Struct('<8sII')
+
+HAND_TYPES = ('Left', 'Right')  # cvzone labels; 'Left' is the conductor's right hand on the mirrored image
+BOX_NAMES = ('up', 'down', 'left', 'right')
+
+SESSION_DTYPE = np.dtype([
+    ('seq', '<i8'),
+    ('t', '<f8'),
+    ('mode', 'u1'),
+    ('hand_present', 'u1', (2,)),
+    ('handedness', 'i1', (2,)),  # index into HAND_TYPES, -1 when the slot is empty
+    ('landmarks', '<f4', (2, 21, 3)),  # all 21 points per hand, frame pixel coordinates
+    ('touched', 'u1'),  # bitmask over BOX_NAMES
+    ('bpm', '<f4'),
+    ('slider1', '<f4'),
+    ('slider2', '<f4'),
+])
+
+def make_record(seq, timestamp, mode, hands, touched_boxes, bpm, slider1, slider2):
+    record = np.zeros((), dtype=SESSION_DTYPE)
+    record['seq'] = seq
+    record['t'] = timestamp
+    record['mode'] = mode
+    record['handedness'] = -1
+    # 'Left' hands go to slot 0 and 'Right' hands to slot 1 when possible
+    slots = [None, None]
+    for hand in hands[:2]:
+        preferred = 0 if hand["type"] == 'Left' else 1
+        slot = preferred if slots[preferred] is None else 1 - preferred
+        slots[slot] = hand
+    for slot, hand in enumerate(slots):
+        if hand is None:
+            continue
+        record['hand_present'][slot] = 1
+        record['handedness'][slot] = HAND_TYPES.index(hand["type"]) if hand["type"] in HAND_TYPES else -1
+        record['landmarks'][slot] = hand["lmList"]
+    touched = 0
+    for box_name, _ in touched_boxes:
+        if box_name in BOX_NAMES:
+            touched |= 1 << BOX_NAMES.index(box_name)
+    record['touched'] = touched
+    record['bpm'] = bpm
+    record['slider1'] = slider1
+    record['slider2'] = slider2
+    return record
+
+class SessionRecorder:
+    def __init__(self, path, max_pending=10000):
+        # Records are appended by a background writer thread so the frame loop never touches the disk
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(SESSION_MAGIC, SESSION_VERSION, SESSION_DTYPE.itemsize))
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.records_written = 0
+        self.records_dropped = 0
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def record(self, seq, timestamp, mode, hands, touched_boxes, bpm, slider1, slider2):
+        record = make_record(seq, timestamp, mode, hands, touched_boxes, bpm, slider1, slider2)
+        try:
+            self.pending.put_nowait(record)
+        except queue.Full:
+            # Never stall the live loop for the disk
+            self.records_dropped += 1
+
+    def _writer_loop(self):
+        while True:
+            record = self.pending.get()
+            batch = [record]
+            # Write whatever else is waiting in one go
+            while True:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch:
+                np.array(batch, dtype=SESSION_DTYPE).tofile(self.file)
+                self.records_written += len(batch)
+            if stop:
+                break
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.pending.put(None)
+        self.thread.join()
+        self.thread = None
+        self.file.close()
+        print(f"Session recorded to {self.path}: {self.records_written} frames, {self.records_dropped} dropped")
+
+class VideoRecorder:
+    def __init__(self, bus, path, fps=30.0, fourcc='mp4v'):
+        # Encodes the preview frames from the frame bus on its own thread, reading each slot in
+        # place. If encoding falls behind it picks up the newest frame instead of queueing copies.
+        # Frames are placed on a constant fps grid by capture time: a frame is repeated to cover
+        # skipped ones and dropped when it falls on a grid point already written, so the video
+        # plays back at the speed it was captured.
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.subscriber = bus.subscribe()
+        self.writer = None
+        self.size = None
+        self.start_time = None
+        self.frames_written = 0
+        self.frames_repeated = 0
+        self.frames_dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+
+    def _writer_loop(self):
+        while self.running:
+            ref = self.subscriber.get(timeout=0.5)
+            if ref is None:
+                continue
+            with ref:
+                capture_time = ref.capture_time if ref.capture_time is not None else time.perf_counter()
+                size = (ref.frame.shape[1], ref.frame.shape[0])
+                if self.writer is None:
+                    self.size = size
+                    self.start_time = capture_time
+                    self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, size)
+                    if not self.writer.isOpened():
+                        print(f"Error recording video: cannot open {self.path} with codec {self.fourcc}")
+                        self.running = False
+                        break
+                if size != self.size:
+                    # The writer's frame size is fixed, e.g. after switching to a different camera
+                    continue
+                # Grid frames up to and including this capture time that are still unwritten
+                due = int(round((capture_time - self.start_time) * self.fps)) + 1 - self.frames_written
+                if due <= 0:
+                    self.frames_dropped += 1
+                    continue
+                for _ in range(due):
+                    self.writer.write(ref.frame)
+                self.frames_written += due
+                self.frames_repeated += due - 1
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.running = False
+        self.thread.join()
+        self.thread = None
+        if self.writer is None or not self.writer.isOpened():
+            return
+        self.writer.release()
+        print(f"Video recorded to {self.path}: {self.frames_written} frames at {self.fps:g} fps, "
+              f"{self.frames_repeated} repeated, {self.frames_dropped + self.subscriber.skipped} dropped")
+
+def load_session(path):
+    # Memory-map a recorded session; slicing it reads only the records touched
+    with open(path, 'rb') as f:
+        magic, version, record_size = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0, 2)
+        file_size = f.tell()
+    if magic != SESSION_MAGIC:
+        raise ValueError(f"{path} is not a DirSim session recording")
+    if version != SESSION_VERSION or record_size != SESSION_DTYPE.itemsize:
+        raise ValueError(f"{path} has unsupported session version {version}")
+    # A partial trailing record (e.g. after a crash) is ignored
+    count = (file_size - HEADER.size) // record_size
+    if count == 0:
+        return np.zeros(0, dtype=SESSION_DTYPE)
+    return np.memmap(path, dtype=SESSION_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+def session_hand_track(session, hand_type='Left', landmark=0):
+    # Timestamps and (x, y) of one landmark of one hand, NaN where that hand was not seen.
+    # The defaults give the conductor's right wrist, as used by HandSpeedBPMCalculator.
+    code = HAND_TYPES.index(hand_type)
+    present = (session['handedness'] == code) & (session['hand_present'] == 1)
+    slot = np.argmax(present, axis=1)
+    rows = np.arange(len(session))
+    positions = session['landmarks'][rows, slot, landmark, :2].astype(np.float64)
+    positions[~present.any(axis=1)] = np.nan
+    return np.asarray(session['t']), positions
+
+def session_to_hands(record):
+    # cvzone-style hand dicts for one recorded frame
+    hands = []
+    for slot in range(2):
+        if not record['hand_present'][slot]:
+            continue
+        lm_list = np.rint(record['landmarks'][slot]).astype(int)
+        x_min, y_min = lm_list[:, 0].min(), lm_list[:, 1].min()
+        x_max, y_max = lm_list[:, 0].max(), lm_list[:, 1].max()
+        bbox = (int(x_min), int(y_min), int(x_max - x_min), int(y_max - y_min))
+        hand_type = HAND_TYPES[record['handedness'][slot]] if record['handedness'][slot] >= 0 else 'Left'
+        hands.append({
+            "lmList": lm_list.tolist(),
+            "bbox": bbox,
+            "center": (bbox[0] + bbox[2] // 2, bbox[1] + bbox[3] // 2),
+            "type": hand_type
+        })
+    return hands
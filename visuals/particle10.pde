@@ -26,6 +26,13 @@ color[] familyColors = {
   #8B008B  // Percussion and others (Dark Magenta)
 };
 
+// Per-section state from DirSim Port's '/orchestra/state'
+final int STATE_FIELDS = 6;
+int[] stateActiveNotes = new int[16];
+// While '/orchestra/state' keeps arriving, the raw '/midi/<ch>' messages are ignored so no note fires twice
+final int STATE_TIMEOUT_MS = 500;
+int lastStateMillis = -STATE_TIMEOUT_MS;
+
 // Debug variables
 boolean debugMode = false;
 String lastOscMessage = "No message received yet";
@@ -100,6 +107,7 @@ void oscEvent(OscMessage theOscMessage) {
   lastOscMessage = addrPattern; // Update for debug display
   
   if (addrPattern.startsWith("/midi/")) {
+    if (millis() - lastStateMillis < STATE_TIMEOUT_MS) return;
     try {
       int channel = Integer.parseInt(addrPattern.substring(6)) - 1; // MIDI channels are 1-indexed
       int status = theOscMessage.get(0).intValue();
@@ -115,6 +123,28 @@ void oscEvent(OscMessage theOscMessage) {
       println("Error parsing OSC message: " + addrPattern);
       e.printStackTrace();
     }
+  } else if (addrPattern.equals("/orchestra/state")) {
+    lastStateMillis = millis();
+    // One message per frame from DirSim Port with, for each section in turn:
+    // envelope, active notes, note density, note ons since the last frame, loudest new note and its velocity
+    try {
+      for (int i = 0; i < sections.length && (i + 1) * STATE_FIELDS <= theOscMessage.arguments().length; i++) {
+        int base = i * STATE_FIELDS;
+        int activeNotes = int(theOscMessage.get(base + 1).floatValue());
+        int onsets = int(theOscMessage.get(base + 3).floatValue());
+        int note = int(theOscMessage.get(base + 4).floatValue());
+        int velocity = int(theOscMessage.get(base + 5).floatValue());
+        if (onsets > 0 && note >= 0) {
+          sections[i].playNote(note, velocity);
+        } else if (activeNotes == 0 && stateActiveNotes[i] > 0) {
+          sections[i].noteOff();
+        }
+        stateActiveNotes[i] = activeNotes;
+      }
+    } catch (Exception e) {
+      println("Error parsing orchestra state");
+      e.printStackTrace();
+    }
   } else if (addrPattern.equals("/tempo")) {
     try {
       bpm = theOscMessage.get(0).floatValue();